@@ -41,6 +41,31 @@ INSERT INTO admins(email, password_hash, first_name) VALUE
     ('admin@mbtb.ca', 'asdfghjkl123', 'admin')
 
 
+CREATE TABLE token_revocations(
+    id int unsigned NOT NULL AUTO_INCREMENT,
+    user_id int unsigned NOT NULL,
+    revoked tinyint(1) NOT NULL,
+    created_at bigint NOT NULL,
+    PRIMARY KEY (id),
+    KEY created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=UTF8MB4;
+
+
+CREATE TABLE cache_versions(
+    namespace varchar(64) NOT NULL,
+    version bigint unsigned NOT NULL DEFAULT 0,
+    PRIMARY KEY (namespace)
+) ENGINE=InnoDB DEFAULT CHARSET=UTF8MB4;
+
+
+INSERT INTO cache_versions(namespace) VALUES
+    ('dimensions'),
+    ('donors'),
+    ('tissue_requests'),
+    ('principals'),
+    ('changes');
+
+
 CREATE TABLE neuropathological_diagnosis(
     neuro_diagnosis_id int unsigned NOT NULL AUTO_INCREMENT,
     neuro_diagnosis_name varchar(255) NOT NULL,
@@ -101,7 +126,9 @@ CREATE TABLE prime_details(
     preservation_method enum('Formalin-Fixed', 'Fresh Frozen', 'Both') DEFAULT NULL, -- To Do: Yet to be confirmed
     storage_year datetime NOT NULL,
     archive enum('Yes', 'No') DEFAULT 'No',
+    row_version int unsigned NOT NULL DEFAULT 0, -- Incremented by every edit of the donor, see edit_data/
     PRIMARY KEY (prime_details_id),
+    KEY archive (archive),
     FOREIGN KEY (neuro_diagnosis_id)
         REFERENCES neuropathological_diagnosis(neuro_diagnosis_id)
         ON DELETE no action,
@@ -165,6 +192,69 @@ CREATE TABLE other_details(
         ON DELETE no action
 ) ENGINE=InnoDB DEFAULT CHARSET=UTF8MB4;
 
+
+-- Read model of donors: one row per prime_details with the export columns of other_details/ (dimension names
+-- instead of ids) and the JSON of the donor as returned by brain_dataset/ and other_details/, for lists without the
+-- narrative text columns (other_details_list_json). Maintained by the data service in the transaction of every
+-- change. `python manage.py rebuild_donor_flat` is a required step of deploys creating it or importing donors with SQL
+CREATE TABLE donor_flat(
+    prime_details_id int unsigned NOT NULL,
+    other_details_id int unsigned DEFAULT NULL,
+    mbtb_code varchar(255) NOT NULL,
+    sex varchar(6) DEFAULT NULL,
+    age varchar(50) DEFAULT NULL,
+    postmortem_interval varchar(255) DEFAULT NULL,
+    time_in_fix varchar(255) DEFAULT NULL,
+    neuropathology_diagnosis varchar(255) DEFAULT NULL,
+    tissue_type varchar(255) DEFAULT NULL,
+    preservation_method varchar(20) DEFAULT NULL,
+    storage_year varchar(32) DEFAULT NULL,
+    clinical_diagnosis varchar(255) DEFAULT NULL,
+    archive varchar(3) DEFAULT NULL,
+    race varchar(255) DEFAULT NULL,
+    duration int DEFAULT NULL,
+    clinical_details text DEFAULT NULL,
+    cause_of_death varchar(255) DEFAULT NULL,
+    brain_weight int DEFAULT NULL,
+    neuropathology_summary text DEFAULT NULL,
+    neuropathology_gross text DEFAULT NULL,
+    neuropathology_microscopic text DEFAULT NULL,
+    neouropathology_criteria varchar(255) DEFAULT NULL,
+    cerad varchar(255) DEFAULT NULL,
+    braak_stage varchar(255) DEFAULT NULL,
+    khachaturian varchar(255) DEFAULT NULL,
+    abc varchar(255) DEFAULT NULL,
+    autopsy_type varchar(255) DEFAULT NULL,
+    formalin_fixed varchar(5) DEFAULT NULL,
+    fresh_frozen varchar(5) DEFAULT NULL,
+    prime_details_json longblob NOT NULL,
+    other_details_json longblob DEFAULT NULL,
+    other_details_list_json longblob DEFAULT NULL,
+    PRIMARY KEY (prime_details_id),
+    UNIQUE KEY mbtb_code (mbtb_code),
+    KEY other_details_id (other_details_id),
+    KEY facets (neuropathology_diagnosis, tissue_type, sex, archive),
+    KEY flat_archive (archive, other_details_id),
+    FOREIGN KEY (prime_details_id)
+        REFERENCES prime_details(prime_details_id)
+        ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=UTF8MB4;
+
+
+-- Append-only log of donor changes (insert, update, delete of a prime_details_id), written by the data service in
+-- the transaction of every change and read by changes/ for incremental sync. Entries are stamped with the 'changes'
+-- version of cache_versions incremented last in their transaction, versions commit in order and are the cursors of
+-- changes/. No foreign key, entries of deleted donors are kept
+CREATE TABLE change_log(
+    change_id bigint unsigned NOT NULL AUTO_INCREMENT,
+    prime_details_id int unsigned NOT NULL,
+    operation enum('insert', 'update', 'delete') NOT NULL,
+    version bigint unsigned NOT NULL,
+    created_at bigint NOT NULL,
+    PRIMARY KEY (change_id),
+    KEY version (version)
+) ENGINE=InnoDB DEFAULT CHARSET=UTF8MB4;
+
 CREATE TABLE tissue_requests(
     tissue_requests_id int unsigned NOT NULL AUTO_INCREMENT,
     title varchar(10) DEFAULT NULL,
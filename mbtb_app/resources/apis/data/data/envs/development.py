@@ -10,8 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import importlib.util
 import sys
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -38,12 +40,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
-    'mbtb',
+    'mbtb.apps.DataappConfig',
     'tissue_requests'
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'resources.middleware.compression.CompressionMiddleware',
+    'resources.middleware.admission_control.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -103,12 +107,101 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'resources.renderers.fast_json_renderer.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PERMISSION_CLASSES': (
         'resources.permissions.is_admin.IsAdmin',
         'resources.permissions.is_authenticated.IsAuthenticated',
     )
 }
 
+# MessagePack renderer and parser for machine clients (Accept/Content-Type: application/msgpack),
+# enabled when msgpack is installed
+if importlib.util.find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] += ('resources.renderers.msgpack_renderer.MessagePackRenderer',)
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] += ('resources.parsers.msgpack_parser.MessagePackParser',)
+
+# Caches of the process (default) and caches shared by all workers of a host
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Results of full downloads per dataset version, shared by all workers of the host (same TTL as the snapshot)
+    'exports': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_EXPORTS_DIR', os.path.join(BASE_DIR, 'cache', 'exports')),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 16},
+    },
+    # L2 of cached read responses, shared by all workers of the host. Keys contain table versions (see
+    # resources.caching.table_versions), so entries of older versions are never read again and simply expire
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_RESPONSES_DIR', os.path.join(BASE_DIR, 'cache', 'responses')),
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    }
+}
+
+# L1 of cached read responses per process: maximum number of responses, and seconds they stay cached
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_TTL = 60
+
+# Maximum number of donors per request of other_details/batch/
+BATCH_RETRIEVE_LIMIT = 5000
+
+# Maximum number of operations per request of batch_data/
+BATCH_MUTATION_LIMIT = 500
+
+# Maximum number of change_log entries per request of changes/ (pages are extended to the end of a transaction)
+CHANGES_PAGE_SIZE = 1000
+
+# Directory of lock files which serialize identical computations (e.g. full downloads) across workers of the host
+LOCK_DIR = os.environ.get('LOCK_DIR', os.path.join(BASE_DIR, 'cache', 'locks'))
+
+# Columnar dataset snapshot used by analytics endpoints, shared by all workers of a host through mmap.
+# Directory of the published snapshot versions, and seconds after which the snapshot is rebuilt
+DATASET_SNAPSHOT_DIR = os.environ.get('DATASET_SNAPSHOT_DIR', os.path.join(BASE_DIR, 'snapshots'))
+DATASET_SNAPSHOT_TTL = 300
+
+# Maximum number of cells of a contingency table of crosstab/ (product of the numbers of categories which occur)
+CROSSTAB_MAX_CELLS = 10000
+
+# Responses larger than this many bytes are compressed with the best encoding accepted by the client
+# (zstd, br, gzip), levels per content type are defined in resources.middleware.compression
+COMPRESSION_MIN_SIZE = 1024
+
+# Concurrency limits, wait queue sizes and wait timeouts per endpoint class (heavy_read, bulk_write, light_read)
+# and worker process are defined in resources.middleware.admission_control, ADMISSION_CLASSES overrides them
+
+# Verified auth tokens are cached per process: maximum number of tokens, and seconds a token stays cached
+# (or until its `exp` claim)
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_TTL = 60
+
+# Seconds a token's resolved account role stays cached per process. Admin changes of user accounts bump the
+# principals version, so every worker drops its entries within CACHE_VERSIONS_REFRESH_MS
+PRINCIPAL_CACHE_TTL = 30
+
+# Cached data (select options, responses, principals, dataset snapshot) is invalidated through the version
+# counters of the cache_versions table, which every worker reads at most once per this many milliseconds
+CACHE_VERSIONS_REFRESH_MS = 500
+
+# Seconds auth tokens issued by the users service stay valid, must match TOKEN_LIFETIME of the users service.
+# Read requests are authorized from the token's role claim, suspended accounts are rejected by the revocation
+# list: every REVOCATION_REFRESH seconds (maximum propagation delay of suspensions) workers poll new events,
+# REVOCATION_CAPACITY is the initial number of revoked users its Bloom filter is sized for
+TOKEN_LIFETIME = 8 * 60 * 60
+REVOCATION_REFRESH = 2
+REVOCATION_CAPACITY = 1024
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 
@@ -135,5 +228,9 @@ if any([arg in sys.argv for arg in ['test']]):
             'PASSWORD': 'test@123',
         }
     }
+    DATASET_SNAPSHOT_DIR = tempfile.mkdtemp(prefix='mbtb-snapshots-')
+    CACHES['exports']['LOCATION'] = tempfile.mkdtemp(prefix='mbtb-exports-')
+    CACHES['responses']['LOCATION'] = tempfile.mkdtemp(prefix='mbtb-responses-')
+    LOCK_DIR = tempfile.mkdtemp(prefix='mbtb-locks-')
 
 TEST_RUNNER = 'mbtb.utils.ManagedModelTestRunner'
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from resources.permissions.route_permissions import compile_route_permissions
 
 
 urlpatterns = [
@@ -8,3 +9,6 @@ urlpatterns = [
     path('', include('tissue_requests.urls')),
 
 ]
+
+# Resolve permissions of all routes once, requests are authorized by url name and method
+compile_route_permissions(urlpatterns)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class DataappConfig(AppConfig):
     name = 'mbtb'
+
+    # Connect receivers which render donor fragments
+    def ready(self):
+        from . import signals  # noqa: F401
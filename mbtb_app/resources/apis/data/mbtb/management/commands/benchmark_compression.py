@@ -0,0 +1,86 @@
+import http.client
+import json
+import threading
+import time
+import zlib
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from resources.middleware.compression import brotli, zstandard
+
+# Requests of the benchmark: (method, url, body)
+REQUESTS = [
+    ('GET', '/brain_dataset/', None),
+    ('POST', '/download_data/', {'download_mode': 'all'}),
+]
+
+
+# Request handler without access logs
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+# This command serves the application on a loopback port and requests brain_dataset/ and download_data/ with
+# every supported Accept-Encoding, reporting bytes on the wire, median time to the last byte on loopback and the
+# estimated transfer time at --mbps (loopback itself hides most of the transfer time).
+# Usage: python manage.py benchmark_compression --token <auth_token> --repeat 10 --mbps 50
+class Command(BaseCommand):
+    help = 'Benchmark response compression of brain_dataset/ and download_data/ over loopback.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--token', required=True, help='Auth token of a user or admin.')
+        parser.add_argument('--repeat', type=int, default=10, help='Number of requests per encoding.')
+        parser.add_argument('--mbps', type=float, default=50, help='Link speed for the transfer time estimate.')
+
+    def handle(self, *args, **options):
+        _encodings = ['identity', 'gzip'] + (['br'] if brotli else []) + (['zstd'] if zstandard else [])
+        _server = make_server('127.0.0.1', 0, get_wsgi_application(), handler_class=QuietRequestHandler)
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+        try:
+            for method, url, body in REQUESTS:
+                _identity = None
+                for encoding in _encodings:
+                    _result = self.measure(_server.server_port, method, url, body, encoding, options)
+                    _identity = _identity or _result
+                    self.stdout.write(
+                        '{:<16} {:<9} bytes={:<10} ratio={:5.1f}x loopback={:8.2f}ms at {:g}Mbps={:8.2f}ms'.format(
+                            url, encoding, _result['bytes'], _identity['bytes'] / _result['bytes'], _result['ms'],
+                            options['mbps'], _result['ms'] + _result['bytes'] * 8 / (options['mbps'] * 1000)))
+        finally:
+            _server.shutdown()
+
+    # Median time to the last byte in milliseconds, with the size of the (compressed) body
+    def measure(self, port, method, url, body, encoding, options):
+        _headers = {'Authorization': 'Token ' + options['token'], 'Accept-Encoding': encoding,
+                    'Content-Type': 'application/json'}
+        _timings = []
+        for _ in range(options['repeat']):
+            _connection = http.client.HTTPConnection('127.0.0.1', port)
+            _start = time.perf_counter()
+            _connection.request(method, url, body=json.dumps(body) if body else None, headers=_headers)
+            _response = _connection.getresponse()
+            content = _response.read()
+            _timings.append((time.perf_counter() - _start) * 1000)
+            _connection.close()
+
+            if _response.status != 200:
+                raise CommandError('{} {} returned {}: {}'.format(method, url, _response.status, content[:200]))
+            if _response.getheader('Content-Encoding', 'identity') != encoding:
+                raise CommandError('{} was not compressed with {}'.format(url, encoding))
+
+        self.decompress(content, encoding)  # check the body is valid
+        return {'ms': sorted(_timings)[len(_timings) // 2], 'bytes': len(content)}
+
+    @staticmethod
+    def decompress(content, encoding):
+        if encoding == 'gzip':
+            return zlib.decompress(content, 16 + zlib.MAX_WBITS)
+        if encoding == 'br':
+            return brotli.decompress(content)
+        if encoding == 'zstd':
+            return zstandard.ZstdDecompressor().decompressobj().decompress(content)
+        return content
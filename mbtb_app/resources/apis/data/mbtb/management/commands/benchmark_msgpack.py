@@ -0,0 +1,53 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from resources.db_operations.download_all_data import DownloadAllData
+from resources.renderers.fast_json_renderer import FastJSONRenderer
+from resources.renderers.msgpack_renderer import MessagePackRenderer, msgpack
+
+
+# This command compares JSON and MessagePack for a full export (download_data/ with download_mode 'all'):
+# payload size, server side encode time and client side decode time. Rows from the database are repeated up
+# to --rows, so the benchmark is meaningful on a small development database as well.
+# Usage: python manage.py benchmark_msgpack --rows 5000 --repeat 20
+class Command(BaseCommand):
+    help = 'Benchmark MessagePack against JSON for a full export.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Number of rows of the export.')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of encodes/decodes per format.')
+
+    def handle(self, *args, **options):
+        if msgpack is None:
+            raise CommandError('msgpack is not installed.')
+
+        _download_data = DownloadAllData().run()
+        if not _download_data['response']:
+            raise CommandError('No mbtb data found, please add data first.')
+        _rows = _download_data['data']
+        payload = [_rows[index % len(_rows)] for index in range(options['rows'])]
+
+        _formats = [
+            ('json', FastJSONRenderer(), json.loads),
+            ('msgpack', MessagePackRenderer(), lambda content: msgpack.unpackb(content, raw=False, timestamp=3)),
+        ]
+        for name, renderer, decode in _formats:
+            content = renderer.render(payload, renderer.media_type, {})
+            _encode_ms = self.measure(lambda: renderer.render(payload, renderer.media_type, {}), options['repeat'])
+            _decode_ms = self.measure(lambda: decode(content), options['repeat'])
+            if decode(content) != json.loads(FastJSONRenderer().render(payload)):
+                raise CommandError('Decoded {} export differs from the JSON one'.format(name))
+
+            self.stdout.write('{:<8} rows={:<7} bytes={:<10} encode={:8.2f}ms decode={:8.2f}ms'.format(
+                name, len(payload), len(content), _encode_ms, _decode_ms))
+
+    # Median run time in milliseconds
+    @staticmethod
+    def measure(function, repeat):
+        _timings = []
+        for _ in range(repeat):
+            _start = time.perf_counter()
+            function()
+            _timings.append((time.perf_counter() - _start) * 1000)
+        return sorted(_timings)[len(_timings) // 2]
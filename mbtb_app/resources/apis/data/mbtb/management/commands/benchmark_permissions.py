@@ -0,0 +1,213 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import resolve
+from mbtb.models import AdminAccount, UserAccount
+from rest_framework import exceptions, permissions
+from rest_framework.authentication import get_authorization_header
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from resources.permissions.is_admin import IsAdmin
+from resources.permissions.is_authenticated import IsAuthenticated
+from resources.permissions.route_permissions import ROUTE_PERMISSIONS, DENY
+import jwt
+
+# Requests of the benchmark: (permission class, method, url)
+REQUESTS = [
+    (IsAuthenticated, 'GET', '/get_select_options/'),
+    (IsAuthenticated, 'GET', '/other_details/1/'),
+    (IsAuthenticated, 'POST', '/download_data/'),
+    (IsAuthenticated, 'POST', '/brain_dataset/'),
+    (IsAdmin, 'PATCH', '/edit_data/1/'),
+    (IsAdmin, 'DELETE', '/delete_data/1/'),
+]
+
+
+# Routes of the former IsAdmin and IsAuthenticated per method, the greatest segment of the split request path
+BASELINE_ROUTES = {
+    IsAdmin: {
+        'POST': ['file_upload', 'add_new_data'],
+        'PATCH': ['edit_data', 'file_upload', 'get_new_tissue_requests', 'get_archive_tissue_requests'],
+        'DELETE': ['delete_data', 'get_new_tissue_requests', 'get_archive_tissue_requests'],
+        'GET': ['get_new_tissue_requests', 'get_archive_tissue_requests'],
+    },
+    IsAuthenticated: {
+        'GET': ['brain_dataset', 'other_details', 'get_select_options'],
+        'POST': ['add_new_tissue_requests', 'download_data'],
+    },
+}
+
+
+# Route matching of IsAdmin and IsAuthenticated before RoutePermission: the route is the greatest segment of the
+# split request path, looked up in the list of routes of the method
+def path_splitting_route(permission_class, request):
+    if request.method not in BASELINE_ROUTES[permission_class]:
+        raise exceptions.MethodNotAllowed(method=request.method)
+    url_path = request.path.split('/')
+    return max(url_path) in BASELINE_ROUTES[permission_class][request.method]
+
+
+# Route matching of RoutePermission: a lookup of the url name and method
+def route_permission_route(permission_class, request):
+    _url_name = request.resolver_match.url_name if request.resolver_match else None
+    return ROUTE_PERMISSIONS.get((_url_name, request.method), {}).get(permission_class, DENY) != DENY
+
+
+# The former validation of requests: the token is decoded on every check, without caches or revocations
+def baseline_validate_request(request):
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b'token':
+        raise exceptions.AuthenticationFailed('Invalid input. Only `Token` tag is allowed.')
+    elif len(auth) != 2:
+        raise exceptions.AuthenticationFailed('Invalid token header')
+
+    try:
+        payload = jwt.decode(auth[1], "SECRET_KEY")
+        return {'id': payload['id'], 'email': payload['email']}
+    except BaseException as error_msg:
+        raise exceptions.AuthenticationFailed('Token - ' + str(error_msg))
+
+
+# The former UserOrAdmin: a query of the account in the table of model_name
+class BaselineUserOrAdmin(object):
+
+    def __init__(self, **kwargs):
+        self.model = {'User': UserAccount, 'Admin': AdminAccount}[kwargs['model_name']]
+
+    def run(self, **kwargs):
+        try:
+            self.model.objects.get(**kwargs)
+            return True
+        except self.model.DoesNotExist:
+            return False
+
+
+# has_permission of IsAdmin before RoutePermission: a query of the admin on every allowed request
+class BaselineIsAdmin(permissions.BasePermission):
+
+    def has_permission(self, request, view):
+        if request.method == 'POST':
+            valid_url = ['file_upload', 'add_new_data']
+            url_path = request.path.split('/')
+            if max(url_path) in valid_url:
+                admin = self.authenticate(request)
+                return admin
+            return False
+
+        if request.method == 'PATCH':
+            valid_url = ['edit_data', 'file_upload', 'get_new_tissue_requests', 'get_archive_tissue_requests']
+            url_path = request.path.split('/')
+            if max(url_path) in valid_url:
+                admin = self.authenticate(request)
+                return admin
+            return False
+
+        if request.method == 'DELETE':
+            valid_url = ['delete_data', 'get_new_tissue_requests', 'get_archive_tissue_requests']
+            url_path = request.path.split('/')
+            if max(url_path) in valid_url:
+                admin = self.authenticate(request)
+                return admin
+            return False
+
+        if request.method == 'GET':
+            valid_url = ['get_new_tissue_requests', 'get_archive_tissue_requests']
+            url_path = request.path.split('/')
+            if max(url_path) in valid_url:
+                admin = self.authenticate(request)
+                return admin
+            return False
+
+        raise exceptions.MethodNotAllowed(method=request.method)
+
+    def authenticate(self, request):
+        response = baseline_validate_request(request)
+
+        admin = BaselineUserOrAdmin(model_name='Admin').run(id=response['id'], email=response['email'])
+        if admin:
+            return True
+
+        return False
+
+
+# has_permission of IsAuthenticated before RoutePermission: queries of the user and the admin on every allowed request
+class BaselineIsAuthenticated(permissions.BasePermission):
+
+    def has_permission(self, request, view):
+        if request.method == 'GET':
+            valid_url = ['brain_dataset', 'other_details', 'get_select_options']
+            url_path = request.path.split('/')
+            if max(url_path) in valid_url:
+                return self.authenticate(request)
+            return False
+
+        if request.method == 'POST':
+            valid_url = ['add_new_tissue_requests', 'download_data']
+            url_path = request.path.split('/')
+            if max(url_path) in valid_url:
+                return self.authenticate(request)
+            return False
+
+        raise exceptions.MethodNotAllowed(method=request.method)
+
+    def authenticate(self, request):
+        response = baseline_validate_request(request)
+
+        user = BaselineUserOrAdmin(model_name='User').run(id=response['id'], email=response['email'])
+        admin = BaselineUserOrAdmin(model_name='Admin').run(id=response['id'], email=response['email'])
+        if user or admin:
+            return True
+
+        return False
+
+
+BASELINE_PERMISSIONS = {IsAdmin: BaselineIsAdmin, IsAuthenticated: BaselineIsAuthenticated}
+
+
+# This command compares the time of permission checks of the former IsAdmin and IsAuthenticated (copies of their
+# has_permission, which decode the token and query the accounts on every allowed request) with RoutePermission (a
+# lookup of the url name and method in ROUTE_PERMISSIONS, principals cached per token), for allowed and denied
+# requests of an admin: route matching alone and whole has_permission calls. RoutePermission reads the principal of
+# GET requests from the token's role claim, use a token with one.
+# Usage: python manage.py benchmark_permissions --token <auth_token of an admin> --repeat 50000
+class Command(BaseCommand):
+    help = 'Benchmark permission checks of the former IsAdmin and IsAuthenticated against RoutePermission.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--token', required=True, help='Auth token of an admin.')
+        parser.add_argument('--repeat', type=int, default=50000, help='Number of checks per request and method.')
+
+    def handle(self, *args, **options):
+        _factory = APIRequestFactory()
+        for permission_class, method, url in REQUESTS:
+            _request = getattr(_factory, method.lower())(url, HTTP_AUTHORIZATION='Token ' + options['token'])
+            _request.resolver_match = resolve(url)
+            _request = Request(_request)
+
+            _permission = permission_class()
+            _old_route = self.measure(lambda: path_splitting_route(permission_class, _request), options['repeat'])
+            _new_route = self.measure(lambda: route_permission_route(permission_class, _request), options['repeat'])
+            _baseline = BASELINE_PERMISSIONS[permission_class]()
+            _old = self.measure(lambda: _baseline.has_permission(_request, None), options['repeat'])
+            _new = self.measure(lambda: _permission.has_permission(_request, None), options['repeat'])
+
+            # Both checks should reach the same decision
+            if _old['result'] != _new['result'] or _old_route['result'] != _new_route['result']:
+                raise CommandError('Permission checks differ for {} {}'.format(method, url))
+
+            self.stdout.write('{:<16} {:<7} {:<20} allowed={:<5} route: baseline={:5.2f}us RoutePermission='
+                              '{:5.2f}us  has_permission: baseline={:5.2f}us RoutePermission={:5.2f}us'.format(
+                                  permission_class.__name__, method, url, str(_new['result']), _old_route['us'],
+                                  _new_route['us'], _old['us'], _new['us']))
+
+    # Time of a check in microseconds, the fastest of batches of 1000 checks (others are slowed down by the host)
+    @staticmethod
+    def measure(check, repeat):
+        result = check()
+        _timings = []
+        for _ in range(max(repeat // 1000, 1)):
+            _start = time.perf_counter()
+            for _ in range(1000):
+                check()
+            _timings.append((time.perf_counter() - _start) * 1000)
+        return {'us': min(_timings), 'result': result}
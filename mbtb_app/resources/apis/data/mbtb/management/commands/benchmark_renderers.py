@@ -0,0 +1,60 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from mbtb.models import PrimeDetails
+from mbtb.serializers import PrimeDetailsSerializer
+from resources.db_operations.download_all_data import DownloadAllData
+from resources.renderers.fast_json_renderer import FastJSONRenderer, orjson
+
+
+# This command compares rendering time of DRF's JSONRenderer and FastJSONRenderer for the payloads of
+# brain_dataset/ and download_data/ (download_mode 'all'). Rows from the database are repeated up to --rows,
+# so the benchmark is meaningful on a small development database as well.
+# Usage: python manage.py benchmark_renderers --rows 5000 --repeat 20
+class Command(BaseCommand):
+    help = 'Benchmark JSON rendering of brain_dataset/ and download_data/ payloads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Number of rows per payload.')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of renders per renderer.')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson is not installed, FastJSONRenderer falls back to JSONRenderer.')
+
+        _brain_dataset = PrimeDetailsSerializer(PrimeDetails.objects.all().select_related(), many=True).data
+        _download_data = DownloadAllData().run()
+        if not _brain_dataset or not _download_data['response']:
+            raise CommandError('No mbtb data found, please add data first.')
+
+        _payloads = {
+            'brain_dataset/': self.repeat_rows(list(_brain_dataset), options['rows']),
+            'download_data/': self.repeat_rows(_download_data['data'], options['rows']),
+        }
+        for url, payload in _payloads.items():
+            _default = self.measure(JSONRenderer(), payload, options['repeat'])
+            _fast = self.measure(FastJSONRenderer(), payload, options['repeat'])
+
+            # Both renderers should produce the same document
+            if json.loads(_default['content']) != json.loads(_fast['content']):
+                raise CommandError('Rendered documents differ for {}'.format(url))
+
+            self.stdout.write('{:<16} rows={:<7} bytes={:<10} JSONRenderer={:8.2f}ms FastJSONRenderer={:8.2f}ms '
+                              'speedup={:.1f}x'.format(url, len(payload), len(_fast['content']), _default['ms'],
+                                                       _fast['ms'], _default['ms'] / _fast['ms']))
+
+    @staticmethod
+    def repeat_rows(rows, count):
+        return [rows[index % len(rows)] for index in range(count)]
+
+    # Median render time in milliseconds
+    @staticmethod
+    def measure(renderer, payload, repeat):
+        _timings = []
+        for _ in range(repeat):
+            _start = time.perf_counter()
+            content = renderer.render(payload, 'application/json', {})
+            _timings.append((time.perf_counter() - _start) * 1000)
+        return {'ms': sorted(_timings)[len(_timings) // 2], 'content': content}
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from resources.db_operations.donor_flat import DonorFlatTable
+
+
+# This command derives every row of donor_flat again from prime_details, other_details and the dimension tables,
+# a required step of deploys which create the table or import donors with SQL. Writes of the API keep it up to date.
+# Usage: python manage.py rebuild_donor_flat --batch-size 500
+class Command(BaseCommand):
+    help = 'Rebuild the donor_flat read model.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of donors per transaction.')
+
+    def handle(self, *args, **options):
+        _start = time.perf_counter()
+        _donors = DonorFlatTable.rebuild(batch_size=options['batch_size'])
+        self.stdout.write('Rebuilt donor_flat: donors={} in {:.2f}s'.format(_donors, time.perf_counter() - _start))
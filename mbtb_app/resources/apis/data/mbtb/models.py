@@ -14,6 +14,8 @@ class AutopsyTypes(models.Model):
         return self.autopsy_type
 
 
+# Rows of other_details, image_repository and donor_flat are deleted along with their prime_details by the database
+# (ON DELETE CASCADE), relations are DO_NOTHING so deletes of prime_details are single statements
 class PrimeDetails(models.Model):
     prime_details_id = models.AutoField(primary_key=True)
     mbtb_code = models.CharField(max_length=50, unique=True)
@@ -25,13 +27,15 @@ class PrimeDetails(models.Model):
     tissue_type = models.ForeignKey('TissueTypes', models.DO_NOTHING)
     preservation_method = models.CharField(max_length=20, blank=True, null=True)
     storage_year = models.DateTimeField(default=datetime.now, blank=True)
-    archive = models.CharField(max_length=3, blank=True, null=True)
+    archive = models.CharField(max_length=3, blank=True, null=True, default='No')
+    row_version = models.PositiveIntegerField(default=0, editable=False)
     neuro_diagnosis_id = models.ForeignKey('NeuropathologicalDiagnosis', models.DO_NOTHING,
                                            db_column="neuro_diagnosis_id")
 
     class Meta:
         managed = False
         db_table = 'prime_details'
+        indexes = [models.Index(fields=['archive'], name='archive')]
 
     def __str__(self):
         return self.mbtb_code
@@ -62,6 +66,64 @@ class OtherDetails(models.Model):
         db_table = 'other_details'
 
 
+# Read model of a donor: export columns of OtherDetailsSerializer (dimension names instead of ids) and the JSON
+# of the donor as rendered by PrimeDetailsSerializer and OtherDetailsSerializer. Maintained along with the donor's
+# rows (see resources.db_operations.donor_flat), other_details columns are empty for donors without other_details
+class DonorFlat(models.Model):
+    prime_details_id = models.OneToOneField(PrimeDetails, models.DO_NOTHING, primary_key=True,
+                                            db_column="prime_details_id", related_name='flat')
+    other_details_id = models.IntegerField(blank=True, null=True, db_index=True)
+    mbtb_code = models.CharField(max_length=255, unique=True)
+    sex = models.CharField(max_length=6, blank=True, null=True)
+    age = models.CharField(max_length=50, blank=True, null=True)
+    postmortem_interval = models.CharField(max_length=255, blank=True, null=True)
+    time_in_fix = models.CharField(max_length=255, blank=True, null=True)
+    neuropathology_diagnosis = models.CharField(max_length=255, blank=True, null=True)
+    tissue_type = models.CharField(max_length=255, blank=True, null=True)
+    preservation_method = models.CharField(max_length=20, blank=True, null=True)
+    storage_year = models.CharField(max_length=32, blank=True, null=True)
+    clinical_diagnosis = models.CharField(max_length=255, blank=True, null=True)
+    archive = models.CharField(max_length=3, blank=True, null=True)
+    race = models.CharField(max_length=255, blank=True, null=True)
+    duration = models.IntegerField(blank=True, null=True)
+    clinical_details = models.TextField(blank=True, null=True)
+    cause_of_death = models.CharField(max_length=255, blank=True, null=True)
+    brain_weight = models.IntegerField(blank=True, null=True)
+    neuropathology_summary = models.TextField(blank=True, null=True)
+    neuropathology_gross = models.TextField(blank=True, null=True)
+    neuropathology_microscopic = models.TextField(blank=True, null=True)
+    neouropathology_criteria = models.CharField(max_length=255, blank=True, null=True)
+    cerad = models.CharField(max_length=255, blank=True, null=True)
+    braak_stage = models.CharField(max_length=255, blank=True, null=True)
+    khachaturian = models.CharField(max_length=255, blank=True, null=True)
+    abc = models.CharField(max_length=255, blank=True, null=True)
+    autopsy_type = models.CharField(max_length=255, blank=True, null=True)
+    formalin_fixed = models.CharField(max_length=5, blank=True, null=True)
+    fresh_frozen = models.CharField(max_length=5, blank=True, null=True)
+    prime_details_json = models.BinaryField()
+    other_details_json = models.BinaryField(blank=True, null=True)
+    other_details_list_json = models.BinaryField(blank=True, null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'donor_flat'
+        indexes = [models.Index(fields=['neuropathology_diagnosis', 'tissue_type', 'sex', 'archive'], name='facets'),
+                   models.Index(fields=['archive', 'other_details_id'], name='flat_archive')]
+
+
+# Append-only log of donor changes, see resources.db_operations.change_log
+class ChangeLog(models.Model):
+    change_id = models.BigAutoField(primary_key=True)
+    prime_details_id = models.IntegerField()
+    operation = models.CharField(max_length=6)
+    version = models.BigIntegerField()  # version of the 'changes' counter of the entry's transaction
+    created_at = models.BigIntegerField()  # milliseconds since epoch
+
+    class Meta:
+        managed = False
+        db_table = 'change_log'
+
+
 class ImageRepository(models.Model):
     image_id = models.AutoField(primary_key=True)
     prime_details_id = models.ForeignKey(PrimeDetails, models.DO_NOTHING, db_column="prime_details_id")
@@ -115,7 +177,31 @@ class AdminAccount(models.Model):
 class UserAccount(models.Model):
     email = models.CharField(max_length=50)
     password_hash = models.CharField(max_length=50)
+    suspend = models.CharField(max_length=1, default='N')
 
     class Meta:
         managed = False
         db_table = 'users'
+
+
+# Append-only log of token revocations: revoke (suspended or deleted account) and restore (reverted account)
+# events of users, written by the users service
+class TokenRevocation(models.Model):
+    user_id = models.IntegerField()
+    revoked = models.BooleanField()
+    created_at = models.BigIntegerField(db_index=True)  # milliseconds since epoch
+
+    class Meta:
+        managed = False
+        db_table = 'token_revocations'
+
+
+# Version counters per namespace of cached data (e.g. 'donors', 'principals'), incremented in the transaction
+# of every change of the namespace's tables and polled by all workers of both services
+class CacheVersion(models.Model):
+    namespace = models.CharField(max_length=64, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = False
+        db_table = 'cache_versions'
@@ -26,12 +26,33 @@ class OtherDetailsSerializer(serializers.ModelSerializer):
     storage_year = serializers.CharField(source='prime_details_id.storage_year', read_only=True)
     autopsy_type = serializers.CharField(source='autopsy_type.autopsy_type', read_only=True)
     clinical_diagnosis = serializers.CharField(source='prime_details_id.clinical_diagnosis', read_only=True)
+    row_version = serializers.IntegerField(source='prime_details_id.row_version', read_only=True)
 
     class Meta:
         model = OtherDetails
         fields = "__all__"
 
 
+# Narrative text columns of `OtherDetails`, left out of lists unless expanded
+NARRATIVE_COLUMNS = ['clinical_details', 'neuropathology_summary', 'neuropathology_gross', 'neuropathology_microscopic']
+
+
+# Serializer for lists of `OtherDetails` model, without the narrative text columns
+class OtherDetailsListSerializer(OtherDetailsSerializer):
+
+    class Meta:
+        model = OtherDetails
+        exclude = NARRATIVE_COLUMNS
+
+
+# Serializer of the narrative text columns of a single record from `OtherDetails` model
+class NarrativeSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = OtherDetails
+        fields = ['prime_details_id', 'other_details_id'] + NARRATIVE_COLUMNS
+
+
 # Serializer for uploading data to `PrimeDetails` model
 class FileUploadPrimeDetailsSerializer(serializers.ModelSerializer):
 
@@ -48,6 +69,24 @@ class FileUploadOtherDetailsSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+# Serializer validating the prime_details columns of batch operations. Dimensions are resolved and mbtb_codes
+# checked for the whole batch (see BatchMutation), instead of a query per row.
+class BatchPrimeDetailsSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = PrimeDetails
+        exclude = ['tissue_type', 'neuro_diagnosis_id', 'archive']
+        extra_kwargs = {'mbtb_code': {'validators': []}}
+
+
+# Serializer validating the other_details columns of batch operations
+class BatchOtherDetailsSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = OtherDetails
+        exclude = ['prime_details_id', 'autopsy_type']
+
+
 # Serializer for inserting single row in `PrimeDetails` model
 # TODO: Switch to FileUploadPrimeDetailsSerializer if storage_year is added
 class InsertRowPrimeDetailsSerializer(serializers.ModelSerializer):
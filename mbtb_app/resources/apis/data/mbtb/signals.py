@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from resources.db_operations.change_log import DonorChanges, INSERT, UPDATE
+from resources.db_operations.donor_flat import DonorFlatTable
+from .models import PrimeDetails, OtherDetails
+
+
+# Refresh the donor_flat row of a donor and log its change whenever its prime_details are saved
+@receiver(post_save, sender=PrimeDetails)
+def refresh_prime_details(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        DonorFlatTable.changed([instance.prime_details_id])
+        DonorChanges.record(INSERT if created else UPDATE, [instance.prime_details_id])
+
+
+# Refresh the donor_flat row of a donor and log its change whenever its other_details are saved or deleted. Rows
+# of deleted prime_details are deleted along with them.
+@receiver([post_save, post_delete], sender=OtherDetails)
+def refresh_other_details(sender, instance, raw=False, **kwargs):
+    if not raw:
+        DonorFlatTable.changed([instance.prime_details_id_id])
+        DonorChanges.record(UPDATE, [instance.prime_details_id_id])
@@ -1,12 +1,44 @@
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase, force_authenticate, APIClient
-from .models import PrimeDetails, NeuropathologicalDiagnosis, TissueTypes, AutopsyTypes, OtherDetails, AdminAccount
+from django.db import connection, IntegrityError
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from .models import PrimeDetails, NeuropathologicalDiagnosis, TissueTypes, AutopsyTypes, OtherDetails, AdminAccount, \
+    UserAccount, TokenRevocation, CacheVersion, DonorFlat
 from .serializers import PrimeDetailsSerializer, OtherDetailsSerializer, FileUploadPrimeDetailsSerializer, \
-    FileUploadOtherDetailsSerializer, InsertRowPrimeDetailsSerializer
+    FileUploadOtherDetailsSerializer, InsertRowPrimeDetailsSerializer, OtherDetailsListSerializer, NARRATIVE_COLUMNS
 from resources.tests.common_tests import CommonTests
+from resources.analytics.dataset_snapshot import DatasetSnapshot
+from resources.caching.table_versions import TableVersions, DIMENSIONS, DONORS, CHANGES
+from resources.db_operations.change_log import DonorChanges, UPDATE
+from resources.caching.bloom_filter import BloomFilter
+from resources.caching.response_cache import RESPONSE_CACHE
+from resources.caching.revocation_list import RevocationList
+from resources.caching.single_flight import SingleFlight
+from resources.caching.token_cache import TokenCache
+from resources.metrics.metrics import Metrics
+from resources.permissions.base_operations import BaseOperations, TOKEN_CACHE, PRINCIPAL_CACHE, REVOCATION_LIST
+from rest_framework.exceptions import AuthenticationFailed
+from resources.renderers.fast_json_renderer import FastJSONRenderer
+from resources.middleware.admission_control import AdmissionQueue
+from resources.middleware.compression import Compressor, CompressionMiddleware
+from resources.renderers.msgpack_renderer import MessagePackRenderer, msgpack
+from datetime import datetime
+from decimal import Decimal
 import jwt
 import csv
+import io
+import json
 import os
+import threading
+import time
+import unittest
+from unittest import mock
+import uuid
+import zlib
 
 
 # This class is to set up test data
@@ -51,6 +83,11 @@ class SetUpTestData(APITestCase):
         }
         cls.token = jwt.encode(payload, "SECRET_KEY", algorithm='HS256')  # generating jwt token
         cls.client = APIClient(enforce_csrf_checks=True)  # enforcing csrf checks
+        # rows above are written without bumping versions, versions of rolled back tests are read again
+        TableVersions.poll(force=True)
+        caches['exports'].clear()
+        caches['responses'].clear()
+        RESPONSE_CACHE.clear()
 
     # Create CSV file once filename and data is provided
     def dict_to_csv_file(self, filename, data):
@@ -59,6 +96,14 @@ class SetUpTestData(APITestCase):
             writer.writeheader()
             writer.writerow(data)
 
+    # Run on_commit callbacks, the test's transaction is never committed
+    @staticmethod
+    def commit():
+        _callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for _, callback in _callbacks:
+            callback()
+        return len(_callbacks)
+
     @classmethod
     def tearDownClass(cls):
         OtherDetails.objects.all().delete()
@@ -84,7 +129,7 @@ class PrimeDetailsViewTest(SetUpTestData):
         response = self.client.get('/brain_dataset/')
         model_response = PrimeDetails.objects.all()
         serializer_response = PrimeDetailsSerializer(model_response, many=True)
-        self.assertEqual(response.data, serializer_response.data)
+        self.assertEqual(response.json(), serializer_response.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.client.credentials()
 
@@ -95,7 +140,7 @@ class PrimeDetailsViewTest(SetUpTestData):
         response = self.client.get(url)
         model_response = PrimeDetails.objects.get(pk=self.prime_details_1.pk)
         serializer_response = PrimeDetailsSerializer(model_response)
-        self.assertEqual(response.data, serializer_response.data)
+        self.assertEqual(response.json(), serializer_response.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.client.credentials()
 
@@ -152,11 +197,79 @@ class OtherDetailsViewTest(SetUpTestData):
         self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
         response = self.client.get('/other_details/')
         model_response = OtherDetails.objects.all()
-        serializer_response = OtherDetailsSerializer(model_response, many=True)
-        self.assertEqual(response.data, serializer_response.data)
+        serializer_response = OtherDetailsListSerializer(model_response, many=True)
+        self.assertEqual(response.json(), serializer_response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials()
+
+    # lists read no narrative text unless expanded
+    def test_get_all_expand_narrative(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/other_details/')
+        self.assertFalse(set(NARRATIVE_COLUMNS) & set(response.json()[0]))
+        self.assertFalse([query for query in queries if 'clinical_details' in query['sql']
+                          or '"other_details_json"' in query['sql']])
+
+        response = self.client.get('/other_details/?expand=narrative')
+        serializer_response = OtherDetailsSerializer(OtherDetails.objects.all(), many=True)
+        self.assertEqual(response.json(), serializer_response.data)
+        self.client.credentials()
+
+    # narrative text of a single record
+    def test_get_narrative(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.get('/other_details/' + str(self.prime_details_1.pk) + '/narrative/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.json()), {'prime_details_id', 'other_details_id'} | set(NARRATIVE_COLUMNS))
+        self.assertEqual(response.json()['clinical_details'], self.other_details_1.clinical_details)
+
+        response = self.client.get('/other_details/50/narrative/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.client.credentials()
+
+    # records of many donors in request order, from a single query
+    def test_batch(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        self.client.post('/add_new_data/', self.test_data, format='json')
+        _prime_details_2 = PrimeDetails.objects.get(mbtb_code=self.test_data['mbtb_code'])
+        _expected = [OtherDetailsSerializer(OtherDetails.objects.get(prime_details_id=prime_details)).data
+                     for prime_details in (_prime_details_2, self.prime_details_1)]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/other_details/batch/', {
+                'prime_details_ids': [_prime_details_2.pk, self.prime_details_1.pk]}, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'data': _expected, 'missing': []})
+        self.assertEqual(len([query for query in queries if 'donor_flat' in query['sql']]), 1)
+
+        response = self.client.post('/other_details/batch/', {
+            'prime_details_ids': [_prime_details_2.pk, 999, self.prime_details_1.pk, _prime_details_2.pk]},
+            format='json')
+        self.assertEqual(response.json(), {'data': _expected, 'missing': [999]})
+
+        response = self.client.post('/other_details/batch/', {
+            'mbtb_codes': [self.test_data['mbtb_code'], 'BB00-000', 'BB99-101']}, format='json')
+        self.assertEqual(response.json(), {'data': _expected, 'missing': ['BB00-000']})
+        self.client.credentials()
+
+    # batch requests with invalid input
+    def test_batch_invalid(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        for data in ({}, {'prime_details_ids': [1], 'mbtb_codes': ['BB99-101']}, {'prime_details_ids': []},
+                     {'prime_details_ids': '1'}, {'prime_details_ids': ['1']}, {'mbtb_codes': [1]}):
+            response = self.client.post('/other_details/batch/', data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('Error', response.json())
+
+        with self.settings(BATCH_RETRIEVE_LIMIT=2):
+            response = self.client.post('/other_details/batch/', {'prime_details_ids': [1, 2, 3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.client.credentials()
 
+        response = self.client.post('/other_details/batch/', {'prime_details_ids': [1]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     # get request for single other_details with valid token and payload data
     def test_get_single_request(self):
         url = '/other_details/' + str(self.prime_details_1.pk) + '/'
@@ -164,7 +277,7 @@ class OtherDetailsViewTest(SetUpTestData):
         response = self.client.get(url)
         model_response = OtherDetails.objects.get(pk=self.other_details_1.pk)
         serializer_response = OtherDetailsSerializer(model_response)
-        self.assertEqual(response.data, serializer_response.data)
+        self.assertEqual(response.json(), serializer_response.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.client.credentials()
 
@@ -351,6 +464,8 @@ class GetSelectOptionsViewTest(SetUpTestData):
     def setUp(self):
         super(SetUpTestData, self).setUpClass()
         self.common_tests = CommonTests(token=self.token, url='/get_select_options/')
+        TableVersions.bump(DIMENSIONS)  # fixtures are recreated for every test
+        self.commit()
 
         # Fetch following values: autopsy_type, tissue_type, neuropathology_diagnosis for comparison
         _neuropathology_diagnosis = NeuropathologicalDiagnosis.objects.values_list('neuro_diagnosis_name', flat=True) \
@@ -371,6 +486,26 @@ class GetSelectOptionsViewTest(SetUpTestData):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.client.credentials()
 
+    # cached response is revalidated with its ETag until the dimension tables' version changes
+    def test_etag(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.get('/get_select_options/')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        with CaptureQueriesContext(connection) as queries:
+            response_cached = self.client.get('/get_select_options/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response_cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse([query for query in queries if 'tissue_types' in query['sql']])
+
+        TissueTypes.objects.create(tissue_type="spinal cord")
+        TableVersions.bump(DIMENSIONS)
+        self.commit()
+        response_changed = self.client.get('/get_select_options/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response_changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response_changed['ETag'], response['ETag'])
+        self.assertEqual(response_changed.data['tissue_type'], ['brain', 'spinal cord'])
+        self.client.credentials()
+
     def test_common_tests(self):
         # Invalid delete request
         self.assertEquals(self.common_tests.invalid_request_with_error_msg(
@@ -908,6 +1043,48 @@ class EditDataAPIViewTest(SetUpTestData):
         self.assertEqual(response_is_number_check_error.data['Error'], predicted_msg)
         self.client.credentials()
 
+    # test: only changed columns are written, the donor's row_version is incremented
+    def test_changed_fields(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        self.client.patch(self.url, self.test_data, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, dict(self.test_data, age='71'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['Changed'], ['age'])
+        self.assertEqual(response.data['row_version'], 2)
+        _updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "prime_details"')]
+        self.assertEqual(len(_updates), 1)
+        self.assertNotIn('"mbtb_code"', _updates[0])
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE "other_details"')])
+        self.assertEqual(PrimeDetails.objects.get(pk=self.prime_details_1.pk).age, '71')
+        self.client.credentials()
+
+    # test: edits which change nothing don't write
+    def test_unchanged_edit(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        self.client.patch(self.url, self.test_data, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, self.test_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['Changed'], [])
+        self.assertEqual(response.data['row_version'], 1)
+        self.assertFalse([query for query in queries if query['sql'].startswith(('UPDATE', 'INSERT'))])
+        self.client.credentials()
+
+    # test: edits of an outdated row_version are rejected
+    def test_row_version_conflict(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        _loaded = dict(self.test_data, row_version=0)
+        self.assertEqual(self.client.patch(self.url, _loaded, format='json').status_code, status.HTTP_201_CREATED)
+        response = self.client.patch(self.url, dict(_loaded, age='71'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['row_version'], 1)
+        self.assertEqual(PrimeDetails.objects.get(pk=self.prime_details_1.pk).age, '70')
+
+        response = self.client.patch(self.url, dict(_loaded, row_version='test'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.credentials()
+
     def test_common_tests(self):
         # Invalid delete request
         self.assertEquals(self.common_tests.invalid_request_with_error_msg(
@@ -1014,3 +1191,1185 @@ class DeleteDataAPIViewTest(SetUpTestData):
     def tearDown(self):
         super(SetUpTestData, self).tearDownClass()
         del self.common_tests
+
+
+# This class is to test BatchDataAPIView: all request
+# Default: only POST request is allowed with admin auth_token, remaining requests are blocked
+class BatchDataAPIViewTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+        self.common_tests = CommonTests(token=self.token, url='/batch_data/')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+
+    # create, patch and delete in one request
+    def test_batch(self):
+        self.client.post('/add_new_data/', dict(self.test_data, mbtb_code='BB99-104'), format='json')
+        _deleted = PrimeDetails.objects.get(mbtb_code='BB99-104').prime_details_id
+        _operations = [
+            {'op': 'create', 'data': self.test_data},
+            {'op': 'patch', 'prime_details_id': self.prime_details_1.pk,
+             'data': {'sex': 'Male', 'brain_weight': '1200', 'autopsy_type': 'Spinal cord'}},
+            {'op': 'delete', 'prime_details_id': _deleted},
+        ]
+        response = self.client.post('/batch_data/', {'operations': _operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['Response'], 'Success')
+        _created = PrimeDetails.objects.get(mbtb_code=self.test_data['mbtb_code'])
+        self.assertEqual(response.data['Results'], [
+            {'op': 'create', 'status': 201, 'mbtb_code': 'BB99-102', 'prime_details_id': _created.pk},
+            {'op': 'patch', 'status': 200, 'prime_details_id': self.prime_details_1.pk},
+            {'op': 'delete', 'status': 200, 'prime_details_id': _deleted},
+        ])
+
+        self.assertEqual(OtherDetails.objects.get(prime_details_id=_created).neuropathology_summary,
+                         self.test_data['neuropathology_summary'])
+        _other_details = OtherDetails.objects.select_related('prime_details_id').get(pk=self.other_details_1.pk)
+        self.assertEqual((_other_details.prime_details_id.sex, _other_details.brain_weight,
+                          _other_details.race), ('Male', 1200, 'test'))
+        self.assertEqual(str(_other_details.autopsy_type), 'Spinal cord')
+        self.assertFalse(PrimeDetails.objects.filter(pk=_deleted).exists())
+
+        # donor_flat follows the bulk writes
+        self.assertEqual(dict(DonorFlat.objects.values_list('mbtb_code', 'autopsy_type')),
+                         {'BB99-101': 'Spinal cord', 'BB99-102': 'Brain'})
+        self.assertEqual(DonorFlat.objects.get(prime_details_id=self.prime_details_1.pk).sex, 'Male')
+
+    # nothing is changed if an operation fails
+    def test_batch_failure(self):
+        _operations = [
+            {'op': 'create', 'data': self.test_data},
+            {'op': 'patch', 'prime_details_id': 999, 'data': {'sex': 'Male'}},
+            {'op': 'patch', 'prime_details_id': self.prime_details_1.pk, 'data': {'duration': 'text'}},
+            {'op': 'delete', 'prime_details_id': self.prime_details_1.pk},
+            {'op': 'create', 'data': dict(self.test_data, mbtb_code='BB99-101')},
+            {'op': 'create', 'data': {'mbtb_code': 'BB99-105'}},
+            {'op': 'archive'},
+        ]
+        response = self.client.post('/batch_data/', {'operations': _operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['Response'], 'Failure')
+        self.assertEqual([result['status'] for result in response.data['Results']],
+                         [424, 404, 400, 400, 400, 400, 400])
+        self.assertIn('duration', response.data['Results'][2]['Error'])
+        self.assertFalse(PrimeDetails.objects.filter(mbtb_code=self.test_data['mbtb_code']).exists())
+        self.assertTrue(PrimeDetails.objects.filter(pk=self.prime_details_1.pk).exists())
+
+    # patches increment row_version, patches of another row_version fail
+    def test_batch_row_version(self):
+        _patch = {'op': 'patch', 'prime_details_id': self.prime_details_1.pk, 'data': {'sex': 'Male'}, 'row_version': 0}
+        response = self.client.post('/batch_data/', {'operations': [_patch]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(PrimeDetails.objects.get(pk=self.prime_details_1.pk).row_version, 1)
+
+        response = self.client.post('/batch_data/', {'operations': [_patch]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['Results'][0]['status'], 409)
+
+        # row_versions are parsed like edit_data/, other values than whole numbers are invalid
+        for row_version in (True, 1.0, 'one'):
+            response = self.client.post('/batch_data/', {'operations': [dict(_patch, row_version=row_version)]},
+                                        format='json')
+            self.assertEqual(response.data['Results'][0]['status'], 400)
+        response = self.client.post('/batch_data/', {'operations': [dict(_patch, row_version='1')]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(PrimeDetails.objects.get(pk=self.prime_details_1.pk).row_version, 2)
+
+    # changes of a batch which failed on a write aren't logged
+    def test_batch_integrity_error(self):
+        _cursor = self.client.get('/changes/').json()['cursor']
+        _operations = [
+            {'op': 'delete', 'prime_details_id': self.prime_details_1.pk},
+            {'op': 'create', 'data': self.test_data},
+        ]
+        with mock.patch.object(OtherDetails.objects, 'bulk_create', side_effect=IntegrityError('duplicate')):
+            response = self.client.post('/batch_data/', {'operations': _operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(PrimeDetails.objects.filter(pk=self.prime_details_1.pk).exists())
+
+        response = self.client.get('/changes/?since={}'.format(_cursor))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['changes'], [])
+
+    # create with the mbtb_code of a donor deleted in the same batch
+    def test_batch_replace(self):
+        _operations = [
+            {'op': 'delete', 'prime_details_id': self.prime_details_1.pk},
+            {'op': 'create', 'data': dict(self.test_data, mbtb_code='BB99-101')},
+        ]
+        response = self.client.post('/batch_data/', {'operations': _operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(DonorFlat.objects.values_list('mbtb_code', 'sex')), [('BB99-101', 'Male')])
+
+    # invalid batch requests
+    def test_batch_invalid(self):
+        for data in ({}, {'operations': []}, {'operations': {'op': 'delete'}}):
+            response = self.client.post('/batch_data/', data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.settings(BATCH_MUTATION_LIMIT=1):
+            response = self.client.post('/batch_data/', {'operations': [{'op': 'delete'}, {'op': 'delete'}]},
+                                        format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_common_tests(self):
+        self.client.credentials()
+        # Invalid get request
+        self.assertEquals(self.common_tests.invalid_request_with_error_msg(
+            request_type="get", predicted_msg="authorization", response_tag="detail", http_response="403"), True)
+
+        # Test: with empty token for post request
+        self.assertEquals(self.common_tests.request_with_empty_token(
+            request_type="post", predicted_msg="empty_token", response_tag="detail"), True)
+
+        # Test: with invalid token header for post request
+        self.assertEquals(self.common_tests.invalid_token_header(
+            request_type="post", predicted_msg="invalid_token_header", response_tag="detail"), True)
+
+        # Test: without token for post request
+        self.assertEquals(self.common_tests.request_without_token(
+            request_type="post", predicted_msg="invalid_token_header", response_tag="detail"), True)
+
+    def tearDown(self):
+        self.client.credentials()
+        super(SetUpTestData, self).tearDownClass()
+        del self.common_tests
+
+
+# This class is to test BulkDataAPIView: all request
+# Default: only POST request is allowed with admin auth_token, remaining requests are blocked
+class BulkDataAPIViewTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+        self.common_tests = CommonTests(token=self.token, url='/bulk_data/')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        self.client.post('/add_new_data/', self.test_data, format='json')
+        self.prime_details_2 = PrimeDetails.objects.get(mbtb_code=self.test_data['mbtb_code'])
+
+    def codes(self, url):
+        return [row['mbtb_code'] for row in self.client.get(url).json()]
+
+    # archived donors are left out of lists and downloads unless requested
+    def test_archive(self):
+        response = self.client.post('/bulk_data/', {'action': 'archive', 'mbtb_codes': ['BB99-101', 'BB00-000']},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['Count'], response.data['Missing']), (1, ['BB00-000']))
+        self.commit()
+        self.assertEqual(PrimeDetails.objects.get(pk=self.prime_details_1.pk).archive, 'Yes')
+
+        self.assertEqual(self.codes('/brain_dataset/'), ['BB99-102'])
+        self.assertEqual(self.codes('/brain_dataset/?archived=include'), ['BB99-101', 'BB99-102'])
+        self.assertEqual(self.codes('/brain_dataset/?archived=only'), ['BB99-101'])
+        self.assertEqual(self.codes('/other_details/'), ['BB99-102'])
+        self.assertEqual(self.client.get('/brain_dataset/{}/'.format(self.prime_details_1.pk)).json()['archive'],
+                         'Yes')
+        self.assertEqual(self.client.get('/brain_dataset/?archived=all').status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post('/download_data/', {'download_mode': 'all'}, format='json')
+        self.assertEqual([row['mbtb_code'] for row in response.json()], ['BB99-102'])
+        response = self.client.post('/download_data/', {'download_mode': 'all', 'archived': 'include'},
+                                    format='json')
+        self.assertEqual([row['mbtb_code'] for row in response.json()], ['BB99-101', 'BB99-102'])
+
+        response = self.client.post('/bulk_data/', {'action': 'unarchive', 'filter': {'archive': ['Yes']}},
+                                    format='json')
+        self.commit()
+        self.assertEqual((response.data['Count'], response.data['Missing']), (1, []))
+        self.assertEqual(self.codes('/brain_dataset/'), ['BB99-101', 'BB99-102'])
+
+    # deletes are a single statement, the database deletes the donors' other rows
+    def test_delete(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/bulk_data/', {'action': 'delete', 'filter': {
+                'neuropathology_diagnosis': ['Mixed AD VAD'], 'sex': ['Male']}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['Count'], 1)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('DELETE')]), 1)
+
+        self.assertEqual(list(PrimeDetails.objects.values_list('mbtb_code', flat=True)), ['BB99-101'])
+        self.assertFalse(OtherDetails.objects.filter(prime_details_id=self.prime_details_2.pk).exists())
+        self.assertFalse(DonorFlat.objects.filter(prime_details_id=self.prime_details_2.pk).exists())
+
+    # filters read the donors' tables, not donor_flat: donors missing in it are selected too
+    def test_filter_without_donor_flat(self):
+        DonorFlat.objects.all().delete()
+        response = self.client.post('/bulk_data/', {'action': 'archive', 'filter': {
+            'tissue_type': ['Brain'], 'autopsy_type': ['Brain'], 'khachaturian': ['30']}}, format='json')
+        self.assertEqual(response.data['Count'], 1)
+        self.assertEqual(PrimeDetails.objects.get(pk=self.prime_details_2.pk).archive, 'Yes')
+
+        response = self.client.post('/bulk_data/', {'action': 'unarchive', 'filter': {'archive': ['Yes']}},
+                                    format='json')
+        self.assertEqual(response.data['Count'], 1)
+        response = self.client.post('/bulk_data/', {'action': 'delete', 'filter': {'race': ['unknown']}},
+                                    format='json')
+        self.assertEqual(response.data['Count'], 0)
+
+    # invalid bulk requests
+    def test_invalid(self):
+        for data in ({'action': 'delete'}, {'action': 'purge', 'mbtb_codes': ['BB99-101']},
+                     {'action': 'delete', 'mbtb_codes': 'BB99-101'}, {'action': 'delete', 'filter': {'age': [90]}},
+                     {'action': 'archive', 'filter': {'sex': 'Male'}},
+                     {'action': 'delete', 'filter': {'sex': [['Male']]}}, {'action': 'delete', 'filter': {'sex': [{}]}},
+                     [{}]):
+            response = self.client.post('/bulk_data/', data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('Error', response.data)
+        self.assertEqual(PrimeDetails.objects.count(), 2)
+
+    def test_common_tests(self):
+        self.client.credentials()
+        # Invalid get request
+        self.assertEquals(self.common_tests.invalid_request_with_error_msg(
+            request_type="get", predicted_msg="authorization", response_tag="detail", http_response="403"), True)
+
+        # Test: with empty token for post request
+        self.assertEquals(self.common_tests.request_with_empty_token(
+            request_type="post", predicted_msg="empty_token", response_tag="detail"), True)
+
+        # Test: with invalid token header for post request
+        self.assertEquals(self.common_tests.invalid_token_header(
+            request_type="post", predicted_msg="invalid_token_header", response_tag="detail"), True)
+
+    def tearDown(self):
+        self.client.credentials()
+        super(SetUpTestData, self).tearDownClass()
+        del self.common_tests
+
+
+# This class is to test AnalysisAPIView: all request
+# Default: only POST request is allowed with auth_token, remaining requests are blocked
+class AnalysisAPIViewTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+        self.common_tests = CommonTests(token=self.token, url='/analysis/')
+        self.prime_details_2 = PrimeDetails.objects.create(
+            neuro_diagnosis_id=self.neuro_diagnosis_1, tissue_type=self.tissue_type_1, mbtb_code="BB99-102",
+            sex="Male", age="70", postmortem_interval="Not known", time_in_fix="10",
+            preservation_method='Fresh Frozen', storage_year="2018-06-06T03:03:03", archive="No"
+        )
+        OtherDetails.objects.create(
+            prime_details_id=self.prime_details_2, autopsy_type=self.autopsy_type_1, duration=7, brain_weight=1081
+        )
+        DatasetSnapshot.rebuild()  # fixtures are recreated for every test
+
+    # snapshot is published as a new version and mapped read-only by workers
+    def test_snapshot_versions(self):
+        snapshot = DatasetSnapshot.get()
+        self.assertEqual(snapshot.version, DatasetSnapshot.current_version())
+        self.assertEqual(snapshot.size, 2)
+        self.assertEqual(snapshot.categories['sex'].tolist(), ['Female', 'Male'])
+        self.assertFalse(snapshot.numeric['age'].flags.writeable)
+
+        # unchanged version is not mapped again, a rebuild publishes a newer version
+        self.assertIs(DatasetSnapshot.get(), snapshot)
+        _version = DatasetSnapshot.rebuild()
+        self.assertGreater(_version, snapshot.version)
+        self.assertEqual(DatasetSnapshot.get().version, _version)
+
+    # valid post request grouped by sex
+    def test_group_by(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.post('/analysis/', {
+            'metrics': ['brain_weight', 'postmortem_interval'], 'group_by': 'sex', 'quantiles': [0.5], 'bins': 2
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(list(response.data['metrics']), ['brain_weight', 'postmortem_interval'])
+
+        brain_weight = response.data['metrics']['brain_weight']
+        self.assertEqual(brain_weight['bin_edges'], [123.0, 602.0, 1081.0])
+        self.assertEqual([group['group'] for group in brain_weight['groups']], ['Female', 'Male'])
+        self.assertEqual([group['mean'] for group in brain_weight['groups']], [123.0, 1081.0])
+        self.assertEqual([group['histogram'] for group in brain_weight['groups']], [[1, 0], [0, 1]])
+        self.assertEqual(brain_weight['groups'][1]['quantiles'], {'0.5': 1081.0})
+
+        # postmortem_interval 'Not known' is counted as missing
+        postmortem_interval = response.data['metrics']['postmortem_interval']
+        self.assertEqual(postmortem_interval['groups'][1]['count'], 0)
+        self.assertEqual(postmortem_interval['groups'][1]['missing'], 1)
+        self.assertEqual(postmortem_interval['groups'][1]['mean'], None)
+        self.client.credentials()
+
+    # valid post request for a cohort, without grouping
+    def test_cohort(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.post('/analysis/', {
+            'metrics': ['age'], 'cohort': {'neuropathology_diagnosis': ['Mixed AD VAD'], 'age': {'min': 80}}
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 1)
+        self.assertEqual(response.data['metrics']['age']['groups'][0]['group'], None)
+        self.assertEqual(response.data['metrics']['age']['groups'][0]['quantiles'],
+                         {'0.25': 92.0, '0.5': 92.0, '0.75': 92.0})
+        self.client.credentials()
+
+    # post request with invalid options
+    def test_invalid_options(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response_invalid_metric = self.client.post('/analysis/', {'metrics': ['weight']}, format='json')
+        response_invalid_cohort = self.client.post('/analysis/', {'cohort': {'weight': [1]}}, format='json')
+        response_invalid_range = self.client.post('/analysis/', {'cohort': {'age': [1]}}, format='json')
+        response_invalid_group = self.client.post('/analysis/', {'group_by': 'brain_weight'}, format='json')
+        self.assertEqual(response_invalid_metric.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response_invalid_cohort.data['Error'], "Invalid cohort column: 'weight'.")
+        self.assertEqual(response_invalid_range.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response_invalid_group.data['Error'], "Invalid group_by column: 'brain_weight'.")
+        self.assertEqual(self.client.post('/analysis/', {'metrics': 5}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post('/analysis/', {'group_by': ['sex']}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+        # bins are whole numbers
+        for bins in (2.7, True, '2.7'):
+            self.assertEqual(self.client.post('/analysis/', {'bins': bins}, format='json').status_code,
+                             status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post('/analysis/', {'bins': '3'}, format='json').status_code,
+                         status.HTTP_200_OK)
+
+        # bodies of analytics endpoints are objects
+        for url in ('/analysis/', '/crosstab/', '/matched_controls/'):
+            response = self.client.post(url, [{'metrics': ['age']}], format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['Error'], 'Please provide an object of options.')
+        self.client.credentials()
+
+    def test_common_tests(self):
+        # Invalid delete request
+        self.assertEquals(self.common_tests.invalid_request_with_error_msg(
+            request_type="delete", predicted_msg="not_allowed", response_tag="detail", http_response="405"), True)
+
+        # Invalid get request
+        self.assertEquals(self.common_tests.invalid_request_with_error_msg(
+            request_type="get", predicted_msg="authorization", response_tag="detail", http_response="403"), True)
+
+        # Test: with empty token for post request
+        self.assertEquals(self.common_tests.request_with_empty_token(
+            request_type="post", predicted_msg="empty_token", response_tag="detail"), True)
+
+        # Test: with invalid token header for post request
+        self.assertEquals(self.common_tests.invalid_token_header(
+            request_type="post", predicted_msg="invalid_token_header", response_tag="detail"), True)
+
+        # Test: without token for post request
+        self.assertEquals(self.common_tests.request_without_token(
+            request_type="post", predicted_msg="invalid_token_header", response_tag="detail"), True)
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+        del self.common_tests
+
+
+# This class is to test CrossTabulationAPIView: all request
+# Default: only POST request is allowed with auth_token, remaining requests are blocked
+class CrossTabulationAPIViewTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+        self.common_tests = CommonTests(token=self.token, url='/crosstab/')
+        neuro_diagnosis_2 = NeuropathologicalDiagnosis.objects.create(neuro_diagnosis_name="ALZHEIMER'S DISEASE")
+        for index, (sex, neuro_diagnosis) in enumerate([
+                ("Male", self.neuro_diagnosis_1), ("Male", neuro_diagnosis_2), ("Female", neuro_diagnosis_2)]):
+            prime_details = PrimeDetails.objects.create(
+                neuro_diagnosis_id=neuro_diagnosis, tissue_type=self.tissue_type_1, mbtb_code="BB99-20" + str(index),
+                sex=sex, age="70", storage_year="2018-06-06T03:03:03", archive="No"
+            )
+            OtherDetails.objects.create(
+                prime_details_id=prime_details, autopsy_type=self.autopsy_type_1, braak_stage='' if index else 'V'
+            )
+        DatasetSnapshot.rebuild()  # fixtures are recreated for every test
+
+    # valid post request for two columns with chi-square statistics
+    def test_crosstab(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.post('/crosstab/', {
+            'columns': ['neuropathology_diagnosis', 'sex'], 'chi_square': True
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 4)
+        self.assertEqual(response.data['categories'], {
+            'neuropathology_diagnosis': ["ALZHEIMER'S DISEASE", 'Mixed AD VAD'], 'sex': ['Female', 'Male']
+        })
+        self.assertEqual(response.data['counts'], [[1, 1], [1, 1]])
+        self.assertEqual(response.data['margins']['sex'], [2, 2])
+        self.assertEqual(response.data['chi_square'], {'statistic': 0.0, 'dof': 1, 'p_value': 1.0})
+        self.client.credentials()
+
+    # valid post request for three columns in a cohort, with and without missing values
+    def test_crosstab_cohort(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        data = {'columns': ['neuropathology_diagnosis', 'sex', 'braak_stage'], 'cohort': {'sex': ['Male']}}
+        response = self.client.post('/crosstab/', data, format='json')
+        response_with_missing = self.client.post('/crosstab/', dict(data, include_missing=True), format='json')
+        self.assertEqual(response.data['total'], 1)
+        self.assertEqual(response.data['counts'], [[[1]]])
+        self.assertEqual(response_with_missing.data['total'], 2)
+        self.assertEqual(response_with_missing.data['categories']['braak_stage'], ['V', None])
+        self.assertEqual(response_with_missing.data['counts'], [[[0, 1]], [[1, 0]]])
+
+        # options of form posts are strings
+        response_form = self.client.post('/crosstab/', dict(data, include_missing='false', chi_square='false'),
+                                         format='json')
+        self.assertEqual(response_form.data['total'], 1)
+        self.assertNotIn('chi_square', response_form.data)
+        response_invalid = self.client.post('/crosstab/', dict(data, include_missing='no'), format='json')
+        self.assertEqual(response_invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.credentials()
+
+    # post request with invalid columns
+    def test_invalid_columns(self):
+        predicted_msg = 'Please provide 2 or 3 columns.'
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response_single_column = self.client.post('/crosstab/', {'columns': ['sex']}, format='json')
+        response_invalid_column = self.client.post('/crosstab/', {'columns': ['sex', 'age']}, format='json')
+        self.assertEqual(response_single_column.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response_single_column.data['Error'], predicted_msg)
+        self.assertEqual(response_invalid_column.status_code, status.HTTP_400_BAD_REQUEST)
+        response_nested_column = self.client.post('/crosstab/', {'columns': [['sex'], 'age']}, format='json')
+        self.assertEqual(response_nested_column.data['Error'], predicted_msg)
+
+        # identifiers have a category per donor
+        response_identifier = self.client.post('/crosstab/', {'columns': ['mbtb_code', 'sex']}, format='json')
+        self.assertEqual(response_identifier.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.credentials()
+
+    # tables are as large as the categories which occur, larger ones than CROSSTAB_MAX_CELLS are rejected
+    def test_max_cells(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        data = {'columns': ['neuropathology_diagnosis', 'sex'], 'cohort': {'sex': ['Male']}}
+        with self.settings(CROSSTAB_MAX_CELLS=2):
+            response = self.client.post('/crosstab/', data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['counts'], [[1], [1]])
+            response = self.client.post('/crosstab/', dict(data, cohort={}), format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.credentials()
+
+    def test_common_tests(self):
+        # Invalid delete request
+        self.assertEquals(self.common_tests.invalid_request_with_error_msg(
+            request_type="delete", predicted_msg="not_allowed", response_tag="detail", http_response="405"), True)
+
+        # Invalid get request
+        self.assertEquals(self.common_tests.invalid_request_with_error_msg(
+            request_type="get", predicted_msg="authorization", response_tag="detail", http_response="403"), True)
+
+        # Test: with empty token for post request
+        self.assertEquals(self.common_tests.request_with_empty_token(
+            request_type="post", predicted_msg="empty_token", response_tag="detail"), True)
+
+        # Test: with invalid token header for post request
+        self.assertEquals(self.common_tests.invalid_token_header(
+            request_type="post", predicted_msg="invalid_token_header", response_tag="detail"), True)
+
+        # Test: without token for post request
+        self.assertEquals(self.common_tests.request_without_token(
+            request_type="post", predicted_msg="invalid_token_header", response_tag="detail"), True)
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+        del self.common_tests
+
+
+# This class is to test MatchedControlsAPIView: all request
+# Default: only POST request is allowed with auth_token, remaining requests are blocked
+class MatchedControlsAPIViewTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+        self.common_tests = CommonTests(token=self.token, url='/matched_controls/')
+        neuro_diagnosis_2 = NeuropathologicalDiagnosis.objects.create(neuro_diagnosis_name="CONTROL")
+        for mbtb_code, sex, age, neuro_diagnosis in [
+                ("BB99-201", "Female", "90", neuro_diagnosis_2), ("BB99-202", "Female", "93", neuro_diagnosis_2),
+                ("BB99-203", "Male", "92", neuro_diagnosis_2), ("BB99-204", "Female", "91", self.neuro_diagnosis_1),
+                ("BB99-205", "Female", "Not known", neuro_diagnosis_2)]:
+            prime_details = PrimeDetails.objects.create(
+                neuro_diagnosis_id=neuro_diagnosis, tissue_type=self.tissue_type_1, mbtb_code=mbtb_code, sex=sex,
+                age=age, postmortem_interval="15", storage_year="2018-06-06T03:03:03", archive="No"
+            )
+            OtherDetails.objects.create(prime_details_id=prime_details, autopsy_type=self.autopsy_type_1)
+        DatasetSnapshot.rebuild()  # fixtures are recreated for every test
+
+    # valid post request: closest female control outside of excluded diagnosis, unknown cases are reported
+    def test_matched_controls(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.post('/matched_controls/', {
+            'cases': ['BB99-101', 'BB99-999'], 'exclude_diagnoses': ['Mixed AD VAD'], 'age_tolerance': 5,
+            'postmortem_interval_tolerance': 2
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['missing'], ['BB99-999'])
+        self.assertEqual(response.data['matches'], [{
+            'case': 'BB99-101', 'control': 'BB99-202', 'distance': 0.2, 'age_difference': 1.0,
+            'postmortem_interval_difference': 0.0
+        }])
+        self.client.credentials()
+
+    # valid post request: each control is used once, cases without a control within tolerance get none
+    def test_greedy_assignment(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.post('/matched_controls/', {
+            'cases': ['BB99-204', 'BB99-101'], 'exact': ['sex'], 'age_tolerance': 1,
+            'cohort': {'mbtb_code': ['BB99-201', 'BB99-202', 'BB99-203', 'BB99-205']}
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(match['case'], match['control']) for match in response.data['matches']],
+                         [('BB99-204', 'BB99-201'), ('BB99-101', 'BB99-202')])
+
+        response_no_match = self.client.post('/matched_controls/', {
+            'cases': ['BB99-101'], 'age_tolerance': 0.5, 'exclude_diagnoses': ['Mixed AD VAD']
+        }, format='json')
+        self.assertEqual(response_no_match.data['matches'], [{'case': 'BB99-101', 'control': None, 'distance': None}])
+        self.client.credentials()
+
+    # post request with invalid options
+    def test_invalid_options(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response_no_cases = self.client.post('/matched_controls/', {'cases': []}, format='json')
+        response_unknown_cases = self.client.post('/matched_controls/', {'cases': ['BB99-999']}, format='json')
+        response_invalid_tolerance = self.client.post(
+            '/matched_controls/', {'cases': ['BB99-101'], 'age_tolerance': 0}, format='json')
+        self.assertEqual(response_no_cases.data['Error'], 'Please provide 1 to 200 case mbtb_code values.')
+        self.assertEqual(response_unknown_cases.data['Error'], 'Invalid mbtb_code present, case data not found')
+        self.assertEqual(response_invalid_tolerance.data['Error'], 'Tolerances should be greater than zero.')
+
+        # options of other types than lists of strings and finite numbers
+        for data in ({'exact': 5}, {'exact': [['sex']]}, {'cases': [{'a': 1}]}, {'cases': [['x']]},
+                     {'exclude_diagnoses': 5}, {'age_tolerance': 'nan'}, {'age_tolerance': True},
+                     {'postmortem_interval_tolerance': 'inf'}):
+            response = self.client.post('/matched_controls/', dict({'cases': ['BB99-101']}, **data), format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('Error', response.data)
+        self.client.credentials()
+
+    def test_common_tests(self):
+        # Invalid delete request
+        self.assertEquals(self.common_tests.invalid_request_with_error_msg(
+            request_type="delete", predicted_msg="not_allowed", response_tag="detail", http_response="405"), True)
+
+        # Invalid get request
+        self.assertEquals(self.common_tests.invalid_request_with_error_msg(
+            request_type="get", predicted_msg="authorization", response_tag="detail", http_response="403"), True)
+
+        # Test: with empty token for post request
+        self.assertEquals(self.common_tests.request_with_empty_token(
+            request_type="post", predicted_msg="empty_token", response_tag="detail"), True)
+
+        # Test: with invalid token header for post request
+        self.assertEquals(self.common_tests.invalid_token_header(
+            request_type="post", predicted_msg="invalid_token_header", response_tag="detail"), True)
+
+        # Test: without token for post request
+        self.assertEquals(self.common_tests.request_without_token(
+            request_type="post", predicted_msg="invalid_token_header", response_tag="detail"), True)
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+        del self.common_tests
+
+
+# This class is to test FastJSONRenderer: rendered documents should be the same as with DRF's JSONRenderer
+class FastJSONRendererTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+
+    def test_render(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.get('/brain_dataset/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        serializer_response = PrimeDetailsSerializer(PrimeDetails.objects.all(), many=True)
+        self.assertEqual(json.loads(response.content), json.loads(JSONRenderer().render(serializer_response.data)))
+        self.client.credentials()
+
+        # types emitted by both services
+        data = {
+            'storage_year': datetime(2018, 6, 6, 3, 3, 3), 'brain_weight': Decimal('1081.5'),
+            'tissue_request_number': uuid.UUID('2c9fd0b8-8a7f-4a0c-9d1b-6e0f0b7c3a11'), 'archive': None
+        }
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+
+
+# This class is to test CompressionMiddleware: negotiated encoding, size threshold and streaming responses
+class CompressionMiddlewareTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+
+    @override_settings(COMPRESSION_MIN_SIZE=0)
+    def test_compressed_response(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.get('/brain_dataset/')
+        response_gzip = self.client.get('/brain_dataset/', HTTP_ACCEPT_ENCODING='gzip;q=1.0, unknown')
+        response_refused = self.client.get('/brain_dataset/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response_gzip['Content-Encoding'], 'gzip')
+        self.assertEqual(zlib.decompress(response_gzip.content, 16 + zlib.MAX_WBITS), response.content)
+        self.assertFalse(response_refused.has_header('Content-Encoding'))
+        self.client.credentials()
+
+    def test_small_response(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.get('/brain_dataset/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.client.credentials()
+
+    def test_streaming(self):
+        middleware = CompressionMiddleware(lambda request: None)
+        self.assertEqual(middleware.negotiate('br;q=0.5, gzip;q=0.8', {'gzip': 6, 'br': 5}), 'gzip')
+        self.assertEqual(middleware.negotiate('*;q=0', {'gzip': 6}), None)
+
+        chunks = [b'{"mbtb_code": "BB99-101"},' * 10] * 3
+        compressed = list(middleware.compress_stream(iter(chunks), Compressor(encoding='gzip', level=6)))
+        self.assertEqual(len(compressed), 4)
+        self.assertEqual(zlib.decompress(b''.join(compressed), 16 + zlib.MAX_WBITS), b''.join(chunks))
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+
+
+# This class is to test MessagePack rendering and parsing, selected with Accept and Content-Type headers
+@unittest.skipIf(msgpack is None, 'msgpack is not installed')
+class MessagePackTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+
+    def test_render_and_parse(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response_json = self.client.get('/other_details/')
+        response = self.client.get('/other_details/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content, raw=False), json.loads(response_json.content))
+
+        response = self.client.post('/download_data/', msgpack.packb({'download_mode': 'all'}),
+                                    content_type='application/msgpack', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(msgpack.unpackb(response.content, raw=False)[0]['mbtb_code'], 'BB99-101')
+
+        response_invalid = self.client.post('/download_data/', b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response_invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.credentials()
+
+    # integers stay integers, datetimes become timestamps
+    def test_types(self):
+        data = {'duration': 123, 'storage_year': datetime(2018, 6, 6, 3, 3, 3), 'brain_weight': Decimal('1081.5')}
+        decoded = msgpack.unpackb(MessagePackRenderer().render(data), raw=False, timestamp=3)
+        self.assertEqual(decoded['duration'], 123)
+        self.assertEqual(decoded['storage_year'].replace(tzinfo=None), data['storage_year'])
+        self.assertEqual(decoded['brain_weight'], 1081.5)
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+
+
+# This class is to test the verified token cache of BaseOperations and the metrics/ endpoint
+class TokenCacheTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+        TOKEN_CACHE.clear()
+        PRINCIPAL_CACHE.clear()
+        Metrics.reset()
+
+    def test_decode_credentials(self):
+        _response = BaseOperations().decode_credentials(self.token)
+        self.assertEqual(BaseOperations().decode_credentials(self.token), _response)
+        self.assertEqual(Metrics.snapshot()['counters'], {'token_cache.misses': 1, 'token_cache.hits': 1})
+
+        # tampered signature of a cached token is verified again
+        with self.assertRaises(AuthenticationFailed):
+            BaseOperations().decode_credentials(self.token[:-2] + (b'AA' if self.token[-2:] != b'AA' else b'BB'))
+
+        # expired tokens are rejected and never cached
+        _expired_token = jwt.encode({'id': 1, 'email': self.email, 'exp': int(time.time()) - 1}, "SECRET_KEY",
+                                    algorithm='HS256')
+        with self.assertRaises(AuthenticationFailed):
+            BaseOperations().decode_credentials(_expired_token)
+
+    def test_expiry_and_size(self):
+        token_cache = TokenCache(max_size=2, ttl=60)
+        token_cache.set(b'a', {'id': 1}, expires_at=time.time() - 1)  # `exp` claim already passed
+        token_cache.set(b'b', {'id': 2})
+        token_cache.set(b'c', {'id': 3})
+        token_cache.get(b'b')
+        token_cache.set(b'd', {'id': 4})  # evicts least recently used 'c'
+        self.assertEqual([token_cache.get(token) for token in [b'a', b'b', b'c', b'd']],
+                         [None, {'id': 2}, None, {'id': 4}])
+
+    def test_metrics(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        self.client.get('/metrics/')
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['counters']['principal_cache.hits'], 1)
+        self.assertEqual(response.data['gauges']['principal_cache.size'], 1)
+        self.client.credentials()
+
+    # principal is resolved with a single query, warm requests make no auth queries
+    def test_principal_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/metrics/')
+        self.assertEqual(len(queries), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/metrics/')
+        self.assertEqual(len(queries), 0)
+        self.client.credentials()
+
+    # suspended users are denied, admins only pass IsAdmin
+    def test_principal_roles(self):
+        _user = UserAccount.objects.create(email='user@mbtb.ca', password_hash='asdfghjkl123')
+        _suspended_user = UserAccount.objects.create(email='suspended@mbtb.ca', password_hash='a', suspend='Y')
+        _tokens = [jwt.encode({'id': user.id, 'email': user.email}, "SECRET_KEY", algorithm='HS256').decode('utf-8')
+                   for user in [_user, _suspended_user]]
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + _tokens[0])
+        self.assertEqual(self.client.get('/get_select_options/').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + _tokens[1])
+        self.assertEqual(self.client.get('/get_select_options/').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.credentials()
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+
+
+# This class is to test authorization from the role claim of tokens and the revocation list
+class RoleClaimTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+        TOKEN_CACHE.clear()
+        PRINCIPAL_CACHE.clear()
+        self.user = UserAccount.objects.create(email='user@mbtb.ca', password_hash='asdfghjkl123')
+        self.user_token = jwt.encode({'id': self.user.id, 'email': self.user.email, 'role': 'user',
+                                      'exp': int(time.time()) + 60}, "SECRET_KEY", algorithm='HS256')
+        REVOCATION_LIST.poll(force=True)
+
+    # reads are authorized from the claim without queries, admin routes still need the admin claim
+    def test_claimed_reads(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.user_token.decode('utf-8'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/brain_dataset/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries if 'users' in query['sql'] or 'admins' in query['sql']])
+        self.assertEqual(self.client.get('/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.credentials()
+
+    # admin writes check the account in the DB, even with an admin claim
+    def test_admin_write_checks_account(self):
+        _token = jwt.encode({'id': self.user.id, 'email': self.user.email, 'role': 'admin'}, "SECRET_KEY",
+                            algorithm='HS256')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + _token.decode('utf-8'))
+        self.assertEqual(self.client.delete('/delete_data/1/').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.credentials()
+
+    # tokens of revoked users are denied once the list is reloaded
+    def test_revoked_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.user_token.decode('utf-8'))
+        self.assertEqual(self.client.get('/get_select_options/').status_code, status.HTTP_200_OK)
+        TokenRevocation.objects.create(user_id=self.user.id, revoked=True, created_at=int(time.time() * 1000))
+        REVOCATION_LIST.poll(force=True)
+        self.assertEqual(self.client.get('/get_select_options/').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertIn('revocation_list.propagation_delay_ms', Metrics.snapshot()['gauges'])
+
+        # reverted account
+        TokenRevocation.objects.create(user_id=self.user.id, revoked=False, created_at=int(time.time() * 1000))
+        REVOCATION_LIST.poll(force=True)
+        self.assertEqual(self.client.get('/get_select_options/').status_code, status.HTTP_200_OK)
+        self.client.credentials()
+
+    # events are applied once in id order, also when a lower id shows up late; old revocations are dropped
+    def test_revocation_events(self):
+        _now = int(time.time() * 1000)
+        revocation_list = RevocationList(lifetime=60)
+        revocation_list.apply(events=[(2, 7, True, _now), (3, 8, True, _now)], now=_now)
+        self.assertEqual([revocation_list.is_revoked(user_id) for user_id in [7, 8, 9]], [True, True, False])
+
+        revocation_list.apply(events=[(1, 8, False, _now), (2, 7, True, _now), (4, 7, False, _now)], now=_now)
+        self.assertEqual([revocation_list.is_revoked(user_id) for user_id in [7, 8]], [False, True])
+
+        revocation_list.apply(events=[], now=_now + 61 * 1000)
+        self.assertFalse(revocation_list.is_revoked(8))
+
+    # an event which commits after a higher id was polled is still applied, polls don't compare clocks
+    def test_late_commit(self):
+        revocation_list = RevocationList(lifetime=60)
+        _user = UserAccount.objects.create(email='late@mbtb.ca', password_hash='asdfghjkl123')
+        TokenRevocation.objects.create(id=1005, user_id=self.user.id, revoked=False, created_at=int(time.time() * 1000))
+        revocation_list.poll(force=True)
+        TokenRevocation.objects.create(id=1008, user_id=self.user.id, revoked=True, created_at=int(time.time() * 1000))
+        revocation_list.poll(force=True)
+        self.assertTrue(revocation_list.is_revoked(self.user.id))
+
+        # 1006 and 1007 are gaps, read again until they show up: a writer's clock far behind doesn't matter
+        TokenRevocation.objects.create(id=1006, user_id=_user.id, revoked=True,
+                                       created_at=int(time.time() * 1000) - 30 * 1000)
+        revocation_list.poll(force=True)
+        self.assertTrue(revocation_list.is_revoked(_user.id))
+        self.assertEqual(list(revocation_list._gaps), [1007])
+
+    def test_bloom_filter(self):
+        bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+        for key in range(0, 2000, 2):
+            bloom_filter.add(key)
+        self.assertTrue(all(key in bloom_filter for key in range(0, 2000, 2)))
+        self.assertLess(sum(key in bloom_filter for key in range(1, 20001, 2)), 300)
+
+    def tearDown(self):
+        TokenRevocation.objects.all().delete()
+        UserAccount.objects.all().delete()
+        REVOCATION_LIST.poll(force=True)
+        super(SetUpTestData, self).tearDownClass()
+
+
+# This class is to test admission control of endpoint classes
+class AdmissionControlTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+        Metrics.reset()
+
+    # requests wait for a free slot while the queue has room, others are rejected right away
+    def test_admission_queue(self):
+        admission_queue = AdmissionQueue(name='admission.test', limit=1, queue=1, timeout=5)
+        self.assertTrue(admission_queue.acquire())
+
+        _results = []
+        _waiting = threading.Thread(target=lambda: _results.append(admission_queue.acquire()))
+        _waiting.start()
+        while admission_queue.waiting == 0:
+            time.sleep(0.001)
+        self.assertFalse(admission_queue.acquire())  # queue is full
+        admission_queue.release()
+        _waiting.join()
+        self.assertEqual(_results, [True])
+
+        _gauges = Metrics.snapshot()['gauges']
+        self.assertEqual((_gauges['admission.test.active'], _gauges['admission.test.queue_depth']), (1, 0))
+        self.assertEqual(Metrics.snapshot()['counters']['admission.test.rejected'], 1)
+
+        # waiting times out
+        admission_queue.timeout = 0.01
+        self.assertFalse(admission_queue.acquire())
+
+    @override_settings(ADMISSION_CLASSES={
+        'light_read': {'routes': ['get_select_options'], 'limit': 0, 'queue': 0, 'timeout': 3},
+    })
+    def test_busy_endpoint(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.get('/get_select_options/')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '3')
+
+        # other endpoints are admitted
+        self.assertEqual(self.client.get('/brain_dataset/').status_code, status.HTTP_200_OK)
+        self.client.credentials()
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+
+
+# This class is to test coalescing of identical computations
+class SingleFlightTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+        Metrics.reset()
+
+    # concurrent callers of a key share the leader's result
+    def test_coalesced(self):
+        single_flight = SingleFlight(name='single_flight.test')
+        _started, _release, _calls, _results = threading.Event(), threading.Event(), [], []
+
+        def _compute():
+            _calls.append(1)
+            _started.set()
+            _release.wait()
+            return {'response': True}
+
+        _threads = [threading.Thread(target=lambda: _results.append(single_flight.run('key', _compute)))
+                    for _ in range(5)]
+        _threads[0].start()
+        _started.wait()
+        for thread in _threads[1:]:
+            thread.start()
+        while Metrics.snapshot()['counters'].get('single_flight.test.coalesced', 0) < 4:
+            time.sleep(0.001)
+        _release.set()
+        for thread in _threads:
+            thread.join()
+
+        self.assertEqual((len(_calls), _results), (1, [{'response': True}] * 5))
+
+        # nothing stays in flight, errors are raised to the caller
+        with self.assertRaises(ValueError):
+            single_flight.run('key', lambda: int('a'))
+
+    # workers share results through the cache, the second worker doesn't compute
+    def test_shared(self):
+        _calls = []
+        for worker in range(2):
+            _result = SingleFlight(name='single_flight.test', cache='exports').run(
+                'version', lambda: _calls.append(worker) or [worker])
+            self.assertEqual(_result, [0])
+        self.assertEqual(_calls, [0])
+        self.assertEqual(Metrics.snapshot()['counters']['single_flight.test.shared_hits'], 1)
+
+    # download of all data is computed once per dataset version
+    def test_download_all(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        _first = self.client.post('/download_data/', {'download_mode': 'all'}, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            _second = self.client.post('/download_data/', {'download_mode': 'all'}, format='json')
+        self.assertEqual(_first.data, _second.data)
+        self.assertFalse([query for query in queries if 'JOIN' in query['sql'] or '"other_details".' in query['sql']])
+        self.client.credentials()
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+
+
+# This class is to test the response cache of read endpoints
+class ResponseCacheTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+        Metrics.reset()
+
+    # warm reads are served from the cache, writes invalidate them
+    def test_cached_read(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        _cold = self.client.get('/brain_dataset/')
+        with CaptureQueriesContext(connection) as queries:
+            _warm = self.client.get('/brain_dataset/')
+        self.assertEqual((_warm.status_code, _warm.json()), (status.HTTP_200_OK, _cold.json()))
+        self.assertFalse([query for query in queries if 'prime_details' in query['sql']])
+
+        # served from the shared cache once the process' cache is empty
+        RESPONSE_CACHE.clear()
+        self.assertEqual(self.client.get('/brain_dataset/').json(), _cold.json())
+        _metrics = Metrics.snapshot()
+        self.assertEqual([_metrics['counters']['response_cache.' + outcome] for outcome in
+                          ('misses', 'l1_hits', 'l2_hits')], [1, 1, 1])
+        self.assertIn('response_cache.hit_ratio', _metrics['gauges'])
+
+        # a missing row changes nothing, a deleted one invalidates once committed
+        self.client.delete('/delete_data/101/', format='json')
+        self.assertFalse(self.commit())
+        self.client.delete('/delete_data/{}/'.format(self.prime_details_1.prime_details_id), format='json')
+        self.assertEqual(len(self.client.get('/brain_dataset/').json()), len(_cold.json()))
+        self.assertTrue(self.commit())
+        self.assertEqual(len(self.client.get('/brain_dataset/').json()), len(_cold.json()) - 1)
+        self.client.credentials()
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+
+
+# This class is to test invalidation of cached data through version counters of the cache_versions table
+class TableVersionsTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+
+    # a bump is applied by this worker once committed, other workers read it with their next poll
+    def test_bump(self):
+        _version = int(TableVersions.get(DONORS))
+        self.assertEqual(TableVersions.bump(DONORS), _version + 1)
+        self.assertEqual(int(TableVersions.get(DONORS)), _version)
+        self.commit()
+        self.assertEqual(int(TableVersions.get(DONORS)), _version + 1)
+
+        CacheVersion.objects.filter(namespace=DONORS).update(version=_version + 5)  # bump of another worker
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(int(TableVersions.get(DONORS)), _version + 1)
+        self.assertFalse(queries)
+        TableVersions.poll(force=True)
+        self.assertEqual(int(TableVersions.get(DONORS)), _version + 5)
+
+    # the dataset snapshot is rebuilt by its next reader once donors changed
+    def test_outdated_snapshot(self):
+        DatasetSnapshot.rebuild()
+        snapshot = DatasetSnapshot.get()
+        self.assertIs(DatasetSnapshot.get(), snapshot)
+
+        TableVersions.bump(DONORS)
+        self.commit()
+        self.assertTrue(DatasetSnapshot.outdated(snapshot.version))
+        self.assertGreater(DatasetSnapshot.get().version, snapshot.version)
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+
+
+# This class is to test pre-rendered JSON of donors
+class DonorFragmentsTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+
+    # fragments are rendered when a donor is saved, list reads don't serialize rows
+    def test_rendered_on_write(self):
+        _flat = DonorFlat.objects.get(prime_details_id=self.prime_details_1.pk)
+        self.assertEqual(json.loads(bytes(_flat.other_details_json)),
+                         json.loads(JSONRenderer().render(OtherDetailsSerializer(
+                             OtherDetails.objects.get(pk=self.other_details_1.pk)).data)))
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        self.client.patch('/edit_data/{}/'.format(self.prime_details_1.pk), self.test_data, format='json')
+        self.commit()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/other_details/')
+        self.assertEqual(response.json()[0]['sex'], self.test_data['sex'])
+        self.assertFalse([query for query in queries if 'autopsy_types' in query['sql']])
+        self.client.credentials()
+
+    # donors written without the ORM are serialized by reads, which don't write their rows
+    def test_missing_fragment(self):
+        DonorFlat.objects.all().delete()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.get('/brain_dataset/{}/'.format(self.prime_details_1.pk))
+        self.assertEqual(response.json(), PrimeDetailsSerializer(PrimeDetails.objects.get(
+            pk=self.prime_details_1.pk)).data)
+        response = self.client.get('/other_details/')
+        self.assertEqual(response.json()[0]['mbtb_code'], self.prime_details_1.mbtb_code)
+        response = self.client.post('/other_details/batch/', {'prime_details_ids': [self.prime_details_1.pk]},
+                                    format='json')
+        self.assertEqual(response.json()['missing'], [])
+        self.assertFalse(DonorFlat.objects.exists())
+
+        # other renderers serialize rows
+        response = self.client.get('/brain_dataset/?format=api')
+        self.assertEqual(response.data, PrimeDetailsSerializer(PrimeDetails.objects.all(), many=True).data)
+        self.client.credentials()
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+
+
+# This class is to test the donor_flat read model
+class DonorFlatTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+
+    # rows are maintained by writes, downloads read them without joins
+    def test_maintained_on_write(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        Metrics.reset()
+        self.client.post('/add_new_data/', self.test_data, format='json')
+        self.assertEqual(Metrics.snapshot()['counters']['donor_flat.refreshed'], 1)
+        _flat = DonorFlat.objects.get(mbtb_code=self.test_data['mbtb_code'])
+        self.assertEqual((_flat.neuropathology_diagnosis, _flat.autopsy_type, _flat.brain_weight),
+                         ('Mixed AD VAD', 'Brain', 1080))
+
+        _expected = [dict(row) for row in OtherDetailsSerializer(OtherDetails.objects.all(), many=True).data]
+        for row in _expected:
+            del row['prime_details_id'], row['other_details_id'], row['row_version']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/download_data/', {'download_mode': 'all'}, format='json')
+        self.assertEqual(response.json(), _expected)
+        self.assertFalse([query for query in queries if 'JOIN' in query['sql'] or '"other_details".' in query['sql']])
+
+        self.client.delete('/delete_data/{}/'.format(_flat.prime_details_id_id), format='json')
+        self.assertFalse(DonorFlat.objects.filter(mbtb_code=self.test_data['mbtb_code']).exists())
+        self.client.credentials()
+
+    # rebuild derives missing rows and drops rows of deleted donors
+    def test_rebuild(self):
+        DonorFlat.objects.filter(prime_details_id=self.prime_details_1.pk).update(sex='', other_details_json=None)
+        _stdout = io.StringIO()
+        call_command('rebuild_donor_flat', stdout=_stdout)
+        self.assertIn('donors=1', _stdout.getvalue())
+        _flat = DonorFlat.objects.get(prime_details_id=self.prime_details_1.pk)
+        self.assertEqual((_flat.sex, _flat.archive), ('Female', 'No'))
+        self.assertIsNotNone(_flat.other_details_json)
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
+
+
+# This class is to test ChangesAPIView: changes of donors since a cursor
+class ChangesAPIViewTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        self.cursor = self.client.get('/changes/').json()['cursor']
+
+    def changes(self, since):
+        return [(change['operation'], change['prime_details_id']) for change in
+                self.client.get('/changes/?since={}'.format(since)).json()['changes']]
+
+    # every write path logs its changes, one change per donor is returned
+    def test_changes(self):
+        self.client.post('/add_new_data/', self.test_data, format='json')
+        _inserted = PrimeDetails.objects.get(mbtb_code=self.test_data['mbtb_code']).pk
+        self.client.patch('/edit_data/{}/'.format(self.prime_details_1.pk), dict(self.test_data, mbtb_code='BB99-101'),
+                          format='json')
+        response = self.client.get('/changes/?since={}'.format(self.cursor))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(change['operation'], change['prime_details_id']) for change in response.json()['changes']],
+                         [('insert', _inserted), ('update', self.prime_details_1.pk)])
+        self.assertEqual(response.json()['changes'][1]['data']['sex'], 'Male')
+        self.assertFalse(response.json()['more'])
+
+        _cursor = response.json()['cursor']
+        self.assertEqual(self.changes(_cursor), [])
+        self.client.post('/batch_data/', {'operations': [
+            {'op': 'patch', 'prime_details_id': _inserted, 'data': {'age': '71'}}]}, format='json')
+        self.client.post('/bulk_data/', {'action': 'archive', 'mbtb_codes': ['BB99-101']}, format='json')
+        self.assertEqual(self.changes(_cursor), [('update', _inserted), ('update', self.prime_details_1.pk)])
+
+        self.client.delete('/delete_data/{}/'.format(_inserted), format='json')
+        _change = self.client.get('/changes/?since={}'.format(_cursor)).json()['changes'][-1]
+        self.assertEqual((_change['operation'], _change['prime_details_id'], _change['data']),
+                         ('delete', _inserted, None))
+
+    # pages of `limit` entries, extended to the end of their last transaction
+    def test_pages(self):
+        self.client.post('/bulk_data/', {'action': 'archive', 'mbtb_codes': ['BB99-101']}, format='json')
+        self.client.post('/bulk_data/', {'action': 'unarchive', 'mbtb_codes': ['BB99-101']}, format='json')
+        response = self.client.get('/changes/?since={}&limit=1'.format(self.cursor)).json()
+        self.assertTrue(response['more'])
+        response = self.client.get('/changes/?since={}&limit=1'.format(response['cursor'])).json()
+        self.assertEqual(len(response['changes']), 1)
+
+        self.client.post('/add_new_data/', self.test_data, format='json')
+        _inserted = PrimeDetails.objects.get(mbtb_code=self.test_data['mbtb_code']).pk
+        self.client.post('/bulk_data/', {'action': 'archive', 'mbtb_codes': ['BB99-101', 'BB99-102']}, format='json')
+        response = self.client.get('/changes/?since={}&limit=1'.format(response['cursor'])).json()
+        self.assertEqual(response['changes'][0]['operation'], 'insert')
+        response = self.client.get('/changes/?since={}&limit=1'.format(response['cursor'])).json()
+        self.assertEqual(sorted(change['prime_details_id'] for change in response['changes']),
+                         [self.prime_details_1.pk, _inserted])
+        self.assertEqual(self.client.get('/changes/?since=abc').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/changes/?limit=0').status_code, status.HTTP_400_BAD_REQUEST)
+
+    # entries are written with a version of the 'changes' counter at the end of their request, cursors are
+    # versions: entries recorded first but written last get the higher version and aren't skipped by readers
+    def test_commit_order(self):
+        self.client.post('/add_new_data/', self.test_data, format='json')
+        _inserted = PrimeDetails.objects.get(mbtb_code=self.test_data['mbtb_code']).pk
+        _cursor = self.client.get('/changes/?since={}'.format(self.cursor)).json()['cursor']
+        with DonorChanges.deferred():
+            DonorChanges.record(UPDATE, [self.prime_details_1.pk])
+            DonorChanges.write([(UPDATE, _inserted)])  # of another request
+            response = self.client.get('/changes/?since={}'.format(_cursor)).json()
+        self.assertEqual([change['prime_details_id'] for change in response['changes']], [_inserted])
+        self.assertEqual(self.changes(response['cursor']), [('update', self.prime_details_1.pk)])
+        self.assertEqual(CacheVersion.objects.get(namespace=CHANGES).version, response['cursor'] + 1)
+
+    def tearDown(self):
+        self.client.credentials()
+        super(SetUpTestData, self).tearDownClass()
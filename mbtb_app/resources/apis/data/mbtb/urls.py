@@ -4,16 +4,23 @@ from rest_framework import routers
 
 router = routers.DefaultRouter()
 
-# pass views to router as url
-router.register('brain_dataset', views.PrimeDetailsAPIView)
-router.register('other_details', views.OtherDetailsAPIView)
+# pass views to router as url, basename is the route name used by permissions e.g. brain_dataset-list
+router.register('brain_dataset', views.PrimeDetailsAPIView, basename='brain_dataset')
+router.register('other_details', views.OtherDetailsAPIView, basename='other_details')
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('add_new_data/', views.CreateDataAPIView.as_view()),
-    path('get_select_options/', views.GetSelectOptions.as_view()),
-    path('file_upload/', views.FileUploadAPIView.as_view()),
-    path('edit_data/<int:prime_details_id>/', views.EditDataAPIView.as_view()),
-    path('delete_data/<int:prime_details_id>/', views.DeleteDataAPIView.as_view()),
-    path('download_data/', views.DownloadDataAPIView.as_view())
+    path('add_new_data/', views.CreateDataAPIView.as_view(), name='add_new_data'),
+    path('get_select_options/', views.GetSelectOptions.as_view(), name='get_select_options'),
+    path('file_upload/', views.FileUploadAPIView.as_view(), name='file_upload'),
+    path('edit_data/<int:prime_details_id>/', views.EditDataAPIView.as_view(), name='edit_data'),
+    path('delete_data/<int:prime_details_id>/', views.DeleteDataAPIView.as_view(), name='delete_data'),
+    path('batch_data/', views.BatchDataAPIView.as_view(), name='batch_data'),
+    path('bulk_data/', views.BulkDataAPIView.as_view(), name='bulk_data'),
+    path('download_data/', views.DownloadDataAPIView.as_view(), name='download_data'),
+    path('changes/', views.ChangesAPIView.as_view(), name='changes'),
+    path('analysis/', views.AnalysisAPIView.as_view(), name='analysis'),
+    path('crosstab/', views.CrossTabulationAPIView.as_view(), name='crosstab'),
+    path('matched_controls/', views.MatchedControlsAPIView.as_view(), name='matched_controls'),
+    path('metrics/', views.MetricsAPIView.as_view(), name='metrics')
 ]
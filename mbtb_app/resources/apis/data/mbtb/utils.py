@@ -1,5 +1,14 @@
+from django.db import connections
 from django.test.runner import DiscoverRunner
 
+# Foreign keys of db/schema.sql with ON DELETE CASCADE: (parent table, column, child table). Tables of test databases
+# are created from the models, their cascades are added as triggers
+CASCADES = [
+    ('prime_details', 'prime_details_id', 'other_details'),
+    ('prime_details', 'prime_details_id', 'image_repository'),
+    ('prime_details', 'prime_details_id', 'donor_flat'),
+]
+
 
 class ManagedModelTestRunner(DiscoverRunner):
     """
@@ -29,6 +38,17 @@ class ManagedModelTestRunner(DiscoverRunner):
             # print("Modifying model %s to be managed for testing - Managed:%s" % (m, m._meta.managed))
         super(ManagedModelTestRunner, self).setup_test_environment(*args, **kwargs)
 
+    def setup_databases(self, **kwargs):
+        old_config = super(ManagedModelTestRunner, self).setup_databases(**kwargs)
+        for alias in connections:
+            with connections[alias].cursor() as cursor:
+                for parent, column, child in CASCADES:
+                    cursor.execute(
+                        'CREATE TRIGGER cascade_{child} BEFORE DELETE ON {parent} FOR EACH ROW '
+                        'BEGIN DELETE FROM {child} WHERE {column} = OLD.{column}; END'.format(
+                            parent=parent, column=column, child=child))
+        return old_config
+
     def teardown_test_environment(self, *args, **kwargs):
         super(ManagedModelTestRunner, self).teardown_test_environment(*args, **kwargs)
         # reset unmanaged models
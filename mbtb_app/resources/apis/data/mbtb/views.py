@@ -3,40 +3,145 @@ import csv
 import json
 
 from rest_framework import viewsets, views, response
+from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser
+from django.conf import settings
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
 from resources.data_templates.other_details import OtherDetailsTemplate
 from resources.data_templates.prime_details import PrimeDetailsTemplate
 from resources.db_operations.get_or_create import GetOrCreate
+from resources.db_operations.select_options import SelectOptions
 from resources.db_operations.download_all_data import DownloadAllData
 from resources.db_operations.download_filtered_data import DownloadFilteredData
-from .models import AutopsyTypes, PrimeDetails, OtherDetails, NeuropathologicalDiagnosis, \
-    TissueTypes
+from resources.db_operations.batch_mutation import BatchMutation
+from resources.db_operations.archived_donors import ArchivedFilterMixin, ARCHIVED_MODES
+from resources.db_operations.bulk_donors import BulkDonors
+from resources.db_operations.changed_fields import ChangedFields
+from resources.db_operations.change_log import DonorChanges, UPDATE, DELETE
+from resources.db_operations.donor_flat import DonorFlatTable
+from resources.analytics.dataset_snapshot import DatasetSnapshot
+from resources.caching.response_cache import CachedReadMixin, InvalidateOnWriteMixin
+from resources.caching.single_flight import SingleFlight
+from resources.caching.table_versions import DONORS
+from resources.renderers.donor_fragments import DonorFragments, PreRenderedReadMixin
+from resources.renderers.fast_json_renderer import FastJSONRenderer, RenderedJSON
+from resources.analytics.cohort_filter import CohortFilter
+from resources.analytics.descriptive_statistics import DescriptiveStatistics
+from resources.analytics.cross_tabulation import CrossTabulation
+from resources.analytics.matched_controls import MatchedControls, DEFAULT_AGE_TOLERANCE
+from .models import PrimeDetails, OtherDetails
 from .serializers import PrimeDetailsSerializer, OtherDetailsSerializer, FileUploadPrimeDetailsSerializer, \
-    FileUploadOtherDetailsSerializer, InsertRowPrimeDetailsSerializer
+    FileUploadOtherDetailsSerializer, InsertRowPrimeDetailsSerializer, OtherDetailsListSerializer, \
+    NarrativeSerializer, NARRATIVE_COLUMNS
 from resources.validations.validate_data import ValidateData
 from resources.permissions.is_authenticated import IsAuthenticated
 from resources.permissions.is_admin import IsAdmin
+from resources.metrics.metrics import Metrics
+
+# Concurrent identical heavy reads of a worker share one computation, full downloads of the donor and dimension
+# tables' versions are also shared with other workers through the 'exports' cache
+DOWNLOAD_ALL = SingleFlight(name='single_flight.download_all', cache='exports')
+ANALYTICS = SingleFlight(name='single_flight.analytics')
+
+
+# Key of an analytics request: endpoint, snapshot version and request data
+def analytics_key(endpoint, snapshot, data):
+    return '{}:{}:{}'.format(endpoint, snapshot.version, json.dumps(data, sort_keys=True, default=str))
+
+
+# Boolean option of a request, JSON booleans or "true"/"false" of form posts. Return None for other values
+def parse_flag(value):
+    if isinstance(value, bool):
+        return value
+    return {'true': True, 'false': False}.get(value.lower()) if isinstance(value, str) else None
 
 
 # This view class is to fetch prime_details, allowed methods: GET
-class PrimeDetailsAPIView(viewsets.ModelViewSet):
+# Lists leave out archived donors unless requested with ?archived=include or ?archived=only
+class PrimeDetailsAPIView(CachedReadMixin, PreRenderedReadMixin, ArchivedFilterMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
+    cache_tables = [DONORS]
+    fragment = 'prime_details_json'
     queryset = PrimeDetails.objects.all()
     serializer_class = PrimeDetailsSerializer
 
 
-# This view class is to fetch other_details, allowed methods: GET
-class OtherDetailsAPIView(viewsets.ModelViewSet):
+# This view class is to fetch other_details, allowed methods: GET, POST (batch/ only)
+# Lists leave out the narrative text columns (not even read from the table) unless requested with ?expand=narrative,
+# other_details/<prime_details_id>/ and other_details/<prime_details_id>/narrative/ return them for a single record.
+# Lists leave out archived donors unless requested with ?archived=include or ?archived=only
+class OtherDetailsAPIView(CachedReadMixin, PreRenderedReadMixin, ArchivedFilterMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
+    cache_tables = [DONORS]
+    fragment = 'other_details_json'
+    list_fragment = 'other_details_list_json'
+    archive_prefix = 'prime_details_id__'
     queryset = OtherDetails.objects.all()
     serializer_class = OtherDetailsSerializer
     lookup_field = 'prime_details_id'
 
+    def get_queryset(self):
+        queryset = super(OtherDetailsAPIView, self).get_queryset()
+        if self.action == 'list' and not self.narrative_expanded():
+            return queryset.defer(*NARRATIVE_COLUMNS)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list' and not self.narrative_expanded():
+            return OtherDetailsListSerializer
+        return self.serializer_class
+
+    def get_list_fragment(self):
+        return self.fragment if self.narrative_expanded() else self.list_fragment
+
+    def narrative_expanded(self):
+        return 'narrative' in self.request.query_params.get('expand', '').split(',')
+
+    # Narrative text columns of a single record
+    @action(detail=True, methods=['get'])
+    def narrative(self, request, prime_details_id=None):
+        return self.cached(request, lambda: response.Response(
+            NarrativeSerializer(get_object_or_404(OtherDetails.objects.only(
+                'prime_details_id', 'other_details_id', *NARRATIVE_COLUMNS), prime_details_id=prime_details_id)).data))
+
+    # Records of many donors as returned by other_details/<prime_details_id>/, requested with either
+    # {"prime_details_ids": [...]} or {"mbtb_codes": [...]} (at most BATCH_RETRIEVE_LIMIT). Records are returned
+    # in request order (repeated values once) in `data`, values without a record in `missing`
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        _keys = [key for key in ('prime_details_ids', 'mbtb_codes') if key in request.data]
+        if len(_keys) != 1:
+            return response.Response({'Error': "Please provide either 'prime_details_ids' or 'mbtb_codes'"},
+                                     status="400")
+
+        _values = request.data[_keys[0]]
+        _limit = getattr(settings, 'BATCH_RETRIEVE_LIMIT', 5000)
+        if not isinstance(_values, list) or not 0 < len(_values) <= _limit:
+            return response.Response({'Error': "'{}' must be a list of 1 to {} values".format(_keys[0], _limit)},
+                                     status="400")
+
+        if _keys[0] == 'prime_details_ids':
+            if not all(isinstance(value, int) and not isinstance(value, bool) for value in _values):
+                return response.Response({'Error': "'prime_details_ids' must be integers"}, status="400")
+            _key = 'prime_details_id'
+        else:
+            if not all(isinstance(value, str) for value in _values):
+                return response.Response({'Error': "'mbtb_codes' must be strings"}, status="400")
+            _key = 'mbtb_code'
+
+        _data, _missing = DonorFragments.batch(self.fragment, _key, list(dict.fromkeys(_values)))
+        if isinstance(request.accepted_renderer, FastJSONRenderer):
+            return response.Response(RenderedJSON(
+                b'{"data":' + _data + b',"missing":' + json.dumps(_missing).encode('utf-8') + b'}'))
+        return response.Response({'data': json.loads(_data), 'missing': _missing})
+
 
 # This view class is to add single row in prime_details, other_details, allowed methods: POST
-class CreateDataAPIView(views.APIView):
+class CreateDataAPIView(InvalidateOnWriteMixin, views.APIView):
     permission_classes = [IsAdmin]
+    cache_tables = [DONORS]
 
     def post(self, request):
         if not request.data:
@@ -64,51 +169,54 @@ class CreateDataAPIView(views.APIView):
         )
         prime_details_serializer = InsertRowPrimeDetailsSerializer(data=prime_details.__dict__)
 
-        if prime_details_serializer.is_valid():
-            prime_serializer_instance = prime_details_serializer.save()  # Saving prime_details
-
-            # If other_details data is validated then save it else return error response
-            _duration = validate_data.check_is_number(value=request.data['duration'])
-            _brain_weight = validate_data.check_is_number(value=request.data['brain_weight'])
-
-            if (not _duration['Response']) or (not _brain_weight['Response']):
-                return response.Response({'Error': 'Expecting value, received text for duration and/or brain_weight.'},
-                                         status="400")
-
-            other_details = OtherDetailsTemplate(
-                prime_details_id=prime_details_serializer.data['prime_details_id'], race=request.data['race'],
-                duration=_duration['Value'], clinical_details=request.data['clinical_details'],
-                cause_of_death=request.data['cause_of_death'], brain_weight=_brain_weight['Value'],
-                neuropathology_summary=request.data['neuropathology_summary'],
-                neuropathology_gross=request.data['neuropathology_gross'],
-                neuropathology_microscopic=request.data['neuropathology_microscopic'], cerad=request.data['cerad'],
-                braak_stage=request.data['braak_stage'], khachaturian=request.data['khachaturian'],
-                abc=request.data['abc'], autopsy_type=autopsy_type.autopsy_type_id,
-                formalin_fixed=request.data['formalin_fixed'], fresh_frozen=request.data['fresh_frozen']
-            )
-            other_details_serializer = FileUploadOtherDetailsSerializer(data=other_details.__dict__)
-            if other_details_serializer.is_valid():
-                other_details_serializer.save()  # Saving other_details
-                return response.Response({'Response': 'Success'}, status="201")  # Return response
+        # The row of donor_flat is refreshed once, after both tables were saved
+        with DonorFlatTable.deferred():
+            if prime_details_serializer.is_valid():
+                prime_serializer_instance = prime_details_serializer.save()  # Saving prime_details
 
-            else:
-                # TODO: log errors here related to add single data for other_details
+                # If other_details data is validated then save it else return error response
+                _duration = validate_data.check_is_number(value=request.data['duration'])
+                _brain_weight = validate_data.check_is_number(value=request.data['brain_weight'])
 
-                # deleting instance if any error in other_details data
-                prime_serializer_instance.delete()
+                if (not _duration['Response']) or (not _brain_weight['Response']):
+                    return response.Response(
+                        {'Error': 'Expecting value, received text for duration and/or brain_weight.'}, status="400")
 
-                # Return error response if any error in other_details data
-                return response.Response(
-                    {'Error': 'Error in other_details, Inserting data failed.'},
-                    status="400"
+                other_details = OtherDetailsTemplate(
+                    prime_details_id=prime_details_serializer.data['prime_details_id'], race=request.data['race'],
+                    duration=_duration['Value'], clinical_details=request.data['clinical_details'],
+                    cause_of_death=request.data['cause_of_death'], brain_weight=_brain_weight['Value'],
+                    neuropathology_summary=request.data['neuropathology_summary'],
+                    neuropathology_gross=request.data['neuropathology_gross'],
+                    neuropathology_microscopic=request.data['neuropathology_microscopic'], cerad=request.data['cerad'],
+                    braak_stage=request.data['braak_stage'], khachaturian=request.data['khachaturian'],
+                    abc=request.data['abc'], autopsy_type=autopsy_type.autopsy_type_id,
+                    formalin_fixed=request.data['formalin_fixed'], fresh_frozen=request.data['fresh_frozen']
                 )
+                other_details_serializer = FileUploadOtherDetailsSerializer(data=other_details.__dict__)
+                if other_details_serializer.is_valid():
+                    other_details_serializer.save()  # Saving other_details
+                    return response.Response({'Response': 'Success'}, status="201")  # Return response
 
-        else:
-            # TODO: log errors here related to add single data for prime details
-            # Return error response if any error in prime_details data
-            return response.Response(
-                {'Error': 'Error in prime_details, Inserting data failed.'},
-                status="400")
+                else:
+                    # TODO: log errors here related to add single data for other_details
+
+                    # deleting instance if any error in other_details data
+                    DonorChanges.record(DELETE, [prime_serializer_instance.prime_details_id])
+                    prime_serializer_instance.delete()
+
+                    # Return error response if any error in other_details data
+                    return response.Response(
+                        {'Error': 'Error in other_details, Inserting data failed.'},
+                        status="400"
+                    )
+
+            else:
+                # TODO: log errors here related to add single data for prime details
+                # Return error response if any error in prime_details data
+                return response.Response(
+                    {'Error': 'Error in prime_details, Inserting data failed.'},
+                    status="400")
 
 
 # This view class is to fetch data from following tables: neuropathology_diagnosis, autopsy_type, tissue_type
@@ -117,22 +225,26 @@ class GetSelectOptions(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        _neuropathology_diagnosis = NeuropathologicalDiagnosis.objects.values_list('neuro_diagnosis_name', flat=True) \
-            .order_by('neuro_diagnosis_name')
-        _autopsy_type = AutopsyTypes.objects.values_list('autopsy_type', flat=True).order_by('autopsy_type')
-        _tissue_type = TissueTypes.objects.values_list('tissue_type', flat=True).order_by('tissue_type')
+        _select_options = SelectOptions().run()
+
+        # ETag follows the dimension tables' version, clients revalidate and get 304 while it is unchanged
+        _etag = '"select-options-{}"'.format(_select_options['version'])
+        _if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '').split(',')
+        if _etag in [tag.strip().replace('W/', '', 1) for tag in _if_none_match]:
+            _response = response.Response(status="304")
+        else:
+            _response = response.Response(_select_options['data'])
 
-        return response.Response({
-            'neuropathology_diagnosis': _neuropathology_diagnosis,
-            'autopsy_type': _autopsy_type,
-            'tissue_type': _tissue_type
-        })
+        _response['ETag'] = _etag
+        patch_cache_control(_response, private=True, no_cache=True)
+        return _response
 
 
 # This view class is to upload and edit data via csv file in prime_details, other_details, allowed methods: POST, PATCH
-class FileUploadAPIView(views.APIView):
+class FileUploadAPIView(InvalidateOnWriteMixin, views.APIView):
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [IsAdmin]
+    cache_tables = [DONORS]
 
     # For `POST` request: upload data via csv file
     def post(self, request, format=None):
@@ -157,79 +269,82 @@ class FileUploadAPIView(views.APIView):
         if not _column_names['Response']:
             return response.Response({'Error': _column_names['Message']}, status="400")
 
-        for row in _csv_file:
-
-            # Get or Create (Get value or create new if not exists) for AutopsyType, TissuType and Neuro Diagnosis
-            tissue_type = GetOrCreate(model_name='TissueTypes').run(tissue_type=row['tissue_type'])
-            neuro_diagnosis_id = GetOrCreate(model_name='NeuropathologicalDiagnosis').run(
-                neuro_diagnosis_name=row['neuropathology_diagnosis'])
-            autopsy_type = GetOrCreate(model_name='AutopsyTypes').run(autopsy_type=row['autopsy_type'])
-
-            # If prime_details data is validated then save it else return error response
-            _preservation_method = validate_data.check_preservation_method(
-                formalin_fixed=row['formalin_fixed'], fresh_frozen=row['fresh_frozen']
-            )
-            prime_details = PrimeDetailsTemplate(
-                mbtb_code=row['mbtb_code'], sex=row['sex'], age=row['age'],
-                postmortem_interval=row['postmortem_interval'], time_in_fix=row['time_in_fix'],
-                clinical_diagnosis=row['clinical_diagnosis'], tissue_type=tissue_type.tissue_type_id,
-                preservation_method=_preservation_method,
-                neuro_diagnosis_id=neuro_diagnosis_id.neuro_diagnosis_id,
-                storage_year=row['storage_year']
-            )
-            prime_details_serializer = FileUploadPrimeDetailsSerializer(data=prime_details.__dict__)
+        # Rows of donor_flat are refreshed once per donor after the loop, instead of once per saved table
+        with DonorFlatTable.deferred():
+            for row in _csv_file:
 
-            if prime_details_serializer.is_valid():
-                prime_serializer_instance = prime_details_serializer.save()  # Saving prime_details
-
-                # If other_details data is validated then save it else return error response
-                _duration = validate_data.check_is_number(value=row['duration'])
-                _brain_weight = validate_data.check_is_number(value=row['brain_weight'])
+                # Get or Create (Get value or create new if not exists) for AutopsyType, TissuType and Neuro Diagnosis
+                tissue_type = GetOrCreate(model_name='TissueTypes').run(tissue_type=row['tissue_type'])
+                neuro_diagnosis_id = GetOrCreate(model_name='NeuropathologicalDiagnosis').run(
+                    neuro_diagnosis_name=row['neuropathology_diagnosis'])
+                autopsy_type = GetOrCreate(model_name='AutopsyTypes').run(autopsy_type=row['autopsy_type'])
 
-                if (not _duration['Response']) or (not _brain_weight['Response']):
-                    _error = 'Expecting value, received text for duration and/or brain_weight at mbtb_code: {}.' \
-                        .format(row['mbtb_code'])
-                    return response.Response({'Error': _error}, status="400")
-
-                # If other_details data is validated then save it else return error response
-                other_details = OtherDetailsTemplate(
-                    prime_details_id=prime_details_serializer.data['prime_details_id'], race=row['race'],
-                    duration=_duration['Value'], clinical_details=row['clinical_details'],
-                    cause_of_death=row['cause_of_death'], brain_weight=_brain_weight['Value'],
-                    neuropathology_summary=row['neuropathology_summary'],
-                    neuropathology_gross=row['neuropathology_gross'],
-                    neuropathology_microscopic=row['neuropathology_microscopic'], cerad=row['cerad'],
-                    braak_stage=row['braak_stage'], khachaturian=row['khachaturian'], abc=row['abc'],
-                    autopsy_type=autopsy_type.autopsy_type_id, formalin_fixed=row['formalin_fixed'],
-                    fresh_frozen=row['fresh_frozen']
+                # If prime_details data is validated then save it else return error response
+                _preservation_method = validate_data.check_preservation_method(
+                    formalin_fixed=row['formalin_fixed'], fresh_frozen=row['fresh_frozen']
                 )
-                other_details_serializer = FileUploadOtherDetailsSerializer(data=other_details.__dict__)
-                if other_details_serializer.is_valid():
-                    other_details_serializer.save()  # Saving other_details
-                else:
-                    # TODO: log errors here related to file data uploading for other details
-
-                    # deleting instance if any error in other_details data
-                    prime_serializer_instance.delete()
+                prime_details = PrimeDetailsTemplate(
+                    mbtb_code=row['mbtb_code'], sex=row['sex'], age=row['age'],
+                    postmortem_interval=row['postmortem_interval'], time_in_fix=row['time_in_fix'],
+                    clinical_diagnosis=row['clinical_diagnosis'], tissue_type=tissue_type.tissue_type_id,
+                    preservation_method=_preservation_method,
+                    neuro_diagnosis_id=neuro_diagnosis_id.neuro_diagnosis_id,
+                    storage_year=row['storage_year']
+                )
+                prime_details_serializer = FileUploadPrimeDetailsSerializer(data=prime_details.__dict__)
+
+                if prime_details_serializer.is_valid():
+                    prime_serializer_instance = prime_details_serializer.save()  # Saving prime_details
+
+                    # If other_details data is validated then save it else return error response
+                    _duration = validate_data.check_is_number(value=row['duration'])
+                    _brain_weight = validate_data.check_is_number(value=row['brain_weight'])
+
+                    if (not _duration['Response']) or (not _brain_weight['Response']):
+                        _error = 'Expecting value, received text for duration and/or brain_weight at mbtb_code: {}.' \
+                            .format(row['mbtb_code'])
+                        return response.Response({'Error': _error}, status="400")
+
+                    # If other_details data is validated then save it else return error response
+                    other_details = OtherDetailsTemplate(
+                        prime_details_id=prime_details_serializer.data['prime_details_id'], race=row['race'],
+                        duration=_duration['Value'], clinical_details=row['clinical_details'],
+                        cause_of_death=row['cause_of_death'], brain_weight=_brain_weight['Value'],
+                        neuropathology_summary=row['neuropathology_summary'],
+                        neuropathology_gross=row['neuropathology_gross'],
+                        neuropathology_microscopic=row['neuropathology_microscopic'], cerad=row['cerad'],
+                        braak_stage=row['braak_stage'], khachaturian=row['khachaturian'], abc=row['abc'],
+                        autopsy_type=autopsy_type.autopsy_type_id, formalin_fixed=row['formalin_fixed'],
+                        fresh_frozen=row['fresh_frozen']
+                    )
+                    other_details_serializer = FileUploadOtherDetailsSerializer(data=other_details.__dict__)
+                    if other_details_serializer.is_valid():
+                        other_details_serializer.save()  # Saving other_details
+                    else:
+                        # TODO: log errors here related to file data uploading for other details
+
+                        # deleting instance if any error in other_details data
+                        DonorChanges.record(DELETE, [prime_serializer_instance.prime_details_id])
+                        prime_serializer_instance.delete()
+
+                        # Return error response if any error in other_details data
+                        return response.Response(
+                            {'Response': 'Failure',
+                             'Message': 'Error in other details, Data uploading failed at mbtb_code: {}'.format(
+                                 row['mbtb_code']), 'Error': other_details_serializer.errors},
+                            status="400"
+                        )
 
-                    # Return error response if any error in other_details data
+                else:
+                    # TODO: log errors here related to file data uploading for prime details
+                    # Return error response if any error in prime_details data
                     return response.Response(
                         {'Response': 'Failure',
-                         'Message': 'Error in other details, Data uploading failed at mbtb_code: {}'.format(
-                             row['mbtb_code']), 'Error': other_details_serializer.errors},
+                         'Message': 'Error in prime details, Data uploading failed at mbtb_code: {}'.format(
+                             row['mbtb_code']), 'Error': prime_details_serializer.errors},
                         status="400"
                     )
 
-            else:
-                # TODO: log errors here related to file data uploading for prime details
-                # Return error response if any error in prime_details data
-                return response.Response(
-                    {'Response': 'Failure',
-                     'Message': 'Error in prime details, Data uploading failed at mbtb_code: {}'.format(
-                         row['mbtb_code']), 'Error': prime_details_serializer.errors},
-                    status="400"
-                )
-
         # Return response: data is uploaded successfully
         return response.Response({'Response': 'Success'}, status="201")
 
@@ -262,85 +377,90 @@ class FileUploadAPIView(views.APIView):
             prime_details = get_object_or_404(PrimeDetails, mbtb_code=row['mbtb_code'])
             other_details = get_object_or_404(OtherDetails, prime_details_id=prime_details.prime_details_id)
 
-            # Get or Create (Get value or create new if not exists) for AutopsyType, TissuType and Neuro Diagnosis
-            tissue_type = GetOrCreate(model_name='TissueTypes').run(tissue_type=row['tissue_type'])
-            neuro_diagnosis_id = GetOrCreate(model_name='NeuropathologicalDiagnosis').run(
-                neuro_diagnosis_name=row['neuropathology_diagnosis'])
-            autopsy_type = GetOrCreate(model_name='AutopsyTypes').run(autopsy_type=row['autopsy_type'])
-
-            # If prime_details data is validated then save it else return error response
-            _preservation_method = validate_data.check_preservation_method(
-                formalin_fixed=row['formalin_fixed'], fresh_frozen=row['fresh_frozen']
-            )
-            prime_details_template_data = PrimeDetailsTemplate(
-                mbtb_code=row['mbtb_code'], sex=row['sex'], age=row['age'],
-                postmortem_interval=row['postmortem_interval'], time_in_fix=row['time_in_fix'],
-                clinical_diagnosis=row['clinical_diagnosis'], tissue_type=tissue_type.tissue_type_id,
-                preservation_method=_preservation_method,
-                neuro_diagnosis_id=neuro_diagnosis_id.neuro_diagnosis_id,
-                storage_year=row['storage_year']
-            )
-            prime_details_serializer = FileUploadPrimeDetailsSerializer(
-                prime_details, data=prime_details_template_data.__dict__, partial=True
-            )
-
-            if prime_details_serializer.is_valid():
-                prime_details_serializer.save()  # Saving prime_details
-
-                # If other_details data is validated then save it else return error response
-                _duration = validate_data.check_is_number(value=row['duration'])
-                _brain_weight = validate_data.check_is_number(value=row['brain_weight'])
-
-                if (not _duration['Response']) or (not _brain_weight['Response']):
-                    _error = 'Expecting value, received text for duration and/or brain_weight at mbtb_code: {}.' \
-                        .format(row['mbtb_code'])
-                    return response.Response({'Error': _error}, status="400")
-
-                # If other_details data is validated then save it else return error response
-                other_details_template_data = OtherDetailsTemplate(
-                    prime_details_id=prime_details.prime_details_id, race=row['race'],
-                    duration=_duration['Value'], clinical_details=row['clinical_details'],
-                    cause_of_death=row['cause_of_death'], brain_weight=_brain_weight['Value'],
-                    neuropathology_summary=row['neuropathology_summary'],
-                    neuropathology_gross=row['neuropathology_gross'],
-                    neuropathology_microscopic=row['neuropathology_microscopic'], cerad=row['cerad'],
-                    braak_stage=row['braak_stage'], khachaturian=row['khachaturian'], abc=row['abc'],
-                    autopsy_type=autopsy_type.autopsy_type_id, formalin_fixed=row['formalin_fixed'],
-                    fresh_frozen=row['fresh_frozen']
+            # The row of donor_flat is refreshed once, after both tables of the donor were saved
+            with DonorFlatTable.deferred():
+                # Get or Create (Get value or create new if not exists) for AutopsyType, TissuType and Neuro Diagnosis
+                tissue_type = GetOrCreate(model_name='TissueTypes').run(tissue_type=row['tissue_type'])
+                neuro_diagnosis_id = GetOrCreate(model_name='NeuropathologicalDiagnosis').run(
+                    neuro_diagnosis_name=row['neuropathology_diagnosis'])
+                autopsy_type = GetOrCreate(model_name='AutopsyTypes').run(autopsy_type=row['autopsy_type'])
+
+                # If prime_details data is validated then save it else return error response
+                _preservation_method = validate_data.check_preservation_method(
+                    formalin_fixed=row['formalin_fixed'], fresh_frozen=row['fresh_frozen']
                 )
-                other_details_serializer = FileUploadOtherDetailsSerializer(
-                    other_details, data=other_details_template_data.__dict__, partial=True
+                prime_details_template_data = PrimeDetailsTemplate(
+                    mbtb_code=row['mbtb_code'], sex=row['sex'], age=row['age'],
+                    postmortem_interval=row['postmortem_interval'], time_in_fix=row['time_in_fix'],
+                    clinical_diagnosis=row['clinical_diagnosis'], tissue_type=tissue_type.tissue_type_id,
+                    preservation_method=_preservation_method,
+                    neuro_diagnosis_id=neuro_diagnosis_id.neuro_diagnosis_id,
+                    storage_year=row['storage_year']
+                )
+                prime_details_serializer = FileUploadPrimeDetailsSerializer(
+                    prime_details, data=prime_details_template_data.__dict__, partial=True
                 )
-                if other_details_serializer.is_valid():
-                    other_details_serializer.save()  # Saving other_details
-                else:
-                    # TODO: log errors here related to file data uploading for other details
 
-                    # Return error response if any error in other_details data
+                if prime_details_serializer.is_valid():
+                    prime_details_serializer.save()  # Saving prime_details
+
+                    # If other_details data is validated then save it else return error response
+                    _duration = validate_data.check_is_number(value=row['duration'])
+                    _brain_weight = validate_data.check_is_number(value=row['brain_weight'])
+
+                    if (not _duration['Response']) or (not _brain_weight['Response']):
+                        _error = 'Expecting value, received text for duration and/or brain_weight at mbtb_code: {}.' \
+                            .format(row['mbtb_code'])
+                        return response.Response({'Error': _error}, status="400")
+
+                    # If other_details data is validated then save it else return error response
+                    other_details_template_data = OtherDetailsTemplate(
+                        prime_details_id=prime_details.prime_details_id, race=row['race'],
+                        duration=_duration['Value'], clinical_details=row['clinical_details'],
+                        cause_of_death=row['cause_of_death'], brain_weight=_brain_weight['Value'],
+                        neuropathology_summary=row['neuropathology_summary'],
+                        neuropathology_gross=row['neuropathology_gross'],
+                        neuropathology_microscopic=row['neuropathology_microscopic'], cerad=row['cerad'],
+                        braak_stage=row['braak_stage'], khachaturian=row['khachaturian'], abc=row['abc'],
+                        autopsy_type=autopsy_type.autopsy_type_id, formalin_fixed=row['formalin_fixed'],
+                        fresh_frozen=row['fresh_frozen']
+                    )
+                    other_details_serializer = FileUploadOtherDetailsSerializer(
+                        other_details, data=other_details_template_data.__dict__, partial=True
+                    )
+                    if other_details_serializer.is_valid():
+                        other_details_serializer.save()  # Saving other_details
+                    else:
+                        # TODO: log errors here related to file data uploading for other details
+
+                        # Return error response if any error in other_details data
+                        return response.Response(
+                            {'Response': 'Failure',
+                             'Message': 'Error in other details, Data uploading failed at mbtb_code: {}'.format(
+                                 row['mbtb_code']), 'Error': other_details_serializer.errors},
+                            status="400"
+                        )
+
+                else:
+                    # TODO: log errors here related to file data uploading for prime details
+                    # Return error response if any error in prime_details data
                     return response.Response(
                         {'Response': 'Failure',
-                         'Message': 'Error in other details, Data uploading failed at mbtb_code: {}'.format(
-                             row['mbtb_code']), 'Error': other_details_serializer.errors},
+                         'Message': 'Error in prime details, Data uploading failed at mbtb_code: {}'.format(
+                             row['mbtb_code']), 'Error': prime_details_serializer.errors},
                         status="400"
                     )
 
-            else:
-                # TODO: log errors here related to file data uploading for prime details
-                # Return error response if any error in prime_details data
-                return response.Response(
-                    {'Response': 'Failure',
-                     'Message': 'Error in prime details, Data uploading failed at mbtb_code: {}'.format(
-                         row['mbtb_code']), 'Error': prime_details_serializer.errors},
-                    status="400"
-                )
-
         # Return response: data is uploaded successfully
         return response.Response({'Response': 'Success'}, status="201")
 
 
 # This view class allows us to edit single row of mbtb_data: prime_details, other_details, allowed methods: PATCH
-class EditDataAPIView(views.APIView):
+# Only columns whose values changed are written (nothing at all if none did), each edit increments the donor's
+# row_version. Edits which send the row_version they were loaded with are rejected (409) if the donor was changed since
+class EditDataAPIView(InvalidateOnWriteMixin, views.APIView):
     permission_classes = [IsAdmin]
+    cache_tables = [DONORS]
 
     def patch(self, request, prime_details_id, format=None):
         if not request.data:
@@ -352,9 +472,23 @@ class EditDataAPIView(views.APIView):
         if not _column_names['Response']:
             return response.Response({'Error': _column_names['Message']}, status="400")
 
-        # Get prime_details, other_details based on prime_details_id or return 404 if not found
-        prime_details = get_object_or_404(PrimeDetails, prime_details_id=prime_details_id)
-        other_details = get_object_or_404(OtherDetails, prime_details_id=prime_details_id)
+        # Get prime_details, other_details based on prime_details_id or return 404 if not found, locked until the end
+        # of the request's transaction
+        prime_details = get_object_or_404(PrimeDetails.objects.select_for_update(), prime_details_id=prime_details_id)
+        other_details = get_object_or_404(OtherDetails.objects.select_for_update(), prime_details_id=prime_details_id)
+
+        # Reject edits of an outdated version of the donor
+        _row_version = request.data.get('row_version', None)
+        if _row_version not in (None, ''):
+            try:
+                _row_version = int(_row_version)
+            except (TypeError, ValueError):
+                return response.Response({'Error': "'row_version' must be a number."}, status="400")
+            if _row_version != prime_details.row_version:
+                return response.Response({
+                    'Error': 'Donor was changed by another request, please reload it and try again.',
+                    'row_version': prime_details.row_version
+                }, status="409")
 
         # Get or Create (Get value or create new if not exists) for AutopsyType, TissuType and Neuro Diagnosis
         tissue_type = GetOrCreate(model_name='TissueTypes').run(tissue_type=request.data['tissue_type'])
@@ -372,65 +506,106 @@ class EditDataAPIView(views.APIView):
         prime_details_serializer = InsertRowPrimeDetailsSerializer(
             prime_details, data=prime_details_template_data.__dict__, partial=True
         )
-        if prime_details_serializer.is_valid():
-            prime_details_serializer.save()  # Saving prime_details
-
-            # If other_details data is validated then save it else return error response
-            _duration = validate_data.check_is_number(value=request.data['duration'])
-            _brain_weight = validate_data.check_is_number(value=request.data['brain_weight'])
-
-            if (not _duration['Response']) or (not _brain_weight['Response']):
-                return response.Response({'Error': 'Expecting value, received text for duration and/or brain_weight.'},
-                                         status="400")
-
-            other_details_template_data = OtherDetailsTemplate(
-                prime_details_id=prime_details_id, race=request.data['race'],
-                duration=_duration['Value'], clinical_details=request.data['clinical_details'],
-                cause_of_death=request.data['cause_of_death'], brain_weight=_brain_weight['Value'],
-                neuropathology_summary=request.data['neuropathology_summary'],
-                neuropathology_gross=request.data['neuropathology_gross'],
-                neuropathology_microscopic=request.data['neuropathology_microscopic'], cerad=request.data['cerad'],
-                braak_stage=request.data['braak_stage'], khachaturian=request.data['khachaturian'],
-                abc=request.data['abc'], autopsy_type=autopsy_type.autopsy_type_id,
-                formalin_fixed=request.data['formalin_fixed'], fresh_frozen=request.data['fresh_frozen']
-            )
-            other_details_serializer = FileUploadOtherDetailsSerializer(
-                other_details, data=other_details_template_data.__dict__, partial=True
-            )
-            if other_details_serializer.is_valid():
-                other_details_serializer.save()  # Saving other_details
-                return response.Response({'Response': 'Success'}, status="201")  # Return response
-
-            else:
-                # TODO: log errors here related to add single data for other_details
-                # Return error response if any error in other_details data
-                return response.Response(
-                    {'Error': 'Error in other details, Uploading data failed.'},
-                    status="400"
-                )
-
-        else:
+        if not prime_details_serializer.is_valid():
             # TODO: log errors here related to add single data for prime details
             # Return error response if any error in prime_details data
-            return response.Response(
-                {'Error': 'Error in prime_details, Uploading data failed.'},
-                status="400"
-            )
+            return response.Response({'Error': 'Error in prime_details, Uploading data failed.'}, status="400")
+
+        _duration = validate_data.check_is_number(value=request.data['duration'])
+        _brain_weight = validate_data.check_is_number(value=request.data['brain_weight'])
+        if (not _duration['Response']) or (not _brain_weight['Response']):
+            return response.Response({'Error': 'Expecting value, received text for duration and/or brain_weight.'},
+                                     status="400")
+
+        other_details_template_data = OtherDetailsTemplate(
+            prime_details_id=prime_details_id, race=request.data['race'],
+            duration=_duration['Value'], clinical_details=request.data['clinical_details'],
+            cause_of_death=request.data['cause_of_death'], brain_weight=_brain_weight['Value'],
+            neuropathology_summary=request.data['neuropathology_summary'],
+            neuropathology_gross=request.data['neuropathology_gross'],
+            neuropathology_microscopic=request.data['neuropathology_microscopic'], cerad=request.data['cerad'],
+            braak_stage=request.data['braak_stage'], khachaturian=request.data['khachaturian'],
+            abc=request.data['abc'], autopsy_type=autopsy_type.autopsy_type_id,
+            formalin_fixed=request.data['formalin_fixed'], fresh_frozen=request.data['fresh_frozen']
+        )
+        other_details_serializer = FileUploadOtherDetailsSerializer(
+            other_details, data=other_details_template_data.__dict__, partial=True
+        )
+        if not other_details_serializer.is_valid():
+            # TODO: log errors here related to add single data for other_details
+            # Return error response if any error in other_details data
+            return response.Response({'Error': 'Error in other details, Uploading data failed.'}, status="400")
+
+        # Write changed columns only, the donor_flat row is refreshed once for both tables
+        _prime_changed = ChangedFields(instance=prime_details, data=prime_details_serializer.validated_data).run()
+        _other_changed = ChangedFields(instance=other_details, data=other_details_serializer.validated_data).run()
+        if not _prime_changed and not _other_changed:
+            self.unchanged = True
+            return response.Response({'Response': 'Success', 'Changed': [],
+                                      'row_version': prime_details.row_version}, status="200")
+
+        prime_details.row_version += 1
+        with DonorFlatTable.deferred():
+            prime_details.save(update_fields=_prime_changed + ['row_version'])
+            if _other_changed:
+                other_details.save(update_fields=_other_changed)
+        Metrics.increment('edit_data.changed_fields', len(_prime_changed) + len(_other_changed))
+        return response.Response({'Response': 'Success', 'Changed': _prime_changed + _other_changed,
+                                  'row_version': prime_details.row_version}, status="201")
 
 
 # This view class allows us to delete data from mbtb_data: prime_details, other_details, allowed_methods: DELETE
-class DeleteDataAPIView(views.APIView):
+class DeleteDataAPIView(InvalidateOnWriteMixin, views.APIView):
     permission_classes = [IsAdmin]
+    cache_tables = [DONORS]
 
     def delete(self, request, prime_details_id, format=None):
-        # Get prime_details instance with prime_details_id, return 404 if not found, then delete it
-        prime_details = get_object_or_404(PrimeDetails, prime_details_id=prime_details_id)
-        other_details = get_object_or_404(OtherDetails, prime_details_id=prime_details_id)
-        other_details.delete()
-        prime_details.delete()
+        # Delete prime_details with prime_details_id in a single statement (the database deletes its other_details),
+        # return 404 if not found
+        _deleted, _ = PrimeDetails.objects.filter(prime_details_id=prime_details_id).delete()
+        if not _deleted:
+            raise Http404
+        DonorChanges.record(DELETE, [prime_details_id])
         return response.Response({'Response': 'Success'}, status="200")  # Return response
 
 
+# This view class deletes, archives or unarchives many donors selected by mbtb codes and/or a filter, see BulkDonors,
+# allowed_methods: POST
+class BulkDataAPIView(InvalidateOnWriteMixin, views.APIView):
+    permission_classes = [IsAdmin]
+    cache_tables = [DONORS]
+
+    def post(self, request, format=None):
+        if not isinstance(request.data, dict):
+            return response.Response({'Error': 'Please provide an object of options.'}, status="400")
+
+        _response = BulkDonors(mbtb_codes=request.data.get('mbtb_codes', None),
+                               filter=request.data.get('filter', None)).run(action=request.data.get('action', None))
+        if not _response['response']:
+            return response.Response({'Error': _response['message']}, status="400")
+
+        return response.Response({'Response': 'Success', 'Count': _response['count'],
+                                  'Missing': _response['missing']}, status="200")
+
+
+# This view class applies a batch of create, patch and delete operations of mbtb_data in one transaction, all or
+# nothing, see BatchMutation for the format of operations. Returns a status per operation, allowed_methods: POST
+class BatchDataAPIView(InvalidateOnWriteMixin, views.APIView):
+    permission_classes = [IsAdmin]
+    cache_tables = [DONORS]
+
+    def post(self, request, format=None):
+        if 'operations' not in request.data:
+            return response.Response({'Error': "Please provide data with 'operations' tag"}, status="400")
+
+        _response = BatchMutation(operations=request.data['operations']).run()
+        if not _response['response']:
+            return response.Response({'Response': 'Failure', 'Message': _response['message'],
+                                      'Results': _response.get('results', [])}, status="400")
+
+        return response.Response({'Response': 'Success', 'Results': _response['results']}, status="200")
+
+
 # This view class fetches mbtb_data based on given multiple mbtb_code values in input, allowed_methods: POST
 class DownloadDataAPIView(views.APIView):
     permission_classes = [IsAuthenticated]
@@ -442,9 +617,16 @@ class DownloadDataAPIView(views.APIView):
 
         _download_mode = request.data["download_mode"]
 
+        # archived donors are left out unless requested with 'archived': 'include' or 'only'
+        _archived = request.data.get('archived', 'exclude')
+        if _archived not in ARCHIVED_MODES:
+            return response.Response({'Error': "'archived' must be one of {}".format(', '.join(ARCHIVED_MODES))},
+                                     status="400")
+
         if _download_mode == "all":
             download_all_data = DownloadAllData()
-            _response = download_all_data.run()
+            _response = DOWNLOAD_ALL.run('{}:{}'.format(DatasetSnapshot.source_version(), _archived),
+                                         lambda: download_all_data.run(archived=_archived))
 
             if not _response['response']:
                 return response.Response({
@@ -469,7 +651,7 @@ class DownloadDataAPIView(views.APIView):
                 )
             _mbtb_code_list = [elem['mbtb_code'] for elem in _received_input]
             download_filtered_data = DownloadFilteredData()
-            _response = download_filtered_data.run(input_mbtb_codes=_mbtb_code_list)
+            _response = download_filtered_data.run(input_mbtb_codes=_mbtb_code_list, archived=_archived)
 
             if not _response['response']:
                 return response.Response({
@@ -480,3 +662,146 @@ class DownloadDataAPIView(views.APIView):
         else:
             return response.Response({
                 "Error": "Invalid download_mode option, allowed options are 'all', 'filtered'."}, status="400")
+
+
+# This view class returns the changes of donors since a cursor for incremental sync, allowed_methods: GET
+# ?since=<cursor> (0 or none for all changes) and ?limit=<entries> (at most CHANGES_PAGE_SIZE) select the entries of
+# change_log, changes are one per donor: {"changes": [{"change_id", "operation", "prime_details_id", "data"}],
+# "cursor": <cursor of the next request>, "more": <whether to request again right away>}. `data` is the donor as
+# returned by other_details/<prime_details_id>/, null for deleted donors
+class ChangesAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, format=None):
+        _page_size = getattr(settings, 'CHANGES_PAGE_SIZE', 1000)
+        try:
+            _cursor = int(request.query_params.get('since', 0))
+            _limit = int(request.query_params.get('limit', _page_size))
+        except ValueError:
+            return response.Response({'Error': "'since' and 'limit' must be numbers"}, status="400")
+        if _cursor < 0 or not 0 < _limit <= _page_size:
+            return response.Response({'Error': "'since' must be a cursor and 'limit' 1 to {}".format(_page_size)},
+                                     status="400")
+
+        _changes, _cursor, _more = DonorChanges.since(_cursor, _limit)
+        _data = DonorFragments.rows('other_details_json', 'prime_details_id', [
+            prime_details_id for _, _, prime_details_id in _changes])
+        # donors without a row were deleted since, logged deletes of existing donors were rolled back (e.g. by a
+        # failed batch, entries are written at the end of the request)
+        _changes = [(change_id, DELETE if prime_details_id not in _data else UPDATE if operation == DELETE else
+                     operation, prime_details_id) for change_id, operation, prime_details_id in _changes]
+
+        if isinstance(request.accepted_renderer, FastJSONRenderer):
+            _entries = [b'{"change_id":%d,"operation":"%s","prime_details_id":%d,"data":%s}' % (
+                change_id, operation.encode('utf-8'), prime_details_id, bytes(_data.get(prime_details_id) or b'null'))
+                for change_id, operation, prime_details_id in _changes]
+            return response.Response(RenderedJSON(b'{"changes":[%s],"cursor":%d,"more":%s}' % (
+                b','.join(_entries), _cursor, b'true' if _more else b'false')))
+        return response.Response({'changes': [
+            {'change_id': change_id, 'operation': operation, 'prime_details_id': prime_details_id,
+             'data': json.loads(bytes(_data[prime_details_id])) if _data.get(prime_details_id) else None}
+            for change_id, operation, prime_details_id in _changes
+        ], 'cursor': _cursor, 'more': _more})
+
+
+# This view class computes distributions of brain_weight, duration, age and postmortem_interval on the cached
+# dataset snapshot, grouped by a categorical column and filtered by cohort, allowed_methods: POST
+class AnalysisAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        if not isinstance(request.data, dict):
+            return response.Response({'Error': 'Please provide an object of options.'}, status="400")
+
+        snapshot = DatasetSnapshot.get()
+        _statistics = ANALYTICS.run(analytics_key('analysis', snapshot, request.data),
+                                    lambda: self.analyze(snapshot, request.data))
+        if not _statistics['response']:
+            return response.Response({'Error': _statistics['message']}, status="400")
+
+        return response.Response(_statistics['data'], status="200")
+
+    def analyze(self, snapshot, data):
+        # Select rows of the requested cohort, return error if cohort definition is invalid
+        _cohort = CohortFilter(snapshot=snapshot).run(cohort=data.get('cohort'))
+        if not _cohort['response']:
+            return _cohort
+
+        return DescriptiveStatistics(snapshot=snapshot).run(
+            mask=_cohort['mask'], metrics=data.get('metrics'), group_by=data.get('group_by'),
+            quantiles=data.get('quantiles'), bins=data.get('bins')
+        )
+
+
+# This view class computes the contingency table of two or three categorical columns on the cached dataset snapshot,
+# filtered by cohort and optionally with chi-square statistics, allowed_methods: POST
+class CrossTabulationAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        if not isinstance(request.data, dict):
+            return response.Response({'Error': 'Please provide an object of options.'}, status="400")
+
+        snapshot = DatasetSnapshot.get()
+        _cross_tabulation = ANALYTICS.run(analytics_key('crosstab', snapshot, request.data),
+                                          lambda: self.cross_tabulate(snapshot, request.data))
+        if not _cross_tabulation['response']:
+            return response.Response({'Error': _cross_tabulation['message']}, status="400")
+
+        return response.Response(_cross_tabulation['data'], status="200")
+
+    def cross_tabulate(self, snapshot, data):
+        # Select rows of the requested cohort, return error if cohort definition is invalid
+        _cohort = CohortFilter(snapshot=snapshot).run(cohort=data.get('cohort'))
+        if not _cohort['response']:
+            return _cohort
+
+        _chi_square = parse_flag(data.get('chi_square', False))
+        _include_missing = parse_flag(data.get('include_missing', False))
+        if _chi_square is None or _include_missing is None:
+            return {'response': False, 'message': "'chi_square' and 'include_missing' should be true or false."}
+
+        return CrossTabulation(snapshot=snapshot).run(
+            mask=_cohort['mask'], columns=data.get('columns'), chi_square=_chi_square,
+            include_missing=_include_missing
+        )
+
+
+# This view class finds the best matched control donor for each given case mbtb_code on the cached dataset snapshot,
+# allowed_methods: POST
+class MatchedControlsAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        if not isinstance(request.data, dict):
+            return response.Response({'Error': 'Please provide an object of options.'}, status="400")
+
+        snapshot = DatasetSnapshot.get()
+        _matched_controls = ANALYTICS.run(analytics_key('matched_controls', snapshot, request.data),
+                                          lambda: self.match(snapshot, request.data))
+        if not _matched_controls['response']:
+            return response.Response({'Error': _matched_controls['message']}, status="400")
+
+        return response.Response(_matched_controls['data'], status="200")
+
+    def match(self, snapshot, data):
+        # Restrict control donors to the requested cohort, return error if cohort definition is invalid
+        _cohort = CohortFilter(snapshot=snapshot).run(cohort=data.get('cohort'))
+        if not _cohort['response']:
+            return _cohort
+
+        return MatchedControls(snapshot=snapshot).run(
+            mask=_cohort['mask'], cases=data.get('cases'), exact=data.get('exact'),
+            age_tolerance=data.get('age_tolerance', DEFAULT_AGE_TOLERANCE),
+            postmortem_interval_tolerance=data.get('postmortem_interval_tolerance'),
+            exclude_diagnoses=data.get('exclude_diagnoses')
+        )
+
+
+# This view class returns counters and gauges (e.g. token cache hits/misses) of the serving worker process,
+# allowed methods: GET
+class MetricsAPIView(views.APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return response.Response(Metrics.snapshot(), status="200")
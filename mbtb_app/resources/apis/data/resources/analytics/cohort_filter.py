@@ -0,0 +1,42 @@
+import numpy as np
+
+
+# This class builds a boolean row mask over a DatasetSnapshot from a cohort definition.
+# Categorical columns take a list of allowed values, numeric columns take a {'min': .., 'max': ..} range e.g.
+# {"sex": ["Female"], "neuropathology_diagnosis": ["ALZHEIMER'S DISEASE"], "age": {"min": 60, "max": 90}}
+class CohortFilter(object):
+
+    def __init__(self, **kwargs):
+        self.snapshot = kwargs.get('snapshot', None)
+
+    def run(self, **kwargs):
+        _cohort = kwargs.get('cohort', None) or {}
+        if not isinstance(_cohort, dict):
+            return {'response': False, 'message': "'cohort' should be an object of column names and values."}
+
+        mask = np.ones(self.snapshot.size, dtype=bool)
+        for column, condition in _cohort.items():
+            if column in self.snapshot.codes:
+                _values = condition if isinstance(condition, list) else [condition]
+                mask &= np.isin(self.snapshot.codes[column], self.snapshot.lookup(column, _values))
+
+            elif column in self.snapshot.numeric:
+                if not isinstance(condition, dict) or not set(condition).issubset({'min', 'max'}):
+                    return {'response': False, 'message': "Range for '{}' should contain 'min' and/or 'max'.".format(
+                        column)}
+                try:
+                    _bounds = {key: float(value) for key, value in condition.items()}
+                except (TypeError, ValueError):
+                    return {'response': False, 'message': "Range for '{}' should be numeric.".format(column)}
+
+                # NaN values never satisfy a comparison, so donors with unknown values drop out of ranges
+                _values = self.snapshot.numeric[column]
+                if 'min' in _bounds:
+                    mask &= _values >= _bounds['min']
+                if 'max' in _bounds:
+                    mask &= _values <= _bounds['max']
+
+            else:
+                return {'response': False, 'message': "Invalid cohort column: '{}'.".format(column)}
+
+        return {'response': True, 'mask': mask}
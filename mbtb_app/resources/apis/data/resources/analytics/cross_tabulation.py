@@ -0,0 +1,132 @@
+import math
+import operator
+from functools import reduce
+
+import numpy as np
+from django.conf import settings
+
+MIN_COLUMNS = 2
+MAX_COLUMNS = 3
+
+# Columns which identify donors, a table of them has a category per donor
+IDENTIFIER_COLUMNS = ['mbtb_code']
+
+
+# This class computes the contingency table (count matrix) of two or three categorical columns over the
+# rows selected by a cohort mask, optionally with Pearson's chi-square test of independence.
+# Codes are compacted to the categories which occur in the selected rows, tables of more than CROSSTAB_MAX_CELLS
+# cells are rejected, then rows are grouped with a single bincount over the combined codes of all columns.
+class CrossTabulation(object):
+
+    def __init__(self, **kwargs):
+        self.snapshot = kwargs.get('snapshot', None)
+
+    def run(self, **kwargs):
+        _mask = kwargs.get('mask', None)
+        _columns = kwargs.get('columns', None) or []
+        _chi_square = kwargs.get('chi_square', False)
+        _include_missing = kwargs.get('include_missing', False)
+
+        # Validate input columns
+        if not isinstance(_columns, list) or not MIN_COLUMNS <= len(_columns) <= MAX_COLUMNS or \
+                not all(isinstance(column, str) for column in _columns):
+            return {'response': False, 'message': 'Please provide {} or {} columns.'.format(MIN_COLUMNS, MAX_COLUMNS)}
+        _invalid_columns = [column for column in _columns
+                            if column not in self.snapshot.codes or column in IDENTIFIER_COLUMNS]
+        if _invalid_columns or len(set(_columns)) != len(_columns):
+            _message = 'Invalid or repeated columns: {}.'.format(_invalid_columns or _columns)
+            return {'response': False, 'message': _message}
+
+        # Codes per column, missing values get an extra trailing category
+        _codes, _labels = [], []
+        for column in _columns:
+            _column_codes = self.snapshot.codes[column][_mask]
+            _column_labels = self.snapshot.categories[column].tolist() + [None]
+            _codes.append(np.where(_column_codes < 0, len(_column_labels) - 1, _column_codes))
+            _labels.append(_column_labels)
+
+        if not _include_missing:
+            _present = np.logical_and.reduce([codes < len(labels) - 1 for codes, labels in zip(_codes, _labels)])
+            _codes = [codes[_present] for codes in _codes]
+
+        # Keep only categories which occur in the selected rows
+        for axis in range(len(_columns)):
+            _keep, _codes[axis] = np.unique(_codes[axis], return_inverse=True)
+            _labels[axis] = [_labels[axis][index] for index in _keep]
+
+        _shape = tuple(len(labels) for labels in _labels)
+        _max_cells = getattr(settings, 'CROSSTAB_MAX_CELLS', 10000)
+        if reduce(operator.mul, _shape, 1) > _max_cells:
+            return {'response': False,
+                    'message': 'The table would have more than {} cells, please select fewer donors or other '
+                               'columns.'.format(_max_cells)}
+        _flat = np.ravel_multi_index(_codes, _shape) if len(_codes[0]) else np.empty(0, dtype=np.int64)
+        counts = np.bincount(_flat, minlength=reduce(operator.mul, _shape, 1)).reshape(_shape)
+
+        data = {
+            'columns': _columns,
+            'total': int(counts.sum()),
+            'categories': dict(zip(_columns, _labels)),
+            'counts': counts.tolist(),
+            'margins': {
+                column: counts.sum(axis=tuple(index for index in range(len(_columns)) if index != axis)).tolist()
+                for axis, column in enumerate(_columns)
+            },
+        }
+        if _chi_square:
+            data['chi_square'] = self.chi_square(counts)
+
+        return {'response': True, 'data': data}
+
+    # Pearson's chi-square test of (mutual) independence of all columns of a contingency table
+    def chi_square(self, counts):
+        _total = counts.sum()
+        _dof = int(counts.size - 1 - sum(length - 1 for length in counts.shape))
+        if _total == 0 or _dof < 1:
+            return {'statistic': None, 'dof': max(_dof, 0), 'p_value': None}
+
+        # Expected counts are the outer product of all marginal distributions
+        expected = np.full(counts.shape, float(_total))
+        for axis in range(counts.ndim):
+            _margin = counts.sum(axis=tuple(index for index in range(counts.ndim) if index != axis)) / _total
+            expected = expected * _margin.reshape([-1 if index == axis else 1 for index in range(counts.ndim)])
+
+        statistic = float(((counts - expected) ** 2 / expected).sum())
+        return {'statistic': statistic, 'dof': _dof, 'p_value': chi_square_survival(statistic, _dof)}
+
+
+# Survival function of the chi-square distribution i.e. the regularized upper incomplete gamma Q(dof/2, x/2).
+# Series expansion below a + 1 and Lentz's continued fraction above, as in Numerical Recipes (gser/gcf).
+def chi_square_survival(statistic, dof, iterations=500, epsilon=1e-14):
+    a, x = dof / 2.0, statistic / 2.0
+    if x <= 0:
+        return 1.0
+    _log_prefix = a * math.log(x) - x - math.lgamma(a)
+
+    if x < a + 1:
+        _term = _sum = 1.0 / a
+        for n in range(1, iterations):
+            _term *= x / (a + n)
+            _sum += _term
+            if abs(_term) < abs(_sum) * epsilon:
+                break
+        return max(0.0, 1.0 - _sum * math.exp(_log_prefix))
+
+    _tiny = 1e-300
+    b = x + 1.0 - a
+    c = 1.0 / _tiny
+    d = 1.0 / b
+    h = d
+    for n in range(1, iterations):
+        _an = -n * (n - a)
+        b += 2.0
+        d = _an * d + b
+        d = _tiny if abs(d) < _tiny else d
+        c = b + _an / c
+        c = _tiny if abs(c) < _tiny else c
+        d = 1.0 / d
+        _delta = d * c
+        h *= _delta
+        if abs(_delta - 1.0) < epsilon:
+            break
+    return min(1.0, math.exp(_log_prefix) * h)
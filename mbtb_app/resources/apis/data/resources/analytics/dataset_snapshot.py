@@ -0,0 +1,222 @@
+import fcntl
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from mbtb.models import DonorFlat
+from resources.caching.table_versions import TableVersions, DIMENSIONS, DONORS
+
+# Numeric columns of the snapshot and their columns of `DonorFlat`.
+# Values are stored as float64, missing or non-numeric values (e.g. age 'Not known') become NaN.
+NUMERIC_COLUMNS = {
+    'age': 'age',
+    'postmortem_interval': 'postmortem_interval',
+    'brain_weight': 'brain_weight',
+    'duration': 'duration',
+}
+
+# Categorical columns of the snapshot and their columns of `DonorFlat`.
+# Values are dictionary-encoded: int32 codes into a sorted array of categories, -1 for missing/empty values.
+CATEGORICAL_COLUMNS = {
+    'mbtb_code': 'mbtb_code',
+    'sex': 'sex',
+    'clinical_diagnosis': 'clinical_diagnosis',
+    'neuropathology_diagnosis': 'neuropathology_diagnosis',
+    'tissue_type': 'tissue_type',
+    'preservation_method': 'preservation_method',
+    'archive': 'archive',
+    'autopsy_type': 'autopsy_type',
+    'race': 'race',
+    'cause_of_death': 'cause_of_death',
+    'cerad': 'cerad',
+    'braak_stage': 'braak_stage',
+    'khachaturian': 'khachaturian',
+    'abc': 'abc',
+    'formalin_fixed': 'formalin_fixed',
+    'fresh_frozen': 'fresh_frozen',
+}
+
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = '.lock'
+KEEP_VERSIONS = 3
+
+
+# This class holds a columnar (numpy) snapshot of prime_details + other_details for analytics.
+# Snapshots are written once per host to DATASET_SNAPSHOT_DIR as versioned directories of .npy files and
+# `mmap`ed read-only by every worker, so the memory is shared through the page cache:
+#   <DATASET_SNAPSHOT_DIR>/CURRENT                  name of the published version
+#   <DATASET_SNAPSHOT_DIR>/<version>/*.npy          prime_details_id, numeric.<name>, codes.<name>, categories.<name>
+# A new version is built in a temporary directory and published by rename, so readers never see partial files.
+# Versions are named after their build time, builder and the versions of their source tables, a snapshot whose
+# source tables changed since (see TableVersions) is rebuilt by its next reader.
+class DatasetSnapshot(object):
+    _lock = threading.Lock()
+    _cached = None
+    _version = None
+
+    def __init__(self, **kwargs):
+        self.prime_details_id = kwargs.get('prime_details_id', np.empty(0, dtype=np.int64))
+        self.numeric = kwargs.get('numeric', {})
+        self.codes = kwargs.get('codes', {})
+        self.categories = kwargs.get('categories', {})
+        self.version = kwargs.get('version', None)
+        self.size = len(self.prime_details_id)
+
+    # Return the published snapshot, mapping it again only when another version was published.
+    # Missing or outdated snapshots, or ones older than DATASET_SNAPSHOT_TTL seconds, are rebuilt first.
+    @classmethod
+    def get(cls):
+        with cls._lock:
+            _version = cls.current_version()
+            if _version is None or cls.expired(_version) or cls.outdated(_version):
+                _version = cls.rebuild(force=False, stale_version=_version)
+            if _version != cls._version:
+                cls._cached = cls.load(_version)
+                cls._version = _version
+            return cls._cached
+
+    # Build a snapshot from the database and publish it as the current version, e.g. after writes.
+    # Builds of all workers are serialized with a file lock, so the last published version is the newest.
+    # Without `force`, the build is skipped if another worker already replaced `stale_version` meanwhile.
+    @classmethod
+    def rebuild(cls, **kwargs):
+        _force = kwargs.get('force', True)
+        _stale_version = kwargs.get('stale_version', None)
+        _directory = cls.directory()
+        os.makedirs(_directory, exist_ok=True)
+        with open(os.path.join(_directory, LOCK_FILE), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                _current = cls.current_version()
+                if not _force and _current not in (None, _stale_version) and not cls.expired(_current) \
+                        and not cls.outdated(_current):
+                    return _current
+                _source_version = cls.source_version()  # read before the rows, see outdated()
+                return cls.publish(cls.build(), _source_version)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Fetch all donors with other_details from donor_flat with a single query and convert them into numpy columns
+    @classmethod
+    def build(cls):
+        _lookups = list(NUMERIC_COLUMNS.values()) + list(CATEGORICAL_COLUMNS.values())
+        _rows = list(DonorFlat.objects.filter(other_details_id__isnull=False).order_by('prime_details_id')
+                     .values_list('prime_details_id', *_lookups))
+        _columns = list(zip(*_rows)) if _rows else [()] * (len(_lookups) + 1)
+
+        numeric = {}
+        for index, name in enumerate(NUMERIC_COLUMNS, start=1):
+            numeric[name] = np.array([cls.to_float(value) for value in _columns[index]], dtype=np.float64)
+
+        codes, categories = {}, {}
+        for index, name in enumerate(CATEGORICAL_COLUMNS, start=len(NUMERIC_COLUMNS) + 1):
+            codes[name], categories[name] = cls.encode(_columns[index])
+
+        return cls(
+            prime_details_id=np.array(_columns[0], dtype=np.int64), numeric=numeric, codes=codes,
+            categories=categories
+        )
+
+    # Write snapshot files into a temporary directory, then rename it to its version and point CURRENT to it
+    @classmethod
+    def publish(cls, snapshot, source_version):
+        _directory = cls.directory()
+        version = '{:020d}-{}-{}'.format(int(time.time() * 1e9), os.getpid(), source_version)
+        _temporary = tempfile.mkdtemp(prefix='.build-', dir=_directory)
+
+        np.save(os.path.join(_temporary, 'prime_details_id.npy'), snapshot.prime_details_id)
+        for name in NUMERIC_COLUMNS:
+            np.save(os.path.join(_temporary, 'numeric.{}.npy'.format(name)), snapshot.numeric[name])
+        for name in CATEGORICAL_COLUMNS:
+            np.save(os.path.join(_temporary, 'codes.{}.npy'.format(name)), snapshot.codes[name])
+            np.save(os.path.join(_temporary, 'categories.{}.npy'.format(name)), snapshot.categories[name])
+        os.rename(_temporary, os.path.join(_directory, version))
+
+        _pointer = os.path.join(_directory, '.{}-{}'.format(CURRENT_FILE, version))
+        with open(_pointer, 'w') as pointer_file:
+            pointer_file.write(version)
+        os.replace(_pointer, os.path.join(_directory, CURRENT_FILE))
+
+        # Remove older versions and leftovers of interrupted builds, workers keep their existing mappings
+        _names = os.listdir(_directory)
+        _versions = sorted(name for name in _names if name[0].isdigit())
+        for name in _versions[:-KEEP_VERSIONS] + [name for name in _names if name.startswith('.build-')]:
+            shutil.rmtree(os.path.join(_directory, name), ignore_errors=True)
+
+        return version
+
+    # Map all columns of a published version read-only
+    @classmethod
+    def load(cls, version):
+        _path = os.path.join(cls.directory(), version)
+
+        def _load(name):
+            return np.load(os.path.join(_path, name + '.npy'), mmap_mode='r')
+
+        return cls(
+            prime_details_id=_load('prime_details_id'),
+            numeric={name: _load('numeric.' + name) for name in NUMERIC_COLUMNS},
+            codes={name: _load('codes.' + name) for name in CATEGORICAL_COLUMNS},
+            categories={name: _load('categories.' + name) for name in CATEGORICAL_COLUMNS},
+            version=version
+        )
+
+    @classmethod
+    def current_version(cls):
+        try:
+            with open(os.path.join(cls.directory(), CURRENT_FILE)) as pointer_file:
+                return pointer_file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    # Versions start with their build time in nanoseconds
+    @staticmethod
+    def expired(version):
+        _ttl = getattr(settings, 'DATASET_SNAPSHOT_TTL', 300)
+        return time.time() - int(version.split('-')[0]) / 1e9 > _ttl
+
+    # Source tables changed since the version was built. A change committed while building is built again
+    # by the next reader, since the version keeps the source versions read before the rows
+    @classmethod
+    def outdated(cls, version):
+        return version.split('-')[2:] != [cls.source_version()]
+
+    # Versions of the snapshot's tables, e.g. '12.3' (donors.dimensions)
+    @staticmethod
+    def source_version():
+        return '{}.{}'.format(TableVersions.get(DONORS), TableVersions.get(DIMENSIONS))
+
+    @staticmethod
+    def directory():
+        return settings.DATASET_SNAPSHOT_DIR
+
+    # Dictionary-encode a column: return (int32 codes, sorted array of categories)
+    @staticmethod
+    def encode(values):
+        _values = np.array([str(value).strip() if value is not None else '' for value in values], dtype=object)
+        _present = _values != ''
+        _categories, _inverse = np.unique(_values[_present].astype(str), return_inverse=True)
+        codes = np.full(len(_values), -1, dtype=np.int32)
+        codes[_present] = _inverse
+        return codes, _categories
+
+    @staticmethod
+    def to_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
+    # Return the codes of given category values for a column, unknown values are skipped
+    def lookup(self, column, values):
+        _categories = self.categories[column]
+        _values = [str(value) for value in values]
+        _positions = np.searchsorted(_categories, _values) if len(_values) else []
+        return np.array([
+            position for position, value in zip(_positions, _values)
+            if position < len(_categories) and _categories[position] == value
+        ], dtype=np.int32)
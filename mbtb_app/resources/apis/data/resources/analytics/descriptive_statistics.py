@@ -0,0 +1,131 @@
+import numpy as np
+from .dataset_snapshot import NUMERIC_COLUMNS
+
+DEFAULT_QUANTILES = [0.25, 0.5, 0.75]
+DEFAULT_BINS = 10
+MAX_BINS = 100
+
+
+# This class computes distributions (count, mean, std, min, max, quantiles, histogram) of numeric columns
+# over the rows selected by a cohort mask, grouped by an optional categorical column.
+# All statistics are computed for every group at once with bincount/lexsort, there is no per-group loop.
+class DescriptiveStatistics(object):
+
+    def __init__(self, **kwargs):
+        self.snapshot = kwargs.get('snapshot', None)
+
+    def run(self, **kwargs):
+        _mask = kwargs.get('mask', None)
+        _metrics = kwargs.get('metrics', None) or list(NUMERIC_COLUMNS)
+        _group_by = kwargs.get('group_by', None)
+        _quantiles = kwargs.get('quantiles', None) or DEFAULT_QUANTILES
+        _bins = kwargs.get('bins', None)
+        _bins = DEFAULT_BINS if _bins is None else _bins
+
+        # Validate input options
+        if not isinstance(_metrics, list) or not all(isinstance(metric, str) for metric in _metrics):
+            return {'response': False, 'message': "'metrics' should be a list of column names."}
+        _invalid_metrics = [metric for metric in _metrics if metric not in self.snapshot.numeric]
+        if _invalid_metrics:
+            return {'response': False, 'message': 'Invalid metrics: {}, allowed options are {}.'.format(
+                _invalid_metrics, list(NUMERIC_COLUMNS))}
+        if _group_by is not None and not isinstance(_group_by, str):
+            return {'response': False, 'message': "'group_by' should be a column name."}
+        if _group_by and _group_by not in self.snapshot.codes:
+            return {'response': False, 'message': "Invalid group_by column: '{}'.".format(_group_by)}
+        try:
+            _quantiles = np.array([float(q) for q in _quantiles], dtype=np.float64)
+            # whole numbers only, int() would truncate 2.7 and read true as 1
+            if isinstance(_bins, (bool, float)):
+                raise TypeError
+            _bins = int(_bins)
+        except (TypeError, ValueError):
+            return {'response': False, 'message': 'Expecting numbers for quantiles and bins.'}
+        if np.any((_quantiles < 0) | (_quantiles > 1)) or not 0 < _bins <= MAX_BINS:
+            return {'response': False, 'message': 'Quantiles should be within [0, 1] and bins within [1, {}].'.format(
+                MAX_BINS)}
+
+        # Group index per selected row, rows with a missing group value go to an extra trailing group
+        if _group_by:
+            _labels = self.snapshot.categories[_group_by].tolist() + [None]
+            _codes = self.snapshot.codes[_group_by][_mask]
+            _groups = np.where(_codes < 0, len(_labels) - 1, _codes)
+        else:
+            _labels = [None]
+            _groups = np.zeros(int(np.count_nonzero(_mask)), dtype=np.int32)
+        _group_sizes = np.bincount(_groups, minlength=len(_labels))
+
+        data = {'total': int(np.count_nonzero(_mask)), 'group_by': _group_by, 'metrics': {}}
+        for metric in _metrics:
+            data['metrics'][metric] = self.describe(
+                values=self.snapshot.numeric[metric][_mask], groups=_groups, labels=_labels,
+                group_sizes=_group_sizes, quantiles=_quantiles, bins=_bins
+            )
+
+        return {'response': True, 'data': data}
+
+    # Describe one numeric column for all groups
+    def describe(self, **kwargs):
+        _values = kwargs.get('values')
+        _groups = kwargs.get('groups')
+        _labels = kwargs.get('labels')
+        _group_sizes = kwargs.get('group_sizes')
+        _quantiles = kwargs.get('quantiles')
+        _bins = kwargs.get('bins')
+        _n_groups = len(_labels)
+
+        _valid = ~np.isnan(_values)
+        values, groups = _values[_valid], _groups[_valid]
+
+        count = np.bincount(groups, minlength=_n_groups)
+        _has_values = count > 0
+        _safe_count = np.maximum(count, 1)
+        mean = np.bincount(groups, weights=values, minlength=_n_groups) / _safe_count
+        _squared_deviation = np.bincount(groups, weights=(values - mean[groups]) ** 2, minlength=_n_groups)
+        std = np.sqrt(_squared_deviation / np.maximum(count - 1, 1))
+
+        # Sort values inside each group, groups are laid out one after another in `_sorted`
+        _sorted = values[np.lexsort((values, groups))]
+        _starts = np.concatenate(([0], np.cumsum(count)[:-1]))
+        _last = _starts + np.maximum(count - 1, 0)
+        minimum = _sorted[np.minimum(_starts, max(len(_sorted) - 1, 0))] if len(_sorted) else np.zeros(_n_groups)
+        maximum = _sorted[np.minimum(_last, max(len(_sorted) - 1, 0))] if len(_sorted) else np.zeros(_n_groups)
+
+        # Linear interpolation between closest ranks, same as numpy's default quantile method
+        _positions = _starts[:, None] + _quantiles[None, :] * np.maximum(count - 1, 0)[:, None]
+        _lower = np.floor(_positions).astype(np.int64)
+        _upper = np.ceil(_positions).astype(np.int64)
+        if len(_sorted):
+            _lower = np.minimum(_lower, len(_sorted) - 1)
+            _upper = np.minimum(_upper, len(_sorted) - 1)
+            quantiles = _sorted[_lower] + (_sorted[_upper] - _sorted[_lower]) * (_positions - _lower)
+        else:
+            quantiles = np.zeros(_positions.shape)
+
+        # Shared bin edges across groups so histograms are directly comparable
+        bin_edges = np.histogram_bin_edges(values, bins=_bins) if len(values) else np.array([])
+        if len(values):
+            _bin_index = np.clip(np.searchsorted(bin_edges, values, side='right') - 1, 0, _bins - 1)
+            histogram = np.bincount(
+                groups * _bins + _bin_index, minlength=_n_groups * _bins).reshape(_n_groups, _bins)
+        else:
+            histogram = np.zeros((_n_groups, _bins), dtype=np.int64)
+
+        _groups_response = []
+        for index in np.flatnonzero(_group_sizes):
+            _present = bool(_has_values[index])
+            _groups_response.append({
+                'group': _labels[index],
+                'count': int(count[index]),
+                'missing': int(_group_sizes[index] - count[index]),
+                'mean': float(mean[index]) if _present else None,
+                'std': float(std[index]) if count[index] > 1 else None,
+                'min': float(minimum[index]) if _present else None,
+                'max': float(maximum[index]) if _present else None,
+                'quantiles': {
+                    str(q): float(value) if _present else None for q, value in zip(_quantiles, quantiles[index])
+                },
+                'histogram': histogram[index].tolist(),
+            })
+
+        return {'bin_edges': bin_edges.tolist(), 'groups': _groups_response}
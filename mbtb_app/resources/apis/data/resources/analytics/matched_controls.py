@@ -0,0 +1,156 @@
+import math
+
+import numpy as np
+
+MAX_CASES = 200
+DEFAULT_EXACT_COLUMNS = ['sex', 'tissue_type']
+DEFAULT_AGE_TOLERANCE = 5
+
+# Upper bound of (cases x controls) cells evaluated at once, keeps the distance matrix small for large banks
+CHUNK_CELLS = 2000000
+
+
+# This class finds the best control donor for each case donor on a DatasetSnapshot.
+# Controls must match cases exactly on categorical columns and be within the age/postmortem_interval tolerances,
+# distance is the euclidean distance of the tolerance-scaled differences. Distances are computed as numpy matrices
+# of cases x controls, then controls are assigned greedily, closest pair first, each control used at most once.
+class MatchedControls(object):
+
+    def __init__(self, **kwargs):
+        self.snapshot = kwargs.get('snapshot', None)
+
+    def run(self, **kwargs):
+        _mask = kwargs.get('mask', None)
+        _cases = kwargs.get('cases', None) or []
+        _exact = kwargs.get('exact', None)
+        _exact = DEFAULT_EXACT_COLUMNS if _exact is None else _exact
+        _exclude_diagnoses = kwargs.get('exclude_diagnoses', None) or []
+        _tolerances = {
+            'age': kwargs.get('age_tolerance', DEFAULT_AGE_TOLERANCE),
+            'postmortem_interval': kwargs.get('postmortem_interval_tolerance', None),
+        }
+
+        # Validate input options
+        if not self.is_strings(_cases) or not 0 < len(_cases) <= MAX_CASES:
+            return {'response': False, 'message': 'Please provide 1 to {} case mbtb_code values.'.format(MAX_CASES)}
+        if not self.is_strings(_exact):
+            return {'response': False, 'message': "'exact' should be a list of column names."}
+        if not self.is_strings(_exclude_diagnoses):
+            return {'response': False, 'message': "'exclude_diagnoses' should be a list of diagnoses."}
+        _invalid_columns = [column for column in _exact if column not in self.snapshot.codes]
+        if _invalid_columns:
+            return {'response': False, 'message': 'Invalid exact match columns: {}.'.format(_invalid_columns)}
+        try:
+            if any(isinstance(value, bool) for value in _tolerances.values()):
+                raise TypeError
+            _tolerances = {column: float(value) for column, value in _tolerances.items() if value is not None}
+            if not all(math.isfinite(value) for value in _tolerances.values()):
+                raise ValueError
+        except (TypeError, ValueError):
+            return {'response': False, 'message': 'Expecting numbers for age and postmortem_interval tolerances.'}
+        if any(value <= 0 for value in _tolerances.values()):
+            return {'response': False, 'message': 'Tolerances should be greater than zero.'}
+
+        # Rows of case donors in request order, unknown codes are reported back
+        _mbtb_codes = self.snapshot.codes['mbtb_code']
+        _row_of_code = np.zeros(len(self.snapshot.categories['mbtb_code']), dtype=np.int64)
+        _row_of_code[_mbtb_codes[_mbtb_codes >= 0]] = np.flatnonzero(_mbtb_codes >= 0)
+        _case_codes = self.snapshot.lookup('mbtb_code', _cases)
+        _known = set(str(self.snapshot.categories['mbtb_code'][code]) for code in _case_codes)
+        missing = [code for code in _cases if code not in _known]
+        _case_rows = _row_of_code[_case_codes]
+        if not len(_case_rows):
+            return {'response': False, 'message': 'Invalid mbtb_code present, case data not found'}
+
+        # Pool of candidate controls: cohort rows which are not cases and not of an excluded diagnosis
+        _pool = _mask.copy()
+        _pool[_case_rows] = False
+        _pool &= ~np.isin(self.snapshot.codes['neuropathology_diagnosis'],
+                          self.snapshot.lookup('neuropathology_diagnosis', _exclude_diagnoses))
+        _control_rows = np.flatnonzero(_pool)
+
+        pairs = self.nearest_pairs(case_rows=_case_rows, control_rows=_control_rows, exact=_exact,
+                                   tolerances=_tolerances)
+        matches = self.assign(pairs=pairs, cases=len(_case_rows))
+
+        _code_names = self.snapshot.categories['mbtb_code']
+        data = []
+        for case_index, case_row in enumerate(_case_rows):
+            _match = {'case': str(_code_names[_mbtb_codes[case_row]]), 'control': None,
+                      'distance': None}
+            if case_index in matches:
+                control_row, distance = matches[case_index]
+                _match['control'] = str(_code_names[_mbtb_codes[control_row]])
+                _match['distance'] = distance
+                for column in _tolerances:
+                    _match[column + '_difference'] = float(
+                        self.snapshot.numeric[column][control_row] - self.snapshot.numeric[column][case_row])
+            data.append(_match)
+
+        return {'response': True, 'data': {'matches': data, 'missing': missing}}
+
+    # Whether an option is a list of strings
+    @staticmethod
+    def is_strings(value):
+        return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+    # Return (case index, control row, distance) candidate pairs, at most `len(case_rows)` closest per case.
+    # Greedy assignment can't use more candidates than that, since every other case blocks at most one control.
+    def nearest_pairs(self, **kwargs):
+        _case_rows = kwargs.get('case_rows')
+        _control_rows = kwargs.get('control_rows')
+        _exact = kwargs.get('exact')
+        _tolerances = kwargs.get('tolerances')
+        _per_case = len(_case_rows)
+        _chunk = max(1, CHUNK_CELLS // max(len(_control_rows), 1))
+
+        _case_index, _controls, _distances = [], [], []
+        for start in range(0, len(_case_rows), _chunk):
+            _rows = _case_rows[start:start + _chunk]
+            _feasible = np.ones((len(_rows), len(_control_rows)), dtype=bool)
+            _squared = np.zeros((len(_rows), len(_control_rows)), dtype=np.float64)
+
+            for column in _exact:
+                _codes = self.snapshot.codes[column]
+                _feasible &= (_codes[_rows][:, None] == _codes[_control_rows][None, :]) \
+                    & (_codes[_rows][:, None] >= 0)
+
+            # Scaled differences, unknown (NaN) values fail the tolerance check
+            for column, tolerance in _tolerances.items():
+                _values = self.snapshot.numeric[column]
+                _scaled = np.abs(_values[_rows][:, None] - _values[_control_rows][None, :]) / tolerance
+                with np.errstate(invalid='ignore'):
+                    _feasible &= _scaled <= 1
+                _squared += np.nan_to_num(_scaled) ** 2
+
+            # Candidates don't need to be sorted here, `assign` orders all pairs by distance
+            _squared[~_feasible] = np.inf
+            if _squared.shape[1] > _per_case:
+                _nearest = np.argpartition(_squared, _per_case - 1, axis=1)[:, :_per_case]
+            else:
+                _nearest = np.tile(np.arange(_squared.shape[1]), (len(_rows), 1))
+            _nearest_squared = np.take_along_axis(_squared, _nearest, axis=1)
+            _row_index, _column_index = np.nonzero(np.isfinite(_nearest_squared))
+            _case_index.append(_row_index + start)
+            _controls.append(_control_rows[_nearest[_row_index, _column_index]])
+            _distances.append(np.sqrt(_nearest_squared[_row_index, _column_index]))
+
+        if not _case_index:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate(_case_index), np.concatenate(_controls), np.concatenate(_distances)
+
+    # Greedy assignment: closest pairs first (ties by case order), each case and control used at most once
+    def assign(self, **kwargs):
+        _case_index, _controls, _distances = kwargs.get('pairs')
+        _order = np.lexsort((_case_index, _distances))
+
+        matches, _used = {}, set()
+        for index in _order:
+            case, control = int(_case_index[index]), int(_controls[index])
+            if case in matches or control in _used:
+                continue
+            matches[case] = (control, float(_distances[index]))
+            _used.add(control)
+            if len(matches) == kwargs.get('cases'):
+                break
+        return matches
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import permissions, response, status
+from resources.caching.table_versions import TableVersions
+from resources.db_operations.change_log import DonorChanges
+from resources.metrics.metrics import Metrics
+
+
+# This class is a two-tier cache of response data: a bounded LRU of the process (L1) in front of the shared
+# 'responses' cache of all workers (L2). Keys contain the versions of the tables a response is read from, so a
+# write which bumps a table's version makes every cached response of it unreachable on every worker (once it
+# polled the new version, see TableVersions).
+class ResponseCache(object):
+
+    def __init__(self, **kwargs):
+        self.name = kwargs.get('name', 'response_cache')  # prefix of metrics
+        self.max_size = kwargs.get('max_size', 256)
+        self.ttl = kwargs.get('ttl', 60)
+        self._entries = OrderedDict()
+        self._lookups = 0
+        self._hits = 0
+        self._lock = threading.Lock()
+
+    # Key of a request path on the current versions of its tables
+    @staticmethod
+    def key(tables, path):
+        return '{}:{}'.format(':'.join(TableVersions.get(table) for table in tables), path)
+
+    def get(self, key):
+        with self._lock:
+            _entry = self._entries.get(key)
+            _local = _entry is not None and _entry[1] > time.monotonic()
+            if _local:
+                self._entries.move_to_end(key)
+        if _local:
+            self.record('l1_hits')
+            return _entry[0]
+
+        data = caches['responses'].get(key)
+        if data is None:
+            self.record('misses')
+            return None
+        self.set_local(key, data)
+        self.record('l2_hits')
+        return data
+
+    def set(self, key, data):
+        caches['responses'].set(key, data)
+        self.set_local(key, data)
+
+    def set_local(self, key, data):
+        with self._lock:
+            self._entries[key] = (data, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            Metrics.set_gauge(self.name + '.size', len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Count the lookup and report the hit ratio of this process
+    def record(self, outcome):
+        with self._lock:
+            self._lookups += 1
+            self._hits += outcome != 'misses'
+            _hit_ratio = round(self._hits / self._lookups, 4)
+        Metrics.increment('{}.{}'.format(self.name, outcome))
+        Metrics.set_gauge(self.name + '.hit_ratio', _hit_ratio)
+
+
+# Responses of write requests which changed nothing
+UNCHANGED_STATUS = (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN, status.HTTP_404_NOT_FOUND,
+                    status.HTTP_405_METHOD_NOT_ALLOWED, status.HTTP_409_CONFLICT)
+
+RESPONSE_CACHE = ResponseCache(
+    max_size=getattr(settings, 'RESPONSE_CACHE_SIZE', 256), ttl=getattr(settings, 'RESPONSE_CACHE_TTL', 60)
+)
+
+
+# This mixin caches successful list and retrieve responses of a viewset in RESPONSE_CACHE, keyed by renderer,
+# request path and the versions of `cache_tables`. Permissions are still checked on every request, before the cache.
+class CachedReadMixin(object):
+    cache_tables = []
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, lambda: super(CachedReadMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(request, lambda: super(CachedReadMixin, self).retrieve(request, *args, **kwargs))
+
+    # Versions are read before the data, a write in between only stores the response under the old versions
+    def cached(self, request, read):
+        _key = RESPONSE_CACHE.key(self.cache_tables, request.accepted_renderer.format + request.get_full_path())
+        _data = RESPONSE_CACHE.get(_key)
+        if _data is not None:
+            return response.Response(_data)
+
+        _response = read()
+        if _response.status_code == 200:
+            RESPONSE_CACHE.set(_key, _response.data)
+        return _response
+
+
+# This mixin bumps the versions of `cache_tables` after write requests (POST, PUT, PATCH, DELETE) of a view, in the
+# request's transaction. Failed writes bump them too since they may have saved part of their rows, except requests
+# which never reached the handler or found nothing to change (handlers set `unchanged` for successful writes which
+# didn't change anything).
+class InvalidateOnWriteMixin(object):
+    cache_tables = []
+    unchanged = False
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in permissions.SAFE_METHODS:
+            return super(InvalidateOnWriteMixin, self).dispatch(request, *args, **kwargs)
+        # changes of donors are logged at the end of the request, see DonorChanges
+        with transaction.atomic(), DonorChanges.deferred():
+            return super(InvalidateOnWriteMixin, self).dispatch(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in permissions.SAFE_METHODS and response.status_code not in UNCHANGED_STATUS and \
+                not self.unchanged:
+            for table in self.cache_tables:
+                TableVersions.bump(table)
+        return super(InvalidateOnWriteMixin, self).finalize_response(request, response, *args, **kwargs)
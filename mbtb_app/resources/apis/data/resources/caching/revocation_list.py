@@ -0,0 +1,121 @@
+import threading
+import time
+
+from django.db.models import Max
+from mbtb.models import TokenRevocation
+from resources.metrics.metrics import Metrics
+from .bloom_filter import BloomFilter
+
+# Ids below the last polled event which weren't read yet (gaps) may belong to inserts which commit later, they are
+# read again on every poll until they show up, for at most GAP_SECONDS of this worker (inserts which were rolled
+# back leave gaps forever). At most MAX_GAPS ids below a new event are tracked
+GAP_SECONDS = 60
+MAX_GAPS = 1000
+
+
+# This class is the per process list of users whose tokens are revoked (suspended or deleted accounts).
+# token_revocations is an append-only log of revoke/restore events written by the users service. Every `refresh`
+# seconds the events after the last polled id (and in gaps below it) are applied to the exact set of revoked users
+# and to a Bloom filter in front of it, so checking a user who isn't revoked is a filter probe. Polls only compare
+# ids, never the clocks of both services.
+# Revocations older than the token lifetime are dropped, tokens issued before them have expired.
+class RevocationList(object):
+
+    def __init__(self, **kwargs):
+        self.refresh = kwargs.get('refresh', 2)
+        self.lifetime = kwargs.get('lifetime', 8 * 60 * 60)
+        self.capacity = kwargs.get('capacity', 1024)
+        self._filter = BloomFilter(capacity=self.capacity)
+        self._revoked = set()
+        self._latest = {}  # user id -> (event id, revoked, created_at) of the user's last applied event
+        self._last_id = 0
+        self._gaps = {}  # id -> time.monotonic() it's missing since
+        self._polled_at = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, user_id):
+        if self._polled_at is None or time.monotonic() - self._polled_at >= self.refresh:
+            self.poll()
+        return user_id in self._filter and user_id in self._revoked
+
+    # Apply new events, only one thread of the process queries, others keep using the current list
+    def poll(self, force=False):
+        if not self._lock.acquire(blocking=force or self._polled_at is None):
+            return
+        try:
+            if not force and self._polled_at is not None and time.monotonic() - self._polled_at < self.refresh:
+                return
+            _now = int(time.time() * 1000)
+            _events = TokenRevocation.objects.filter(created_at__gt=_now - self.lifetime * 1000)
+            if self._polled_at is not None:
+                _events = _events.filter(id__gte=min(self._gaps, default=self._last_id + 1))
+            _events = list(_events.order_by('id').values_list('id', 'user_id', 'revoked', 'created_at'))
+
+            # Ids below the first load are older than the token lifetime, not gaps
+            if self._polled_at is None:
+                self._last_id = _events[0][0] - 1 if _events else \
+                    TokenRevocation.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+            self.track(event_ids=[event[0] for event in _events])
+
+            _applied = self.apply(events=_events, now=_now)
+            # Delay from the write of the oldest new event to its poll, as far as the services' clocks agree
+            if _applied and self._polled_at is not None:
+                Metrics.increment('revocation_list.events', len(_applied))
+                Metrics.set_gauge('revocation_list.propagation_delay_ms',
+                                  _now - min(created_at for _, _, _, created_at in _applied))
+            self._polled_at = time.monotonic()
+            Metrics.increment('revocation_list.polls')
+            Metrics.set_gauge('revocation_list.size', len(self._revoked))
+        finally:
+            self._lock.release()
+
+    # Move the last polled id to the polled events, ids skipped on the way become gaps until they are polled or
+    # GAP_SECONDS passed
+    def track(self, **kwargs):
+        _now = time.monotonic()
+        for event_id in kwargs.get('event_ids'):
+            self._gaps.pop(event_id, None)
+            if event_id > self._last_id:
+                for gap in range(max(self._last_id + 1, event_id - MAX_GAPS), event_id):
+                    self._gaps[gap] = _now
+                self._last_id = event_id
+
+        for gap in [gap for gap, missing_since in self._gaps.items() if _now - missing_since > GAP_SECONDS]:
+            del self._gaps[gap]
+        Metrics.set_gauge('revocation_list.gaps', len(self._gaps))
+
+    # Apply events in id order, skip the ones already applied, return applied events
+    def apply(self, **kwargs):
+        _now = kwargs.get('now')
+        _rebuild = False
+
+        applied = []
+        for event in kwargs.get('events'):
+            _event_id, _user_id, _revoked, _created_at = event
+            if self._latest.get(_user_id, (0,))[0] >= _event_id:
+                continue
+            self._latest[_user_id] = (_event_id, _revoked, _created_at)
+            applied.append(event)
+            if _revoked:
+                self._revoked.add(_user_id)
+                self._filter.add(_user_id)
+            else:
+                self._revoked.discard(_user_id)
+                _rebuild = True
+
+        # Drop users whose last event is older than the token lifetime
+        for _user_id in [user_id for user_id, latest in self._latest.items()
+                         if latest[2] <= _now - self.lifetime * 1000]:
+            del self._latest[_user_id]
+            if _user_id in self._revoked:
+                self._revoked.discard(_user_id)
+                _rebuild = True
+
+        # Restored and expired users stay set in the filter until it is rebuilt, also rebuild once it's full
+        if _rebuild or self._filter.count > self.capacity:
+            self.capacity = max(self.capacity, 2 * len(self._revoked))
+            _filter = BloomFilter(capacity=self.capacity)
+            for user_id in self._revoked:
+                _filter.add(user_id)
+            self._filter = _filter
+        return applied
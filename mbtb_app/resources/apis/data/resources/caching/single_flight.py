@@ -0,0 +1,91 @@
+import fcntl
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from resources.metrics.metrics import Metrics
+
+
+# This class coalesces concurrent identical computations: while one thread of the process computes the result of
+# a key, other threads asking for the same key wait and share its result (or exception) instead of computing it.
+# With a shared `cache` (alias of CACHES), results are also shared with other workers: the first worker computes
+# under a host-wide file lock of the key while the others wait for it and read its result from the cache,
+# so an invalidation can't start a stampede of identical computations.
+class SingleFlight(object):
+
+    def __init__(self, **kwargs):
+        self.name = kwargs.get('name')  # prefix of metrics and shared cache keys
+        self.cache = kwargs.get('cache', None)
+        self.timeout = kwargs.get('timeout', DEFAULT_TIMEOUT)  # seconds results stay in the shared cache
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, function):
+        with self._lock:
+            _call = self._calls.get(key)
+            _leader = _call is None
+            if _leader:
+                _call = self._calls[key] = InFlight()
+
+        if not _leader:
+            Metrics.increment(self.name + '.coalesced')
+            return _call.wait()
+
+        try:
+            _call.result = self.shared(key, function) if self.cache else function()
+        except BaseException as error:
+            _call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            _call.done.set()
+        return _call.result
+
+    # Read the result of other workers from the shared cache, or compute it as the first worker
+    def shared(self, key, function):
+        _cache = caches[self.cache]
+        _cache_key = '{}:{}'.format(self.name, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+        result = _cache.get(_cache_key)
+        if result is None:
+            with host_lock(_cache_key):
+                result = _cache.get(_cache_key)
+                if result is None:
+                    result = function()
+                    _cache.set(_cache_key, result, self.timeout)
+                    Metrics.increment(self.name + '.computed')
+                    return result
+        Metrics.increment(self.name + '.shared_hits')
+        return result
+
+
+# This class is a computation in flight, followers wait for its result
+class InFlight(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+# Exclusive lock of a name across all workers of the host, a file in LOCK_DIR
+@contextmanager
+def host_lock(name):
+    os.makedirs(settings.LOCK_DIR, exist_ok=True)
+    with open(os.path.join(settings.LOCK_DIR, name.replace(':', '.') + '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
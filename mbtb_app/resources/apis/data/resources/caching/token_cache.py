@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+
+from resources.caching.table_versions import TableVersions
+from resources.metrics.metrics import Metrics
+
+
+# This class is a bounded LRU cache of auth tokens and their principal (e.g. id, email, role) with a TTL.
+# Keys are the full token bytes, so a tampered token (payload or signature) never hits and is verified again.
+# Entries expire after `ttl` seconds or at the token's own `exp` claim, whichever comes first.
+# With a `namespace` of TableVersions, all entries are dropped once the namespace's version changed.
+class TokenCache(object):
+
+    def __init__(self, **kwargs):
+        self.name = kwargs.get('name', 'token_cache')  # prefix of metrics
+        self.max_size = kwargs.get('max_size', 1024)
+        self.ttl = kwargs.get('ttl', 60)
+        self.namespace = kwargs.get('namespace', None)
+        self._version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        self.validate()
+        with self._lock:
+            _entry = self._entries.get(token)
+            if _entry is not None and _entry[1] <= time.time():
+                del self._entries[token]
+                _entry = None
+            if _entry is None:
+                Metrics.increment(self.name + '.misses')
+                return None
+
+            self._entries.move_to_end(token)
+        Metrics.increment(self.name + '.hits')
+        return dict(_entry[0])
+
+    def set(self, token, principal, expires_at=None):
+        _expires_at = time.time() + self.ttl
+        if expires_at is not None:
+            _expires_at = min(_expires_at, expires_at)
+
+        self.validate()
+        with self._lock:
+            self._entries[token] = (dict(principal), _expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                Metrics.increment(self.name + '.evictions')
+            Metrics.set_gauge(self.name + '.size', len(self._entries))
+
+    # Expiry time of a cached token, None if not cached
+    def expires_at(self, token):
+        with self._lock:
+            _entry = self._entries.get(token)
+        return _entry[1] if _entry is not None else None
+
+    # Remove entries whose principal matches, e.g. all tokens of an account after its status changed
+    def discard(self, match):
+        with self._lock:
+            for token in [token for token, entry in self._entries.items() if match(entry[0])]:
+                del self._entries[token]
+            Metrics.set_gauge(self.name + '.size', len(self._entries))
+
+    # Drop all entries once the namespace's version changed
+    def validate(self):
+        if self.namespace is None:
+            return
+        _version = TableVersions.get(self.namespace)
+        with self._lock:
+            if _version != self._version:
+                self._entries.clear()
+                self._version = _version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,36 @@
+from django.db.models import Q
+from rest_framework import exceptions
+
+# Values of `archived` of list and download requests: leave archived donors out (default), include them or return
+# archived donors only
+ARCHIVED_MODES = ('exclude', 'include', 'only')
+
+
+# Condition on prime_details.archive (through `prefix`, e.g. 'prime_details_id__') of the donors of an `archived`
+# mode, served by the archive indexes of prime_details and donor_flat. Rows written by the ORM before archive had a
+# default are NULL, they aren't archived either.
+def archived_q(mode, prefix=''):
+    if mode == 'include':
+        return Q()
+    if mode == 'only':
+        return Q(**{prefix + 'archive': 'Yes'})
+    return Q(**{prefix + 'archive': 'No'}) | Q(**{prefix + 'archive__isnull': True})
+
+
+# This mixin leaves archived donors out of list responses of a donor viewset unless requested with
+# ?archived=include or ?archived=only. Detail responses include archived donors.
+class ArchivedFilterMixin(object):
+    archive_prefix = ''  # path from the viewset's model to prime_details
+
+    def get_queryset(self):
+        queryset = super(ArchivedFilterMixin, self).get_queryset()
+        if self.action != 'list':
+            return queryset
+        return queryset.filter(archived_q(self.archived_mode(), self.archive_prefix))
+
+    def archived_mode(self):
+        mode = self.request.query_params.get('archived', 'exclude')
+        if mode not in ARCHIVED_MODES:
+            raise exceptions.ValidationError({
+                'Error': "'archived' must be one of {}".format(', '.join(ARCHIVED_MODES))})
+        return mode
@@ -0,0 +1,247 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from mbtb.models import PrimeDetails, OtherDetails
+from mbtb.serializers import BatchPrimeDetailsSerializer, BatchOtherDetailsSerializer
+from resources.db_operations.change_log import DonorChanges, INSERT, UPDATE, DELETE
+from resources.db_operations.donor_flat import DonorFlatTable
+from resources.db_operations.get_or_create import GetOrCreate
+from resources.validations.validate_data import ValidateData
+
+# Columns of batch operations per donor table
+PRIME_DETAILS_COLUMNS = ['mbtb_code', 'sex', 'age', 'postmortem_interval', 'time_in_fix', 'clinical_diagnosis',
+                         'preservation_method', 'storage_year']
+OTHER_DETAILS_COLUMNS = ['race', 'duration', 'clinical_details', 'cause_of_death', 'brain_weight',
+                         'neuropathology_summary', 'neuropathology_gross', 'neuropathology_microscopic', 'cerad',
+                         'braak_stage', 'khachaturian', 'abc', 'formalin_fixed', 'fresh_frozen']
+
+# Dimension columns of batch operations, given by name: column -> (GetOrCreate model name, name field, donor table,
+# foreign key of the donor table)
+DIMENSION_COLUMNS = {
+    'tissue_type': ('TissueTypes', 'tissue_type', PrimeDetails, 'tissue_type'),
+    'neuropathology_diagnosis': ('NeuropathologicalDiagnosis', 'neuro_diagnosis_name', PrimeDetails,
+                                 'neuro_diagnosis_id'),
+    'autopsy_type': ('AutopsyTypes', 'autopsy_type', OtherDetails, 'autopsy_type'),
+}
+
+# Status of valid operations of a failed batch, they depended on the failed ones
+NOT_APPLIED = 424
+
+
+# This class applies a batch of donor operations, all or nothing, in one transaction:
+#   {"op": "create", "data": {<columns of add_new_data/>}}
+#   {"op": "patch", "prime_details_id": 1, "data": {<some columns of add_new_data/>}, "row_version": 3}
+#   {"op": "delete", "prime_details_id": 1}
+# Every operation is validated first (donors are locked with a query per table), then dimensions are resolved with
+# a query per dimension table and rows are written with bulk inserts, updates and deletes (of prime_details, the
+# database deletes their other rows). A donor can only be the
+# target of one operation, patches increment its row_version and are rejected if they give another one than the
+# donor's (optional, like edit_data/). run() returns a result per operation with its HTTP like status.
+class BatchMutation(object):
+
+    def __init__(self, **kwargs):
+        self.operations = kwargs.get('operations', None)
+        self.results = []
+        self._validated = {}  # index of operation -> (prime_details data, other_details data, dimension names)
+
+    def run(self):
+        _limit = getattr(settings, 'BATCH_MUTATION_LIMIT', 500)
+        if not isinstance(self.operations, list) or not 0 < len(self.operations) <= _limit:
+            return {'response': False, 'message': "'operations' must be a list of 1 to {} operations".format(_limit)}
+
+        with transaction.atomic():
+            _prime_details, _other_details = self.lock_donors()
+            self.validate(_prime_details, _other_details)
+            if any(result['status'] >= 400 for result in self.results):
+                return self.failed('Batch failed, nothing was changed.')
+
+            try:
+                with DonorChanges.atomic(), DonorFlatTable.deferred():
+                    self.apply(_prime_details, _other_details)
+            except IntegrityError as error:
+                return self.failed('Batch failed, nothing was changed: {}'.format(error))
+
+        return {'response': True, 'results': self.results}
+
+    # prime_details and other_details of donors targeted by patch and delete operations, locked until the end of
+    # the transaction: ({prime_details_id: PrimeDetails}, {prime_details_id: OtherDetails})
+    def lock_donors(self):
+        _ids = [operation.get('prime_details_id') for operation in self.operations if isinstance(operation, dict)]
+        _ids = [value for value in _ids if isinstance(value, int) and not isinstance(value, bool)]
+        prime_details = PrimeDetails.objects.select_for_update().in_bulk(_ids)
+        other_details = {
+            other.prime_details_id_id: other
+            for other in OtherDetails.objects.select_for_update().filter(prime_details_id__in=_ids)
+        }
+        return prime_details, other_details
+
+    # row_version of a patch as an int (like edit_data/, numeric strings as well), None if it's not a whole number
+    @staticmethod
+    def parse_row_version(value):
+        if isinstance(value, (bool, float)):
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    # Validate every operation, set its result
+    def validate(self, prime_details, other_details):
+        _targets = set()
+        _mbtb_codes = {}  # mbtb_code (case-insensitive, like the unique key) -> index of the operation which sets it
+        for index, operation in enumerate(self.operations):
+            _op = operation.get('op') if isinstance(operation, dict) else None
+            self.results.append({'op': _op, 'status': 400})
+            if _op not in ('create', 'patch', 'delete'):
+                self.results[index]['Error'] = "'op' must be one of 'create', 'patch', 'delete'"
+                continue
+
+            _prime_details_id = operation.get('prime_details_id') if _op != 'create' else None
+            if _op != 'create':
+                self.results[index]['prime_details_id'] = _prime_details_id
+                if not isinstance(_prime_details_id, int) or _prime_details_id not in prime_details or \
+                        _prime_details_id not in other_details:
+                    self.results[index].update(status=404, Error='Donor not found.')
+                    continue
+                if _prime_details_id in _targets:
+                    self.results[index]['Error'] = 'Donor is the target of more than one operation.'
+                    continue
+                _row_version = operation.get('row_version', None) if _op == 'patch' else None
+                if _row_version not in (None, ''):
+                    _row_version = self.parse_row_version(_row_version)
+                    if _row_version is None:
+                        self.results[index]['Error'] = "'row_version' must be a number."
+                        continue
+                    if _row_version != prime_details[_prime_details_id].row_version:
+                        self.results[index].update(status=409, Error='Donor was changed by another request.')
+                        continue
+                _targets.add(_prime_details_id)
+
+            if _op == 'delete':
+                self.results[index]['status'] = 200
+                continue
+
+            _errors = self.validate_data(index, operation.get('data'), prime_details.get(_prime_details_id),
+                                         other_details.get(_prime_details_id))
+            if _errors:
+                self.results[index]['Error'] = _errors
+                continue
+
+            _mbtb_code = self._validated[index][0].get('mbtb_code')
+            if _op == 'create':
+                self.results[index]['mbtb_code'] = _mbtb_code
+            if _mbtb_code is not None:
+                if _mbtb_code.casefold() in _mbtb_codes:
+                    self.results[index]['Error'] = 'mbtb_code is set by more than one operation.'
+                    continue
+                _mbtb_codes[_mbtb_code.casefold()] = index
+            self.results[index]['status'] = 201 if _op == 'create' else 200
+
+        # mbtb_codes must not belong to other donors, except donors deleted by the batch
+        _deleted = {result['prime_details_id'] for result in self.results
+                    if result['op'] == 'delete' and result['status'] == 200}
+        _codes = [self._validated[index][0]['mbtb_code'] for index in _mbtb_codes.values()]
+        for mbtb_code, owner in PrimeDetails.objects.filter(mbtb_code__in=_codes).values_list(
+                'mbtb_code', 'prime_details_id'):
+            _index = _mbtb_codes.get(mbtb_code.casefold())
+            if _index is not None and owner not in _deleted and owner != self.results[_index].get('prime_details_id'):
+                self.results[_index].update(status=400, Error='prime details with this mbtb code already exists.')
+
+    # Validate columns of a create (all columns required) or patch (instances of the donor given) operation, keep
+    # the validated data. Return errors, if any
+    def validate_data(self, index, data, prime_details, other_details):
+        if not isinstance(data, dict) or not data:
+            return "Please provide mbtb data with 'data' tag"
+
+        if prime_details is None:
+            _column_names = ValidateData().check_column_names(column_names=list(data.keys()))
+            if not _column_names['Response']:
+                return _column_names['Message']
+
+        _unknown = set(data) - set(PRIME_DETAILS_COLUMNS) - set(OTHER_DETAILS_COLUMNS) - set(DIMENSION_COLUMNS)
+        if _unknown:
+            return "Column names {} don't exist, Please try again with valid names.".format(sorted(_unknown))
+
+        _dimensions = {column: data[column] for column in DIMENSION_COLUMNS if column in data}
+        errors = {column: ['Not a valid string.'] for column, value in _dimensions.items()
+                  if not isinstance(value, str) or not value}
+
+        _partial = prime_details is not None
+        _prime = BatchPrimeDetailsSerializer(prime_details, partial=_partial, data={
+            column: data[column] for column in PRIME_DETAILS_COLUMNS if column in data})
+        _other = BatchOtherDetailsSerializer(other_details, partial=_partial, data={
+            column: data[column] for column in OTHER_DETAILS_COLUMNS if column in data})
+        if not _prime.is_valid():
+            errors.update(_prime.errors)
+        if not _other.is_valid():
+            errors.update(_other.errors)
+
+        if not errors:
+            self._validated[index] = (_prime.validated_data, _other.validated_data, _dimensions)
+        return errors
+
+    # Write all operations: bulk deletes, updates and inserts, then refresh the donor_flat rows of the donors
+    def apply(self, prime_details, other_details):
+        _deleted = [result['prime_details_id'] for result in self.results if result['op'] == 'delete']
+        if _deleted:
+            PrimeDetails.objects.filter(prime_details_id__in=_deleted).delete()
+            DonorChanges.record(DELETE, _deleted)
+
+        # dimension objects of all names in the batch: column -> {name: object}
+        _dimensions = {}
+        for column, (model_name, field, _, _) in DIMENSION_COLUMNS.items():
+            _names = [names[column] for _, _, names in self._validated.values() if column in names]
+            if _names:
+                _dimensions[column] = GetOrCreate(model_name=model_name).run_many(**{field: _names})
+
+        _rows = {}  # index of operation -> (PrimeDetails, OtherDetails)
+        _updated = {PrimeDetails: set(), OtherDetails: set()}
+        for index, (prime_data, other_data, names) in self._validated.items():
+            if self.results[index]['op'] == 'patch':
+                _prime_details_id = self.results[index]['prime_details_id']
+                _row = prime_details[_prime_details_id], other_details[_prime_details_id]
+                _row[0].row_version += 1
+                _updated[PrimeDetails].add('row_version')
+            else:
+                _row = PrimeDetails(), OtherDetails()
+
+            for instance, data in zip(_row, (prime_data, other_data)):
+                for field, value in data.items():
+                    setattr(instance, field, value)
+                _updated[type(instance)].update(data)
+            for column, name in names.items():
+                _, _, model, field = DIMENSION_COLUMNS[column]
+                setattr(_row[0] if model is PrimeDetails else _row[1], field, _dimensions[column][name])
+                _updated[model].add(field)
+            _rows[index] = _row
+
+        _patched = [row for index, row in _rows.items() if self.results[index]['op'] == 'patch']
+        if _patched and _updated[PrimeDetails]:
+            PrimeDetails.objects.bulk_update([prime for prime, _ in _patched], list(_updated[PrimeDetails]))
+        if _patched and _updated[OtherDetails]:
+            OtherDetails.objects.bulk_update([other for _, other in _patched], list(_updated[OtherDetails]))
+
+        # ids of bulk inserts aren't returned by MySQL, new donors are read back by their unique mbtb_code
+        _created = {index: row for index, row in _rows.items() if self.results[index]['op'] == 'create'}
+        if _created:
+            PrimeDetails.objects.bulk_create([prime for prime, _ in _created.values()])
+            _ids = dict(PrimeDetails.objects.filter(
+                mbtb_code__in=[prime.mbtb_code for prime, _ in _created.values()]).values_list(
+                'mbtb_code', 'prime_details_id'))
+            for index, (prime, other) in _created.items():
+                other.prime_details_id_id = _ids[prime.mbtb_code]
+                self.results[index]['prime_details_id'] = _ids[prime.mbtb_code]
+            OtherDetails.objects.bulk_create([other for _, other in _created.values()])
+
+        # bulk inserts and updates don't send signals
+        DonorFlatTable.changed([self.results[index]['prime_details_id'] for index in _rows])
+        DonorChanges.record(UPDATE, [prime.prime_details_id for prime, _ in _patched])
+        DonorChanges.record(INSERT, [self.results[index]['prime_details_id'] for index in _created])
+
+    # Result of a batch with invalid operations, valid ones weren't applied either
+    def failed(self, message):
+        for result in self.results:
+            if result['status'] < 400:
+                result['status'] = NOT_APPLIED
+            if result['op'] == 'create':
+                result.pop('prime_details_id', None)
+        return {'response': False, 'message': message, 'results': self.results}
@@ -0,0 +1,93 @@
+from django.db import transaction
+from django.db.models import F
+from mbtb.models import PrimeDetails
+from resources.db_operations.change_log import DonorChanges, DELETE, UPDATE
+from resources.db_operations.donor_flat import DonorFlatTable
+
+# Actions of bulk requests and the value of prime_details.archive they set
+ACTIONS = {'delete': None, 'archive': 'Yes', 'unarchive': 'No'}
+
+# Filter columns (the categorical columns of analytics cohorts) and their lookups of `PrimeDetails`: selections read the
+# written tables and the dimension tables, donors missing in donor_flat are selected as well
+FILTER_LOOKUPS = {
+    'mbtb_code': 'mbtb_code',
+    'sex': 'sex',
+    'clinical_diagnosis': 'clinical_diagnosis',
+    'neuropathology_diagnosis': 'neuro_diagnosis_id__neuro_diagnosis_name',
+    'tissue_type': 'tissue_type__tissue_type',
+    'preservation_method': 'preservation_method',
+    'archive': 'archive',
+    'autopsy_type': 'otherdetails__autopsy_type__autopsy_type',
+    'race': 'otherdetails__race',
+    'cause_of_death': 'otherdetails__cause_of_death',
+    'cerad': 'otherdetails__cerad',
+    'braak_stage': 'otherdetails__braak_stage',
+    'khachaturian': 'otherdetails__khachaturian',
+    'abc': 'otherdetails__abc',
+    'formalin_fixed': 'otherdetails__formalin_fixed',
+    'fresh_frozen': 'otherdetails__fresh_frozen',
+}
+
+
+# This class deletes, archives or unarchives the donors selected by a list of mbtb codes and/or a filter of donor
+# columns with lists of values, e.g. {"neuropathology_diagnosis": ["ALZHEIMER'S DISEASE"], "archive": ["Yes"]}
+# (columns as of analytics cohorts, categorical ones only). Selected donors are locked with one query, then changed
+# with a single DELETE or UPDATE of prime_details: the database deletes their other_details, image_repository and
+# donor_flat rows (ON DELETE CASCADE), archived donors' row_version is incremented and donor_flat rows refreshed.
+class BulkDonors(object):
+
+    def __init__(self, **kwargs):
+        self.mbtb_codes = kwargs.get('mbtb_codes', None)
+        self.filter = kwargs.get('filter', None)
+
+    def run(self, **kwargs):
+        _action = kwargs.get('action', None)
+        if _action not in ACTIONS:
+            return {'response': False, 'message': "'action' must be one of {}".format(', '.join(ACTIONS))}
+
+        _error = self.validate()
+        if _error:
+            return {'response': False, 'message': _error}
+
+        with transaction.atomic():
+            _donors = dict(self.select().select_for_update().values_list('prime_details_id', 'mbtb_code'))
+            _selected = PrimeDetails.objects.filter(prime_details_id__in=list(_donors))
+            if _donors and _action == 'delete':
+                _selected.delete()
+                DonorChanges.record(DELETE, list(_donors))
+            elif _donors:
+                _selected.update(archive=ACTIONS[_action], row_version=F('row_version') + 1)
+                DonorFlatTable.changed(list(_donors))
+                DonorChanges.record(UPDATE, list(_donors))
+
+        _found = {mbtb_code.casefold() for mbtb_code in _donors.values()}
+        missing = [mbtb_code for mbtb_code in self.mbtb_codes or [] if mbtb_code.casefold() not in _found]
+        return {'response': True, 'count': len(_donors), 'missing': missing}
+
+    # Check the selection, a request without codes or filter would select every donor
+    def validate(self):
+        if self.mbtb_codes is None and not self.filter:
+            return "Please provide 'mbtb_codes' and/or 'filter'"
+
+        if self.mbtb_codes is not None and (not isinstance(self.mbtb_codes, list) or not self.mbtb_codes or not all(
+                isinstance(mbtb_code, str) for mbtb_code in self.mbtb_codes)):
+            return "'mbtb_codes' must be a list of mbtb codes"
+
+        if self.filter is not None:
+            if not isinstance(self.filter, dict) or not self.filter:
+                return "'filter' should be an object of column names and lists of values."
+            for column, values in self.filter.items():
+                if column not in FILTER_LOOKUPS:
+                    return "Invalid filter column: '{}'.".format(column)
+                if not isinstance(values, list) or not values or not all(isinstance(value, str) for value in values):
+                    return "Values of '{}' should be a list of strings.".format(column)
+        return None
+
+    # prime_details of the selected donors, filtered through their own columns, other_details and the dimension
+    # tables with a single filter() (one join of other_details for all of its columns)
+    def select(self):
+        prime_details = PrimeDetails.objects.all()
+        if self.mbtb_codes is not None:
+            prime_details = prime_details.filter(mbtb_code__in=self.mbtb_codes)
+        return prime_details.filter(**{'{}__in'.format(FILTER_LOOKUPS[column]): values
+                                       for column, values in (self.filter or {}).items()})
@@ -0,0 +1,104 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+from mbtb.models import ChangeLog
+from resources.caching.table_versions import TableVersions, CHANGES
+
+# Operations of change_log entries
+INSERT, UPDATE, DELETE = 'insert', 'update', 'delete'
+
+
+# This class appends changes of donors to change_log, in the transaction of the change (see mbtb.signals, bulk
+# writes which skip signals and deletes record their changes themselves), and reads them for incremental sync.
+# change_ids are assigned by inserts but transactions commit in any order, so cursors are versions of the CHANGES
+# counter instead: entries are written along with an increment of the counter as the last statements of their
+# transaction, and the counter's row stays locked until the transaction ends. A transaction which gets version N
+# waits until the one with N - 1 committed, so once an entry of version N can be read, all entries of lower versions
+# can be read too and a cursor never skips one.
+class DonorChanges(object):
+    _deferred = threading.local()
+
+    # Append an operation of donors, at the end of the current deferred() block if any
+    @classmethod
+    def record(cls, operation, prime_details_ids):
+        _pending = getattr(cls._deferred, 'pending', None)
+        if _pending is None:
+            cls.write([(operation, prime_details_id) for prime_details_id in prime_details_ids])
+        else:
+            _pending.extend((operation, prime_details_id) for prime_details_id in prime_details_ids)
+
+    # Collect the operations of a block (e.g. a write request, see InvalidateOnWriteMixin) and write them once at
+    # its end, so the counter is locked from the end of the block to the end of the transaction only
+    @classmethod
+    @contextmanager
+    def deferred(cls):
+        if getattr(cls._deferred, 'pending', None) is not None:
+            yield
+            return
+        cls._deferred.pending = []
+        try:
+            yield
+            _pending = cls._deferred.pending
+        finally:
+            cls._deferred.pending = None
+        cls.write(_pending)
+
+    # transaction.atomic() block whose operations are dropped along with its rows if it raises, operations of a
+    # deferred() block are only written at its end
+    @classmethod
+    @contextmanager
+    def atomic(cls):
+        _pending = getattr(cls._deferred, 'pending', None)
+        _recorded = len(_pending) if _pending is not None else 0
+        try:
+            with transaction.atomic():
+                yield
+        except Exception:
+            if _pending is not None:
+                del _pending[_recorded:]
+            raise
+
+    # Increment the counter and append entries of its version with a single insert, an entry per donor
+    @classmethod
+    def write(cls, operations):
+        _operations = {}  # prime_details_id -> operation
+        for operation, prime_details_id in operations:
+            _operations[prime_details_id] = cls.merge(_operations.get(prime_details_id), operation)
+        if not _operations:
+            return
+
+        _version = TableVersions.bump(CHANGES)
+        _created_at = int(time.time() * 1000)
+        ChangeLog.objects.bulk_create([
+            ChangeLog(prime_details_id=prime_details_id, operation=operation, version=_version, created_at=_created_at)
+            for prime_details_id, operation in _operations.items()
+        ])
+
+    # Operation of a donor's `previous` operation followed by `operation`: an insert followed by updates is an insert,
+    # anything followed by a delete is a delete
+    @staticmethod
+    def merge(previous, operation):
+        return INSERT if previous == INSERT and operation == UPDATE else operation
+
+    # Changes of the entries after `cursor` (a version), one per donor in the order of their last entry (see merge()).
+    # Pages end after whole versions: the first `limit` entries and the rest of the version of the last one.
+    # Return ([(change_id, operation, prime_details_id)], cursor of the next page, whether more entries may follow)
+    @staticmethod
+    def since(cursor, limit):
+        _entries = ChangeLog.objects.filter(version__gt=cursor)
+        _last = _entries.order_by('version').values_list('version', flat=True)[limit - 1:limit].first()
+        if _last is not None:
+            _entries = _entries.filter(version__lte=_last)
+        _entries = list(_entries.order_by('version', 'change_id').values_list(
+            'change_id', 'operation', 'prime_details_id', 'version'))
+
+        _changes = {}  # prime_details_id -> (change_id, operation), re-inserted to keep the order of last entries
+        for change_id, operation, prime_details_id, _ in _entries:
+            _previous = _changes.pop(prime_details_id, (None, None))
+            _changes[prime_details_id] = (change_id, DonorChanges.merge(_previous[1], operation))
+
+        changes = [(change_id, operation, prime_details_id)
+                   for prime_details_id, (change_id, operation) in _changes.items()]
+        return changes, _entries[-1][3] if _entries else cursor, _last is not None
@@ -0,0 +1,24 @@
+from django.db import models
+
+
+# This class compares validated data of a serializer with the instance it was loaded from, run() sets the values
+# which differ on the instance and returns their field names, so the instance is saved with `update_fields` (or not
+# at all). Foreign keys are compared by id, without loading the related objects.
+class ChangedFields(object):
+
+    def __init__(self, **kwargs):
+        self.instance = kwargs.get('instance', None)
+        self.data = kwargs.get('data', {})
+
+    def run(self):
+        changed = []
+        for name, value in self.data.items():
+            _field = self.instance._meta.get_field(name)
+            if isinstance(_field, models.ForeignKey):
+                _current, _value = getattr(self.instance, _field.attname), getattr(value, 'pk', value)
+            else:
+                _current, _value = getattr(self.instance, name), value
+            if _current != _value:
+                setattr(self.instance, name, value)
+                changed.append(name)
+        return changed
@@ -0,0 +1,120 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from mbtb.models import DonorFlat, PrimeDetails, OtherDetails
+from mbtb.serializers import PrimeDetailsSerializer, OtherDetailsSerializer, NARRATIVE_COLUMNS
+from resources.caching.table_versions import TableVersions, DONORS
+from resources.metrics.metrics import Metrics
+from resources.renderers.fast_json_renderer import FastJSONRenderer
+
+# Columns of donor_flat from other_details, empty for donors without other_details
+OTHER_DETAILS_COLUMNS = [
+    'other_details_id', 'race', 'duration', 'clinical_details', 'cause_of_death', 'brain_weight',
+    'neuropathology_summary', 'neuropathology_gross', 'neuropathology_microscopic', 'neouropathology_criteria',
+    'cerad', 'braak_stage', 'khachaturian', 'abc', 'autopsy_type', 'formalin_fixed', 'fresh_frozen',
+]
+
+# Columns of downloads in the order of OtherDetailsSerializer, without primary keys and row versions
+EXPORT_COLUMNS = [name for name in OtherDetailsSerializer().fields if name not in ('prime_details_id',
+                                                                                   'other_details_id', 'row_version')]
+
+
+# This class maintains donor_flat, the read model of donors. refresh() derives the rows of given donors from
+# prime_details, other_details and the dimension tables, it's called in the transaction of every change of a
+# donor (see mbtb.signals, bulk writes which skip signals call changed() themselves) and by the rebuild_donor_flat
+# command, which is a required step of every deploy creating the table or importing donors with SQL. Reads never
+# write rows, they serialize missing rows with derive().
+class DonorFlatTable(object):
+    _deferred = threading.local()
+
+    # Refresh rows of changed donors, at the end of the current deferred() block if any
+    @classmethod
+    def changed(cls, prime_details_ids):
+        _pending = getattr(cls._deferred, 'pending', None)
+        if _pending is None:
+            cls.refresh(prime_details_ids)
+        else:
+            _pending.update(prime_details_ids)
+
+    # Collect the changes of a block (e.g. signals of bulk deletes) and refresh their rows once, with a query per
+    # table instead of a refresh per row
+    @classmethod
+    @contextmanager
+    def deferred(cls):
+        if getattr(cls._deferred, 'pending', None) is not None:
+            yield
+            return
+        cls._deferred.pending = set()
+        try:
+            yield
+            _pending = list(cls._deferred.pending)
+        finally:
+            cls._deferred.pending = None
+        if _pending:
+            cls.refresh(_pending)
+
+    # Derive and save rows of donors, delete rows of donors which don't exist anymore.
+    # Return {prime_details_id: DonorFlat}
+    @classmethod
+    def refresh(cls, prime_details_ids):
+        rows = {}
+        for prime_details_id, row in cls.derive(prime_details_ids).items():
+            rows[prime_details_id], _ = DonorFlat.objects.update_or_create(prime_details_id_id=prime_details_id,
+                                                                           defaults=row)
+
+        DonorFlat.objects.filter(prime_details_id__in=prime_details_ids).exclude(
+            prime_details_id__in=list(rows)).delete()
+        Metrics.increment('donor_flat.refreshed', len(rows))
+        return rows
+
+    # Derive rows of existing donors without saving them. Return {prime_details_id: {column: value}}
+    @staticmethod
+    def derive(prime_details_ids):
+        _renderer = FastJSONRenderer()
+        _prime_details = PrimeDetails.objects.filter(prime_details_id__in=prime_details_ids) \
+            .select_related('tissue_type', 'neuro_diagnosis_id')
+        _other_details = {
+            other_details.prime_details_id_id: other_details
+            for other_details in OtherDetails.objects.filter(prime_details_id__in=prime_details_ids).select_related(
+                'prime_details_id__tissue_type', 'prime_details_id__neuro_diagnosis_id', 'autopsy_type')
+        }
+
+        rows = {}
+        for prime_details in _prime_details:
+            _other = _other_details.get(prime_details.prime_details_id)
+            # values as rendered by OtherDetailsSerializer (str() of CharFields)
+            _row = {
+                'mbtb_code': prime_details.mbtb_code, 'sex': prime_details.sex, 'age': prime_details.age,
+                'postmortem_interval': prime_details.postmortem_interval, 'time_in_fix': prime_details.time_in_fix,
+                'neuropathology_diagnosis': str(prime_details.neuro_diagnosis_id),
+                'tissue_type': str(prime_details.tissue_type),
+                'preservation_method': prime_details.preservation_method,
+                'storage_year': str(prime_details.storage_year) if prime_details.storage_year is not None else None,
+                'clinical_diagnosis': prime_details.clinical_diagnosis, 'archive': prime_details.archive,
+                'prime_details_json': _renderer.render(PrimeDetailsSerializer(prime_details).data),
+                'other_details_json': None, 'other_details_list_json': None,
+            }
+            _row.update({name: None for name in OTHER_DETAILS_COLUMNS})
+            if _other is not None:
+                _data = OtherDetailsSerializer(_other).data
+                _row.update({name: _data[name] for name in OTHER_DETAILS_COLUMNS})
+                _row['other_details_json'] = _renderer.render(_data)
+                _row['other_details_list_json'] = _renderer.render(
+                    {name: value for name, value in _data.items() if name not in NARRATIVE_COLUMNS})
+
+            rows[prime_details.prime_details_id] = _row
+        return rows
+
+    # Derive all rows again, a transaction per batch of donors, delete rows of donors which don't exist anymore.
+    # Cached donor data is dropped once done. Return the number of donors
+    @classmethod
+    def rebuild(cls, batch_size=500):
+        DonorFlat.objects.exclude(prime_details_id__in=PrimeDetails.objects.values('prime_details_id')).delete()
+        _prime_details_ids = list(PrimeDetails.objects.order_by('prime_details_id').values_list(
+            'prime_details_id', flat=True))
+        for start in range(0, len(_prime_details_ids), batch_size):
+            with transaction.atomic():
+                cls.refresh(_prime_details_ids[start:start + batch_size])
+        TableVersions.bump(DONORS)
+        return len(_prime_details_ids)
@@ -1,26 +1,21 @@
-from mbtb.models import OtherDetails
-from mbtb.serializers import OtherDetailsSerializer
+from mbtb.models import DonorFlat
+from resources.db_operations.archived_donors import archived_q
+from resources.db_operations.donor_flat import EXPORT_COLUMNS
 
 
 # This class is to download all mbtb data without prime_details_id, other_details_id as a list of dict
+# Rows are read from donor_flat, without joins or serializers, archived donors only if requested
 class DownloadAllData(object):
 
     def __init__(self):
         pass
 
-    def run(self):
-        _other_details_response = OtherDetails.objects.all().select_related()
-        _serializer_response = OtherDetailsSerializer(_other_details_response, many=True)
+    def run(self, **kwargs):
+        _archived = kwargs.get('archived', 'exclude')
+        _rows = list(DonorFlat.objects.filter(archived_q(_archived), other_details_id__isnull=False)
+                     .order_by('other_details_id').values(*EXPORT_COLUMNS))
 
-        # Converting OrderedDict to list of list
-        _serializer_response = [dict(elem) for elem in _serializer_response.data]
-
-        if (len(_serializer_response) is 0):
+        if len(_rows) == 0:
             return {'response': False}
 
-        # Removing primary keys from data
-        for elem in _serializer_response:
-            del elem['prime_details_id']
-            del elem['other_details_id']
-
-        return {'response': True, 'data': _serializer_response}
+        return {'response': True, 'data': _rows}
@@ -1,9 +1,11 @@
-from mbtb.models import OtherDetails
-from mbtb.serializers import OtherDetailsSerializer
+from mbtb.models import DonorFlat
+from resources.db_operations.archived_donors import archived_q
+from resources.db_operations.donor_flat import EXPORT_COLUMNS
 
 
 # This class is download filtered mbtb data based on given mbtb_code as a list of dict.
-# It doesn't include prime_details_id, other_details_id.
+# It doesn't include prime_details_id, other_details_id. Rows are read from donor_flat by mbtb_code, codes of
+# archived donors are invalid unless requested.
 class DownloadFilteredData(object):
 
     def __init__(self):
@@ -11,19 +13,12 @@ class DownloadFilteredData(object):
 
     def run(self, **kwargs):
         _mbtb_code_list = kwargs.get('input_mbtb_codes', None)
-        _other_details_response = OtherDetails.objects.filter(
-            prime_details_id__mbtb_code__in=_mbtb_code_list).select_related()
-        _serializer_response = OtherDetailsSerializer(_other_details_response, many=True)
+        _archived = kwargs.get('archived', 'exclude')
+        _rows = list(DonorFlat.objects.filter(archived_q(_archived), mbtb_code__in=_mbtb_code_list,
+                                              other_details_id__isnull=False)
+                     .order_by('other_details_id').values(*EXPORT_COLUMNS))
 
-        # Converting OrderedDict to list of Dict
-        _serializer_response = [dict(elem) for elem in _serializer_response.data]
-
-        if (len(_serializer_response) is 0) or not(len(_serializer_response) == len(_mbtb_code_list)):
+        if (len(_rows) == 0) or not (len(_rows) == len(_mbtb_code_list)):
             return {'response': False}
 
-        # Removing primary keys from data
-        for elem in _serializer_response:
-            del elem['prime_details_id']
-            del elem['other_details_id']
-
-        return {'response': True, 'data': _serializer_response}
+        return {'response': True, 'data': _rows}
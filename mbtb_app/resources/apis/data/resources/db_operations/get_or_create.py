@@ -1,8 +1,10 @@
 from mbtb.models import AutopsyTypes, TissueTypes, NeuropathologicalDiagnosis
+from resources.caching.table_versions import TableVersions, DIMENSIONS
 
 
 # This class get result from models or insert new data if it doesn't found anything
 # Following models are used: AutopsyTypes, TissueTypes, NeuropathologicalDiagnosis
+# Inserts bump the dimension tables' version in their transaction, so cached select options are fetched again
 class GetOrCreate(object):
 
     def __init__(self, **kwargs):
@@ -19,4 +21,25 @@ class GetOrCreate(object):
 
         except self.models[self.model_name].DoesNotExist:
             model_object = self.models[self.model_name].objects.create(**kwargs)
-            return model_object
\ No newline at end of file
+            TableVersions.bump(DIMENSIONS)
+            return model_object
+
+    # Get or create the objects of many values of a single field, e.g. run_many(tissue_type=['Brain', 'Spinal cord']),
+    # with one query for existing values and a bulk insert of the others. Values are matched case-insensitively like
+    # run() with the tables' collation. Return {value: object}
+    def run_many(self, **kwargs):
+        (_field, _values), = kwargs.items()
+        _model = self.models[self.model_name]
+
+        _objects = {}
+        for model_object in _model.objects.filter(**{_field + '__in': set(_values)}):
+            _objects.setdefault(getattr(model_object, _field).casefold(), model_object)
+
+        _missing = {value.casefold(): value for value in _values if value.casefold() not in _objects}
+        if _missing:
+            _model.objects.bulk_create([_model(**{_field: value}) for value in _missing.values()])
+            for model_object in _model.objects.filter(**{_field + '__in': list(_missing.values())}):
+                _objects.setdefault(getattr(model_object, _field).casefold(), model_object)
+            TableVersions.bump(DIMENSIONS)
+
+        return {value: _objects[value.casefold()] for value in _values}
@@ -0,0 +1,32 @@
+import threading
+
+from mbtb.models import AutopsyTypes, TissueTypes, NeuropathologicalDiagnosis
+from resources.caching.table_versions import TableVersions, DIMENSIONS
+
+
+# This class returns values of neuropathological_diagnosis, autopsy_types and tissue_types for select options.
+# The result is cached per process along with the dimension tables' version, and fetched again only after
+# GetOrCreate inserted a value (i.e. bumped the version).
+class SelectOptions(object):
+    _lock = threading.Lock()
+    _cached = (None, None)
+
+    def __init__(self):
+        pass
+
+    def run(self):
+        _version = TableVersions.get(DIMENSIONS)
+        with self._lock:
+            _cached_version, _data = SelectOptions._cached
+            if _cached_version != _version:
+                _data = {
+                    'neuropathology_diagnosis': list(NeuropathologicalDiagnosis.objects.values_list(
+                        'neuro_diagnosis_name', flat=True).order_by('neuro_diagnosis_name')),
+                    'autopsy_type': list(AutopsyTypes.objects.values_list(
+                        'autopsy_type', flat=True).order_by('autopsy_type')),
+                    'tissue_type': list(TissueTypes.objects.values_list(
+                        'tissue_type', flat=True).order_by('tissue_type'))
+                }
+                SelectOptions._cached = (_version, _data)
+
+        return {'response': True, 'data': _data, 'version': _version}
@@ -1,21 +1,25 @@
+from django.db.models import CharField, F, Value
 from mbtb.models import AdminAccount, UserAccount
 
+ROLE_ADMIN = 'admin'
+ROLE_USER = 'user'
 
-# This class is to fetch rows from admin and user tables
-# If found, return true else false
-class UserOrAdmin(object):
 
-    def __init__(self, **kwargs):
-        self.model_name = kwargs.get('model_name', None)
-        self.models = {
-            'User': UserAccount,
-            'Admin': AdminAccount
-        }
+# This class is to fetch the account of given id and email from admin and user tables in a single (UNION) query
+# Return role of the account: 'admin', 'user', or None if not found or if the user account is suspended
+class UserOrAdmin(object):
 
     def run(self, **kwargs):
-        try:
-            model_object = self.models[self.model_name].objects.get(**kwargs)  # model_object is for future reference
-            return True
+        _admins = AdminAccount.objects.filter(**kwargs).annotate(
+            role=Value(ROLE_ADMIN, output_field=CharField()), suspend_status=Value('N', output_field=CharField())
+        ).values_list('role', 'suspend_status')
+        _users = UserAccount.objects.filter(**kwargs).annotate(
+            role=Value(ROLE_USER, output_field=CharField()), suspend_status=F('suspend')
+        ).values_list('role', 'suspend_status')
 
-        except self.models[self.model_name].DoesNotExist:
-            return False
+        _accounts = dict(_admins.union(_users, all=True))
+        if ROLE_ADMIN in _accounts:
+            return ROLE_ADMIN
+        if _accounts.get(ROLE_USER) == 'N':
+            return ROLE_USER
+        return None
@@ -0,0 +1,31 @@
+import os
+import threading
+
+
+# This class is a per process registry of counters (e.g. token cache hits/misses) and gauges.
+# Every gunicorn worker has its own registry, the metrics/ endpoint reports the one of the serving worker.
+class Metrics(object):
+    _lock = threading.Lock()
+    _counters = {}
+    _gauges = {}
+
+    @classmethod
+    def increment(cls, name, value=1):
+        with cls._lock:
+            cls._counters[name] = cls._counters.get(name, 0) + value
+
+    @classmethod
+    def set_gauge(cls, name, value):
+        with cls._lock:
+            cls._gauges[name] = value
+
+    @classmethod
+    def snapshot(cls):
+        with cls._lock:
+            return {'pid': os.getpid(), 'counters': dict(cls._counters), 'gauges': dict(cls._gauges)}
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._counters.clear()
+            cls._gauges.clear()
@@ -0,0 +1,115 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+from resources.metrics.metrics import Metrics
+
+# Classes of endpoints (url names) with their concurrency limit per worker process, the number of requests allowed
+# to wait for a slot and the seconds they may wait. Requests of other endpoints are always admitted.
+DEFAULT_ADMISSION_CLASSES = {
+    'heavy_read': {
+        'routes': ['download_data', 'analysis', 'crosstab', 'matched_controls', 'other_details-batch',
+                   'changes'],
+        'limit': 2, 'queue': 4, 'timeout': 10,
+    },
+    'bulk_write': {
+        'routes': ['file_upload', 'add_new_data', 'batch_data', 'bulk_data'],
+        'limit': 1, 'queue': 2, 'timeout': 10,
+    },
+    'light_read': {
+        'routes': ['get_select_options', 'brain_dataset-list', 'brain_dataset-detail', 'other_details-list',
+                   'other_details-detail'],
+        'limit': 8, 'queue': 32, 'timeout': 2,
+    },
+}
+
+
+# This class is a semaphore with a bounded wait queue: at most `limit` requests run, at most `queue` requests wait
+# up to `timeout` seconds for a slot, other requests are rejected right away
+class AdmissionQueue(object):
+
+    def __init__(self, **kwargs):
+        self.name = kwargs.get('name')  # prefix of metrics
+        self.limit = kwargs.get('limit', 1)
+        self.queue = kwargs.get('queue', 0)
+        self.timeout = kwargs.get('timeout', 10)
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    # Return True once a slot is acquired, False if the queue is full or waiting timed out
+    def acquire(self):
+        with self._condition:
+            if self.active < self.limit:
+                self.active += 1
+                self.record(admitted=True)
+                return True
+            if self.waiting >= self.queue:
+                self.record(admitted=False)
+                return False
+
+            _started = time.monotonic()
+            self.waiting += 1
+            self.record()
+            try:
+                _admitted = self._condition.wait_for(lambda: self.active < self.limit, timeout=self.timeout)
+                if _admitted:
+                    self.active += 1
+            finally:
+                self.waiting -= 1
+            self.record(admitted=_admitted, waited=time.monotonic() - _started)
+            return _admitted
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self.record()
+            self._condition.notify()
+
+    # Metrics of the queue, called with the condition's lock held
+    def record(self, admitted=None, waited=None):
+        if admitted is not None:
+            Metrics.increment('{}.{}'.format(self.name, 'admitted' if admitted else 'rejected'))
+        if waited is not None:
+            Metrics.increment(self.name + '.wait_ms', int(waited * 1000))
+            Metrics.set_gauge(self.name + '.last_wait_ms', int(waited * 1000))
+        Metrics.set_gauge(self.name + '.active', self.active)
+        Metrics.set_gauge(self.name + '.queue_depth', self.waiting)
+
+
+# This middleware limits concurrent requests per endpoint class (ADMISSION_CLASSES), so a few heavy downloads or
+# uploads can't occupy every thread of a worker while light reads wait behind them. Requests which find the
+# class' queue full, or wait longer than its timeout, get a 503 with Retry-After.
+# Limits are per worker process, workers should run several threads (gthread).
+class AdmissionControlMiddleware(object):
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.queues = {}
+        for name, options in getattr(settings, 'ADMISSION_CLASSES', DEFAULT_ADMISSION_CLASSES).items():
+            _queue = AdmissionQueue(name='admission.' + name, limit=options['limit'], queue=options['queue'],
+                                    timeout=options['timeout'])
+            self.queues.update({route: _queue for route in options['routes']})
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            _queue = getattr(request, 'admission_queue', None)
+            if _queue is not None:
+                _queue.release()
+
+    # The slot is taken once the url is resolved and released when the view returned its response
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _queue = self.queues.get(request.resolver_match.url_name)
+        if _queue is None:
+            return None
+        if not _queue.acquire():
+            response = JsonResponse({'Error': 'Server is busy, please retry later.'}, status=503)
+            response['Retry-After'] = str(int(math.ceil(_queue.timeout)))
+            return response
+
+        request.admission_queue = _queue
+        return None
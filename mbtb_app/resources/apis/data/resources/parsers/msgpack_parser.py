@@ -0,0 +1,20 @@
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+# msgpack is optional, the parser is only enabled in REST_FRAMEWORK when it is installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# This class parses MessagePack request bodies, selected with `Content-Type: application/msgpack`.
+# Timestamps are decoded as timezone aware datetimes.
+class MessagePackParser(parsers.BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, timestamp=3)
+        except (TypeError, ValueError) as error:  # msgpack errors are ValueError subclasses
+            raise ParseError('MessagePack parse error - {}'.format(error))
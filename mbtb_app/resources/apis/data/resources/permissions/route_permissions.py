@@ -0,0 +1,70 @@
+import re
+
+from django.urls import URLResolver
+from rest_framework import permissions, exceptions
+from .base_operations import BaseOperations
+from resources.db_operations.user_or_admin import ROLE_ADMIN
+
+# Rules of a route and method
+PUBLIC, AUTHENTICATED, ADMIN, DENY, NOT_ALLOWED = range(5)
+
+# (url name, method) -> {permission class: rule}, compiled once the URLconf is loaded, see compile_route_permissions
+ROUTE_PERMISSIONS = {}
+
+# Router url names are '<route>-list' and '<route>-detail'
+ROUTER_SUFFIX = re.compile(r'-(list|detail)$')
+
+
+# This class is the base of permission classes which declare allowed routes per method in `routes`, e.g.
+# {'GET': ['brain_dataset', 'other_details']}. Declared routes get the class' `rule`, other routes of a declared
+# method are denied (403) and undeclared methods are not allowed (405).
+# Requests are authorized with a single lookup of their url name and method in ROUTE_PERMISSIONS.
+class RoutePermission(permissions.BasePermission):
+    rule = DENY
+    routes = {}
+
+    def has_permission(self, request, view):
+        _url_name = request.resolver_match.url_name if request.resolver_match else None
+        _rule = ROUTE_PERMISSIONS.get((_url_name, request.method), {}).get(type(self), DENY)
+
+        if _rule == NOT_ALLOWED:
+            raise exceptions.MethodNotAllowed(method=request.method)
+        if _rule == DENY:
+            return False
+        if _rule == PUBLIC:
+            return True
+
+        # Validate request first, obtain principal containing id, email and role. Reads and routes open to all
+        # accounts trust the token's role claim, admin writes check the account in the DB (cached per token).
+        if _rule == AUTHENTICATED or request.method in permissions.SAFE_METHODS:
+            principal = BaseOperations().claimed_principal(request)
+        else:
+            principal = BaseOperations().resolve_principal(request)
+        if _rule == ADMIN:
+            return principal['role'] == ROLE_ADMIN
+        return principal['role'] is not None
+
+    @classmethod
+    def rule_for(cls, route, method):
+        if method not in cls.routes:
+            return NOT_ALLOWED
+        return cls.rule if route in cls.routes[method] else DENY
+
+
+# Walk all url patterns and store the rules of every named route and method of DRF views.
+# Views with several permission classes get a rule per class, DRF checks them in order as usual.
+def compile_route_permissions(url_patterns):
+    for pattern in url_patterns:
+        if isinstance(pattern, URLResolver):
+            compile_route_permissions(pattern.url_patterns)
+            continue
+
+        _view = getattr(pattern.callback, 'cls', None)
+        if pattern.name is None or _view is None:
+            continue
+        _route = ROUTER_SUFFIX.sub('', pattern.name)
+        for method in _view.http_method_names:
+            ROUTE_PERMISSIONS[(pattern.name, method.upper())] = {
+                cls: cls.rule_for(_route, method.upper()) for cls in _view.permission_classes
+                if issubclass(cls, RoutePermission)
+            }
@@ -0,0 +1,99 @@
+from django.http import Http404
+from rest_framework import response
+from mbtb.models import DonorFlat, PrimeDetails
+from resources.db_operations.donor_flat import DonorFlatTable
+from resources.metrics.metrics import Metrics
+from .fast_json_renderer import FastJSONRenderer, RenderedJSON
+
+
+# This class reads the JSON of donors as returned by brain_dataset/ (prime_details_json) and other_details/
+# (other_details_json), pre-rendered in donor_flat whenever a donor is saved, so list reads concatenate stored bytes
+# instead of serializing every row. Reads don't write: donors without a row (written without the ORM, e.g. SQL
+# imports before rebuild_donor_flat ran) are serialized for the response only.
+class DonorFragments(object):
+
+    # JSON array of a fragment of the donors of a PrimeDetails or OtherDetails queryset, in the order of their rows
+    @staticmethod
+    def list(queryset, fragment):
+        if queryset.model is PrimeDetails:
+            _rows = queryset.order_by('prime_details_id').values_list('prime_details_id', 'flat__' + fragment)
+        else:
+            _rows = queryset.order_by('other_details_id').values_list(
+                'prime_details_id', 'prime_details_id__flat__' + fragment)
+        _rows = list(_rows)
+
+        _missing = [prime_details_id for prime_details_id, data in _rows if data is None]
+        if _missing:
+            _derived = DonorFragments.derive(_missing)
+            _rows = [(prime_details_id, data if data is not None else
+                      _derived.get(prime_details_id, {}).get(fragment)) for prime_details_id, data in _rows]
+        return RenderedJSON(b'[' + b','.join(bytes(data) for _, data in _rows if data is not None) + b']')
+
+    # JSON of a fragment of a single donor, raise Http404 if the donor (or its other_details) doesn't exist
+    @staticmethod
+    def retrieve(fragment, prime_details_id):
+        try:
+            _prime_details_id = int(prime_details_id)
+        except (TypeError, ValueError):
+            raise Http404
+
+        _data = DonorFlat.objects.filter(prime_details_id=_prime_details_id).values_list(fragment, flat=True).first()
+        if _data is None:
+            _data = DonorFragments.derive([_prime_details_id]).get(_prime_details_id, {}).get(fragment)
+        if _data is None:
+            raise Http404
+        return RenderedJSON(_data)
+
+    # JSON array of a fragment of the donors with the given prime_details ids or mbtb codes (`key`), in the order
+    # of `values`, from a single query. Return (JSON array, values without a donor or fragment)
+    @classmethod
+    def batch(cls, fragment, key, values):
+        _rows = cls.rows(fragment, key, values)
+        missing = [value for value in values if _rows.get(value) is None]
+        return RenderedJSON(b'[' + b','.join(bytes(_rows[value]) for value in values if _rows.get(value) is not None)
+                            + b']'), missing
+
+    # Fragments of the donors with the given prime_details ids or mbtb codes (`key`) from a single query. Return
+    # {value: fragment} of existing donors, fragments are None for donors without one (e.g. other_details)
+    @classmethod
+    def rows(cls, fragment, key, values):
+        rows = dict(DonorFlat.objects.filter(**{key + '__in': values}).values_list(key, fragment))
+
+        _absent = [value for value in values if value not in rows]
+        if _absent:
+            _prime_details_ids = _absent if key == 'prime_details_id' else list(
+                PrimeDetails.objects.filter(mbtb_code__in=_absent).values_list('prime_details_id', flat=True))
+            for prime_details_id, row in cls.derive(_prime_details_ids).items():
+                rows[row['mbtb_code'] if key == 'mbtb_code' else prime_details_id] = row[fragment]
+        return rows
+
+    # Rows of donors missing in donor_flat, derived without saving them
+    @staticmethod
+    def derive(prime_details_ids):
+        _derived = DonorFlatTable.derive(prime_details_ids)
+        if _derived:
+            Metrics.increment('donor_flat.missing', len(_derived))
+        return _derived
+
+
+# This mixin serves JSON list and retrieve responses of a donor viewset from pre-rendered `fragment`s (lists from
+# `list_fragment` if given), other renderers (browsable API, msgpack) still go through the serializer. Detail lookups
+# are prime_details ids.
+class PreRenderedReadMixin(object):
+    fragment = None
+    list_fragment = None
+
+    def list(self, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, FastJSONRenderer):
+            return super(PreRenderedReadMixin, self).list(request, *args, **kwargs)
+        _queryset = self.filter_queryset(self.get_queryset())
+        return response.Response(DonorFragments.list(_queryset, self.get_list_fragment()))
+
+    def get_list_fragment(self):
+        return self.list_fragment or self.fragment
+
+    def retrieve(self, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, FastJSONRenderer):
+            return super(PreRenderedReadMixin, self).retrieve(request, *args, **kwargs)
+        _lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return response.Response(DonorFragments.retrieve(self.fragment, _lookup))
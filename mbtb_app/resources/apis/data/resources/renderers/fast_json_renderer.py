@@ -0,0 +1,39 @@
+import json
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+# orjson is optional, without it responses are rendered with DRF's stdlib `json` renderer
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# JSON which is already rendered (e.g. pre-rendered donors), returned by FastJSONRenderer as is
+class RenderedJSON(bytes):
+    pass
+
+
+# This class renders JSON responses with orjson when it is installed, falling back to DRF's JSONRenderer.
+# orjson serializes str, int, float, dict, list, datetime (e.g. storage_year), UUID (e.g. tissue_request_number)
+# and numpy arrays natively; remaining types (Decimal, QuerySet, lazy strings, ...) go through DRF's JSONEncoder.
+# Indented output for the browsable API and `?indent=` requests is left to DRF's renderer.
+class FastJSONRenderer(renderers.JSONRenderer):
+    options = 0 if orjson is None else \
+        orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, RenderedJSON):
+            if not self.get_indent(accepted_media_type, renderer_context or {}):
+                return bytes(data)
+            data = json.loads(data)
+
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+
+        return orjson.dumps(data, default=self.encoder.default, option=self.options)
@@ -0,0 +1,34 @@
+import datetime
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+# msgpack is optional, the renderer is only enabled in REST_FRAMEWORK when it is installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# This class renders responses as MessagePack for machine clients, selected with `Accept: application/msgpack`.
+# Integers stay integers, datetimes are encoded as msgpack timestamps (naive ones as UTC) and dates as ISO strings;
+# remaining types (Decimal, UUID, QuerySet, ...) are converted the same way as for JSON by DRF's JSONEncoder.
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        return msgpack.packb(data, default=self.default, use_bin_type=True, datetime=True)
+
+    def default(self, obj):
+        if isinstance(obj, datetime.datetime):
+            if obj.tzinfo is None:
+                obj = obj.replace(tzinfo=datetime.timezone.utc)
+            return msgpack.Timestamp.from_datetime(obj)
+        return self.encoder.default(obj)
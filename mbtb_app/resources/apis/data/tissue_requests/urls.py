@@ -3,9 +3,12 @@ from . import views
 from rest_framework import routers
 
 router = routers.DefaultRouter()
-router.register('add_new_tissue_requests', views.PostNewTissueRequestsView)
-router.register('get_new_tissue_requests', views.GetNewTissueRequestsView)
-router.register('get_archive_tissue_requests', views.GetArchiveTissueRequestsView)
+
+# basename is the route name used by permissions e.g. get_new_tissue_requests-detail
+router.register('add_new_tissue_requests', views.PostNewTissueRequestsView, basename='add_new_tissue_requests')
+router.register('get_new_tissue_requests', views.GetNewTissueRequestsView, basename='get_new_tissue_requests')
+router.register('get_archive_tissue_requests', views.GetArchiveTissueRequestsView,
+                basename='get_archive_tissue_requests')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -3,24 +3,31 @@ from .models import TissueRequests
 from .serializers import TissueRequestsSerializer
 from resources.permissions.is_authenticated import IsAuthenticated
 from resources.permissions.is_admin import IsAdmin
+from resources.caching.response_cache import CachedReadMixin, InvalidateOnWriteMixin
+from resources.caching.table_versions import TISSUE_REQUESTS
 
 
 # This class is to add a new tissue request, permission user only
-class PostNewTissueRequestsView(viewsets.ModelViewSet):
+class PostNewTissueRequestsView(InvalidateOnWriteMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
+    cache_tables = [TISSUE_REQUESTS]
     queryset = TissueRequests.objects.all()
     serializer_class = TissueRequestsSerializer
 
 
 # This class is to fetch new tissue requests and confirm those requests, permission admin only
-class GetNewTissueRequestsView(viewsets.ModelViewSet):
+# Reads are cached until a tissue request is added, confirmed or deleted
+class GetNewTissueRequestsView(CachedReadMixin, InvalidateOnWriteMixin, viewsets.ModelViewSet):
     permission_classes = [IsAdmin]
+    cache_tables = [TISSUE_REQUESTS]
     queryset = TissueRequests.objects.filter(pending_approval='Y')  # filtering to fetch only pending requests
     serializer_class = TissueRequestsSerializer
 
 
 # This class is to fetch archive tissue requests, permission admin only
-class GetArchiveTissueRequestsView(viewsets.ModelViewSet):
+# Reads are cached until a tissue request is added, confirmed or deleted
+class GetArchiveTissueRequestsView(CachedReadMixin, InvalidateOnWriteMixin, viewsets.ModelViewSet):
     permission_classes = [IsAdmin]
+    cache_tables = [TISSUE_REQUESTS]
     queryset = TissueRequests.objects.filter(pending_approval='N')  # filtering to fetch only archive requests
     serializer_class = TissueRequestsSerializer
@@ -8,3 +8,26 @@ class AdminAccount(models.Model):
     class Meta:
         #managed = False
         db_table = 'admins'
+
+
+# Append-only log of token revocations: revoke (suspended or deleted account) and restore (reverted account)
+# events of users, written by the users service
+class TokenRevocation(models.Model):
+    user_id = models.IntegerField()
+    revoked = models.BooleanField()
+    created_at = models.BigIntegerField(db_index=True)  # milliseconds since epoch
+
+    class Meta:
+        #managed = False
+        db_table = 'token_revocations'
+
+
+# Version counters per namespace of cached data (e.g. 'donors', 'principals'), incremented in the transaction
+# of every change of the namespace's tables and polled by all workers of both services
+class CacheVersion(models.Model):
+    namespace = models.CharField(max_length=64, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        #managed = False
+        db_table = 'cache_versions'
@@ -1,9 +1,16 @@
+from django.conf import settings
+from django.db import connection
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
-from .models import AdminAccount
+from .models import AdminAccount, TokenRevocation
 from users_api.models import Users
 from users_api.serializers import UsersSerializer
 from resources.tests.common_tests import CommonTests
+from resources.caching.table_versions import TableVersions, PRINCIPALS
+from resources.caching.token_cache import TokenCache
+from resources.metrics.metrics import Metrics
+from resources.permissions.access_token import AccessToken
+from resources.permissions.base_operations import TOKEN_CACHE, PRINCIPAL_CACHE, REVOCATION_LIST
 import jwt
 
 
@@ -26,6 +33,14 @@ class SetUpTestData(APITestCase):
     def tearDownClass(cls):
         AdminAccount.objects.all().delete()
 
+    # Run on_commit callbacks, the test's transaction is never committed
+    @staticmethod
+    def commit():
+        _callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for _, callback in _callbacks:
+            callback()
+        return len(_callbacks)
+
 
 # This class is to test admin login
 class AdminAccountGetTokenViewTest(SetUpTestData):
@@ -54,6 +69,8 @@ class AdminAccountGetTokenViewTest(SetUpTestData):
         _model_response = AdminAccount.objects.get(id=_decoded_token['id'], email=_decoded_token['email'])
         self.assertEqual(_model_response.email, self.admin_email)
         self.assertEqual(_model_response.password_hash, self.admin_password)
+        self.assertEqual(_decoded_token['role'], 'admin')
+        self.assertEqual(_decoded_token['exp'] - _decoded_token['iat'], settings.TOKEN_LIFETIME)
 
     # post request with invalid credentials
     def test_invalid_admin_login(self):
@@ -227,6 +244,51 @@ class CurrentUsersViewSetTest(SetUpTestData):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.client.credentials()
 
+    # Suspending a user drops the cached principals of the user's tokens
+    def test_suspend_user_invalidates_principal(self):
+        PRINCIPAL_CACHE.set(b'user-token', {'id': self.current_user.pk, 'email': 'current_user', 'role': 'user'})
+        PRINCIPAL_CACHE.set(b'other-token', {'id': self.current_user.pk + 1, 'email': 'other', 'role': 'user'})
+        url = '/current_users/' + str(self.current_user.pk) + '/'
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        response = self.client.patch(url, self.suspend_user_payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(PRINCIPAL_CACHE.get(b'user-token'), None)
+        self.assertEqual(PRINCIPAL_CACHE.get(b'other-token')['email'], 'other')
+        self.client.credentials()
+
+    # Suspending a user bumps the principals version, other workers drop their cached principals
+    def test_suspend_user_bumps_principals(self):
+        principal_cache = TokenCache(name='principal_cache.test', namespace=PRINCIPALS)
+        principal_cache.set(b'other-token', {'id': self.current_user.pk + 1, 'email': 'other', 'role': 'user'})
+        self.assertEqual(principal_cache.get(b'other-token')['email'], 'other')
+        _version = TableVersions.get(PRINCIPALS)
+
+        url = '/current_users/' + str(self.current_user.pk) + '/'
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        self.client.patch(url, self.suspend_user_payload, format='json')
+        self.assertEqual(TableVersions.get(PRINCIPALS), _version)  # not committed yet
+        self.commit()
+        self.assertEqual(int(TableVersions.get(PRINCIPALS)), int(_version) + 1)
+        self.assertEqual(principal_cache.get(b'other-token'), None)
+        self.client.credentials()
+
+    # Suspending a user revokes the user's tokens, reverting the account restores them
+    def test_suspend_user_revokes_tokens(self):
+        url = '/current_users/' + str(self.current_user.pk) + '/'
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        self.client.patch(url, self.suspend_user_payload, format='json')
+        self.commit()
+        self.assertTrue(REVOCATION_LIST.is_revoked(self.current_user.pk))
+
+        url = '/suspended_users/' + str(self.current_user.pk) + '/'
+        response = self.client.patch(url, {'suspend': 'N'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.commit()
+        self.assertFalse(REVOCATION_LIST.is_revoked(self.current_user.pk))
+        self.assertEqual(list(TokenRevocation.objects.filter(user_id=self.current_user.pk).order_by('id').values_list(
+            'revoked', flat=True)), [True, False])
+        self.client.credentials()
+
     # Gets single user detail and comparing with model data.
     def test_get_single_user(self):
         url = '/current_users/' + str(self.current_user.pk) + '/'
@@ -477,3 +539,34 @@ class SuspendedUsersViewSetTest(SetUpTestData):
     def tearDown(self):
         super(SetUpTestData, self).tearDownClass()
         del self.common_tests
+
+
+# This class is to test metrics/ endpoint: token cache hits/misses of the serving process, admin only
+class MetricsAPIViewTest(SetUpTestData):
+
+    def setUp(self):
+        super(SetUpTestData, self).setUpClass()
+        TOKEN_CACHE.clear()
+        PRINCIPAL_CACHE.clear()
+        Metrics.reset()
+
+    # GET requests are authorized from the token's role claim
+    def test_get_metrics(self):
+        _admin = AdminAccount.objects.get(email=self.admin_email)
+        _token = AccessToken().run(id=_admin.id, email=_admin.email, role='admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + _token.decode('utf-8'))
+        self.client.get('/metrics/')
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['counters'], {'token_cache.misses': 1, 'token_cache.hits': 1})
+        self.client.credentials()
+
+    # Invalid request: post request and without token
+    def test_invalid_requests(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.decode('utf-8'))
+        self.assertEqual(self.client.post('/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.credentials()
+        self.assertEqual(self.client.get('/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+
+    def tearDown(self):
+        super(SetUpTestData, self).tearDownClass()
@@ -3,11 +3,12 @@ from . import views
 from rest_framework import routers
 
 router = routers.DefaultRouter()
-router.register('list_new_users', views.NewUsersViewSet)
-router.register('current_users', views.CurrentUsersViewSet)
-router.register('suspended_users', views.SuspendedUsersViewSet)
+router.register('list_new_users', views.NewUsersViewSet, basename='list_new_users')
+router.register('current_users', views.CurrentUsersViewSet, basename='current_users')
+router.register('suspended_users', views.SuspendedUsersViewSet, basename='suspended_users')
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('admin_auth', views.AdminAccountGetTokenView.as_view())
+    path('admin_auth', views.AdminAccountGetTokenView.as_view(), name='admin_auth'),
+    path('metrics/', views.MetricsAPIView.as_view(), name='metrics')
 ]
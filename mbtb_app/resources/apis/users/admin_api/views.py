@@ -1,12 +1,18 @@
+from django.db import transaction
 from django.http import HttpResponse
 from rest_framework import views, response, viewsets
 from rest_framework.permissions import AllowAny
 from .models import AdminAccount
 from resources.permissions.is_admin import IsAdmin
 from resources.permissions.is_post_allowed import IsPostAllowed
+from resources.caching.table_versions import TableVersions, PRINCIPALS
+from resources.metrics.metrics import Metrics
+from resources.permissions.access_token import AccessToken
+from resources.permissions.base_operations import PRINCIPAL_CACHE
+from resources.db_operations.token_revocations import TokenRevocations
+from resources.db_operations.user_or_admin import ROLE_ADMIN, ROLE_USER
 from users_api.models import Users
 from users_api.serializers import UsersSerializer
-import jwt
 
 
 # Authenticate credentials for admin and return auth token
@@ -27,11 +33,7 @@ class AdminAccountGetTokenView(views.APIView):
             return response.Response({'Error': "Invalid username/password"}, status="400")
 
         if admin:
-            payload = {
-                'id': admin.id,
-                'email': admin.email,
-            }
-            jwt_token = jwt.encode(payload, "SECRET_KEY", algorithm='HS256')
+            jwt_token = AccessToken().run(id=admin.id, email=admin.email, role=ROLE_ADMIN)
 
             return HttpResponse(
                 jwt_token,
@@ -40,15 +42,40 @@ class AdminAccountGetTokenView(views.APIView):
             )
 
 
+# This class drops cached principals of a user account once an admin changed it (approve, suspend, revert)
+# or deleted it, so the change applies to the user's next request instead of after PRINCIPAL_CACHE_TTL.
+# Tokens of suspended and deleted users are revoked, and restored once the account is reverted.
+# The principals version is bumped along with the change, other workers drop their cached principals too.
+class InvalidatePrincipalMixin(object):
+
+    def perform_update(self, serializer):
+        _user_id = serializer.instance.id
+        _suspended = serializer.instance.suspend == 'Y'
+        with transaction.atomic():
+            user = serializer.save()
+            if (user.suspend == 'Y') != _suspended:
+                TokenRevocations().run(user_id=_user_id, revoke=user.suspend == 'Y')
+            TableVersions.bump(PRINCIPALS)
+        PRINCIPAL_CACHE.discard(lambda principal: principal['role'] == ROLE_USER and principal['id'] == _user_id)
+
+    def perform_destroy(self, instance):
+        _user_id = instance.id
+        with transaction.atomic():
+            instance.delete()
+            TokenRevocations().run(user_id=_user_id, revoke=True)
+            TableVersions.bump(PRINCIPALS)
+        PRINCIPAL_CACHE.discard(lambda principal: principal['role'] == ROLE_USER and principal['id'] == _user_id)
+
+
 # This view gets new registration requests and allow admin to approve their status.
-class NewUsersViewSet(viewsets.ModelViewSet):
+class NewUsersViewSet(InvalidatePrincipalMixin, viewsets.ModelViewSet):
     permission_classes = [IsAdmin]
     queryset = Users.objects.filter(pending_approval='Y')  # filtering to fetch only pending requests
     serializer_class = UsersSerializer
 
 
 # This view gets current users list and allow admin to suspend their account.
-class CurrentUsersViewSet(viewsets.ModelViewSet):
+class CurrentUsersViewSet(InvalidatePrincipalMixin, viewsets.ModelViewSet):
     permission_classes = [IsAdmin]
     # filtering to fetch non-pending and active accounts
     queryset = Users.objects.filter(pending_approval='N', suspend='N')
@@ -56,8 +83,17 @@ class CurrentUsersViewSet(viewsets.ModelViewSet):
 
 
 # This view gets suspended users list and allow admin to revert user's account status to normal.
-class SuspendedUsersViewSet(viewsets.ModelViewSet):
+class SuspendedUsersViewSet(InvalidatePrincipalMixin, viewsets.ModelViewSet):
     permission_classes = [IsAdmin]
     # filtering to fetch non-pending and suspended accounts
     queryset = Users.objects.filter(pending_approval='N', suspend='Y')
     serializer_class = UsersSerializer
+
+
+# This view class returns counters and gauges (e.g. token cache hits/misses) of the serving worker process,
+# allowed methods: GET
+class MetricsAPIView(views.APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return response.Response(Metrics.snapshot(), status="200")
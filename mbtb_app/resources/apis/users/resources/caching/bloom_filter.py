@@ -0,0 +1,39 @@
+import math
+
+MASK_64 = (1 << 64) - 1
+
+
+# This class is a Bloom filter of integer ids: a bit array where every id sets `hashes` bits, sized for
+# `capacity` ids at `error_rate` false positives. Membership may be a false positive, never a false negative.
+# Ids can't be removed, build a new filter instead.
+class BloomFilter(object):
+
+    def __init__(self, **kwargs):
+        _capacity = max(kwargs.get('capacity', 1024), 1)
+        _error_rate = kwargs.get('error_rate', 0.01)
+        self.size = int(math.ceil(-_capacity * math.log(_error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / _capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def add(self, key):
+        _position, _step = self.probe(key)
+        for _ in range(self.hashes):
+            self._bits[_position >> 3] |= 1 << (_position & 7)
+            _position = (_position + _step) % self.size
+        self.count += 1
+
+    # Most absent ids stop at the first unset bit
+    def __contains__(self, key):
+        _position, _step = self.probe(key)
+        for _ in range(self.hashes):
+            if not self._bits[_position >> 3] & (1 << (_position & 7)):
+                return False
+            _position = (_position + _step) % self.size
+        return True
+
+    # First bit position and step between the bit positions of an id (double hashing of a 64 bit mix of the id)
+    def probe(self, key):
+        _hash = ((key + 1) * 0x9E3779B97F4A7C15) & MASK_64
+        _hash ^= _hash >> 29
+        return (_hash & 0xFFFFFFFF) % self.size, ((_hash >> 32) | 1) % self.size
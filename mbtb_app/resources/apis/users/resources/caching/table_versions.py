@@ -0,0 +1,82 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from admin_api.models import CacheVersion
+from resources.metrics.metrics import Metrics
+
+# Version of the dimension tables: neuropathological_diagnosis, autopsy_types, tissue_types
+DIMENSIONS = 'dimensions'
+
+# Version of the donor tables: prime_details, other_details
+DONORS = 'donors'
+
+# Version of the tissue_requests table
+TISSUE_REQUESTS = 'tissue_requests'
+
+# Version of user accounts (role, suspension) behind resolved principals, changed by the users service
+PRINCIPALS = 'principals'
+
+# Version of change_log entries, cursors of changes/ (see DonorChanges)
+CHANGES = 'changes'
+
+
+# This class keeps a version counter per group of tables (namespace) in the cache_versions table, so every worker
+# of both services can tell whether its own cached copy of these tables is still current without querying them.
+# Changes increment the counter in their own transaction, so a version is visible exactly when its data is.
+# Every worker reads all counters at most once per CACHE_VERSIONS_REFRESH_MS, the worker which made the change
+# applies it once committed. Counters only grow: rows must not be deleted or reset.
+class TableVersions(object):
+    _versions = {}
+    _polled_at = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, name):
+        if cls._polled_at is None or time.monotonic() - cls._polled_at >= cls.refresh():
+            cls.poll()
+        return str(cls._versions.get(name, 0))
+
+    # Increment the version in the current transaction, call it along with the tables' changes
+    @classmethod
+    def bump(cls, name):
+        with transaction.atomic():
+            if not CacheVersion.objects.filter(namespace=name).update(version=F('version') + 1):
+                try:
+                    with transaction.atomic():
+                        CacheVersion.objects.create(namespace=name, version=1)
+                except IntegrityError:
+                    CacheVersion.objects.filter(namespace=name).update(version=F('version') + 1)
+            version = CacheVersion.objects.values_list('version', flat=True).get(namespace=name)
+        transaction.on_commit(lambda: cls.apply({name: version}))
+        return version
+
+    # Read all counters, only one thread of the process queries, others keep using the current versions
+    @classmethod
+    def poll(cls, force=False):
+        if not cls._lock.acquire(blocking=force or cls._polled_at is None):
+            return
+        try:
+            if not force and cls._polled_at is not None and time.monotonic() - cls._polled_at < cls.refresh():
+                return
+            _versions = dict(CacheVersion.objects.values_list('namespace', 'version'))
+            _changed = [name for name, version in _versions.items() if cls._versions.get(name) != version]
+            if _changed and cls._polled_at is not None:
+                Metrics.increment('cache_versions.changes', len(_changed))
+            cls._versions = _versions
+            cls._polled_at = time.monotonic()
+            Metrics.increment('cache_versions.polls')
+        finally:
+            cls._lock.release()
+
+    # Apply committed versions of this worker before the next poll
+    @classmethod
+    def apply(cls, versions):
+        with cls._lock:
+            cls._versions = dict(cls._versions, **versions)
+
+    @staticmethod
+    def refresh():
+        return getattr(settings, 'CACHE_VERSIONS_REFRESH_MS', 500) / 1000
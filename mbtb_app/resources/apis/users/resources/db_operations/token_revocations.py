@@ -0,0 +1,16 @@
+import time
+
+from django.db import transaction
+from admin_api.models import TokenRevocation
+from resources.permissions.base_operations import REVOCATION_LIST
+
+
+# This class appends a revoke event for all tokens of a user (suspended or deleted account), or a restore event
+# once the account is reverted to normal. This worker applies it once committed, others poll it within
+# REVOCATION_REFRESH seconds.
+class TokenRevocations(object):
+
+    def run(self, **kwargs):
+        TokenRevocation.objects.create(user_id=kwargs.get('user_id'), revoked=kwargs.get('revoke', True),
+                                       created_at=int(time.time() * 1000))
+        transaction.on_commit(lambda: REVOCATION_LIST.poll(force=True))
@@ -0,0 +1,144 @@
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+# brotli and zstandard are optional, encodings without their module installed are never negotiated
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression levels per content type (without parameters), responses of other content types aren't compressed.
+# Large JSON bodies are compressed harder, their size dominates transfer time.
+DEFAULT_LEVELS = {
+    'application/json': {'zstd': 6, 'br': 5, 'gzip': 6},
+    'application/msgpack': {'zstd': 6, 'br': 5, 'gzip': 6},
+    'text/csv': {'zstd': 6, 'br': 5, 'gzip': 6},
+    'text/html': {'zstd': 3, 'br': 4, 'gzip': 5},
+    'text/plain': {'zstd': 3, 'br': 4, 'gzip': 5},
+}
+
+# Responses smaller than this many bytes aren't worth compressing
+DEFAULT_MIN_SIZE = 1024
+
+
+# This class wraps the compressors of all supported encodings behind compress/flush/finish
+class Compressor(object):
+
+    def __init__(self, **kwargs):
+        self.encoding = kwargs.get('encoding', None)
+        _level = kwargs.get('level', None)
+
+        if self.encoding == 'zstd':
+            self.compressor = zstandard.ZstdCompressor(level=_level).compressobj()
+        elif self.encoding == 'br':
+            self.compressor = brotli.Compressor(quality=_level)
+        else:
+            self.compressor = zlib.compressobj(_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self.compressor.process(data)
+        return self.compressor.compress(data)
+
+    # Emit everything compressed so far, so streamed chunks reach the client without waiting for the next one
+    def flush(self):
+        if self.encoding == 'zstd':
+            return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.encoding == 'br':
+            return self.compressor.flush()
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'zstd':
+            return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+        if self.encoding == 'br':
+            return self.compressor.finish()
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+# This middleware compresses response bodies with the best encoding accepted by the client (zstd, br, gzip).
+# Regular responses are compressed when larger than COMPRESSION_MIN_SIZE, streaming responses (size unknown)
+# are always compressed chunk by chunk. Levels are chosen per content type from COMPRESSION_LEVELS.
+class CompressionMiddleware(object):
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.levels = getattr(settings, 'COMPRESSION_LEVELS', DEFAULT_LEVELS)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+        self.available = ['gzip']
+        if brotli is not None:
+            self.available.insert(0, 'br')
+        if zstandard is not None:
+            self.available.insert(0, 'zstd')
+
+    def __call__(self, request):
+        _response = self.get_response(request)
+
+        _content_type = _response.get('Content-Type', '').split(';')[0].strip().lower()
+        if _content_type not in self.levels or _response.has_header('Content-Encoding'):
+            return _response
+        if not _response.streaming and len(_response.content) < self.min_size:
+            return _response
+
+        patch_vary_headers(_response, ('Accept-Encoding',))
+        _encoding = self.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.levels[_content_type])
+        if _encoding is None:
+            return _response
+
+        compressor = Compressor(encoding=_encoding, level=self.levels[_content_type][_encoding])
+        if _response.streaming:
+            _response.streaming_content = self.compress_stream(_response.streaming_content, compressor)
+            del _response['Content-Length']
+        else:
+            _compressed = compressor.compress(_response.content) + compressor.finish()
+            if len(_compressed) >= len(_response.content):
+                return _response
+            _response.content = _compressed
+            _response['Content-Length'] = str(len(_compressed))
+
+        # Compressed body differs from the original one, so a strong ETag no longer applies (as GZipMiddleware)
+        _etag = _response.get('ETag')
+        if _etag and _etag.startswith('"'):
+            _response['ETag'] = 'W/' + _etag
+        _response['Content-Encoding'] = _encoding
+        return _response
+
+    # Return the preferred encoding among the available ones by the client's q-values, None for identity
+    def negotiate(self, accept_encoding, levels):
+        _weights = {}
+        for item in accept_encoding.split(','):
+            _parts = [part.strip() for part in item.split(';')]
+            _weight = 1.0
+            for parameter in _parts[1:]:
+                if parameter.startswith('q='):
+                    try:
+                        _weight = float(parameter[2:])
+                    except ValueError:
+                        _weight = 0.0
+            if _parts[0]:
+                _weights[_parts[0].lower()] = _weight
+
+        _candidates = [
+            encoding for encoding in self.available
+            if encoding in levels and _weights.get(encoding, _weights.get('*', 0.0)) > 0
+        ]
+        if not _candidates:
+            return None
+        # Highest q-value wins, server preference (zstd, br, gzip) breaks ties
+        return max(_candidates, key=lambda encoding: (
+            _weights.get(encoding, _weights.get('*', 0.0)), -self.available.index(encoding)))
+
+    @staticmethod
+    def compress_stream(chunks, compressor):
+        for chunk in chunks:
+            _compressed = compressor.compress(chunk) + compressor.flush()
+            if _compressed:
+                yield _compressed
+        yield compressor.finish()
@@ -0,0 +1,23 @@
+from django.conf import settings
+import jwt
+import time
+
+
+# This class issues the signed auth token of an account: id, email, role ('admin' or 'user') and its
+# issue (iat) and expiry (exp) time, TOKEN_LIFETIME seconds later.
+# Services authorize read requests from the role claim alone, suspended users are in token_revocations.
+class AccessToken(object):
+
+    def __init__(self, **kwargs):
+        self.lifetime = kwargs.get('lifetime', getattr(settings, 'TOKEN_LIFETIME', 8 * 60 * 60))
+
+    def run(self, **kwargs):
+        _issued_at = int(time.time())
+        payload = {
+            'id': kwargs.get('id'),
+            'email': kwargs.get('email'),
+            'role': kwargs.get('role'),
+            'iat': _issued_at,
+            'exp': _issued_at + self.lifetime
+        }
+        return jwt.encode(payload, "SECRET_KEY", algorithm='HS256')
@@ -1,13 +1,66 @@
+from django.conf import settings
 from rest_framework import exceptions
 from rest_framework.authentication import get_authorization_header
+from resources.caching.revocation_list import RevocationList
+from resources.caching.table_versions import PRINCIPALS
+from resources.caching.token_cache import TokenCache
+from resources.db_operations.user_or_admin import UserOrAdmin, ROLE_USER
 import jwt
 
+# Verified tokens of this process, see TOKEN_CACHE_SIZE and TOKEN_CACHE_TTL
+TOKEN_CACHE = TokenCache(
+    name='token_cache', max_size=getattr(settings, 'TOKEN_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'TOKEN_CACHE_TTL', 60)
+)
+
+# Resolved principals (id, email, role) of this process per token, see PRINCIPAL_CACHE_TTL.
+# Dropped on every worker once the users service changed an account (principals version)
+PRINCIPAL_CACHE = TokenCache(
+    name='principal_cache', max_size=getattr(settings, 'TOKEN_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'PRINCIPAL_CACHE_TTL', 30), namespace=PRINCIPALS
+)
+
+# Users whose tokens are revoked, see REVOCATION_REFRESH
+REVOCATION_LIST = RevocationList(
+    refresh=getattr(settings, 'REVOCATION_REFRESH', 2), lifetime=getattr(settings, 'TOKEN_LIFETIME', 8 * 60 * 60),
+    capacity=getattr(settings, 'REVOCATION_CAPACITY', 1024)
+)
+
 
 # This class consists base operations: perform validations on request, at last decode jwt token
 class BaseOperations(object):
 
     # Check for auth_token length and pass it for decoding
     def validate_request(self, request):
+        return self.decode_credentials(self.get_token(request))
+
+    # Return principal of the request's token as dict of id, email and role ('admin', 'user' or None)
+    # Roles are resolved with a single query and cached per token, warm requests make no queries
+    def resolve_principal(self, request):
+        token = self.get_token(request)
+        response = PRINCIPAL_CACHE.get(token)
+        if response is not None:
+            return response
+
+        response = self.decode_credentials(token)
+        response['role'] = UserOrAdmin().run(id=response['id'], email=response['email'])
+        PRINCIPAL_CACHE.set(token, response, expires_at=TOKEN_CACHE.expires_at(token))
+        return response
+
+    # Return principal of the request's token from its signed role claim, without any query.
+    # Tokens of suspended or deleted users get role None, tokens without a role claim are resolved from the DB
+    def claimed_principal(self, request):
+        token = self.get_token(request)
+        response = self.decode_credentials(token)
+        if response['role'] is None:
+            return self.resolve_principal(request)
+
+        if response['role'] == ROLE_USER and REVOCATION_LIST.is_revoked(response['id']):
+            response['role'] = None
+        return response
+
+    # Validate Authorization header and return auth_token
+    def get_token(self, request):
         auth = get_authorization_header(request).split()
 
         # Validate request tag
@@ -30,17 +83,26 @@ class BaseOperations(object):
             msg = 'Invalid token header. Token string should not contain invalid characters.'
             raise exceptions.AuthenticationFailed(msg)
 
-        return self.decode_credentials(token)
+        return token
 
-    # Decode jwt token and return dict and raise decode error if any
+    # Decode jwt token and return dict of id, email and role claim (None for tokens without one),
+    # raise decode error if any
+    # Verified tokens are cached, so repeated requests with the same token skip the signature verification
     def decode_credentials(self, token):
+        response = TOKEN_CACHE.get(token)
+        if response is not None:
+            return response
+
         try:
             payload = jwt.decode(token, "SECRET_KEY")
             response = {
                 'id': payload['id'],
-                'email': payload['email']
+                'email': payload['email'],
+                'role': payload.get('role')
             }
-            return response
         except BaseException as error_msg:
             error_msg = 'Token - ' + str(error_msg)
             raise exceptions.AuthenticationFailed(error_msg)
+
+        TOKEN_CACHE.set(token, response, expires_at=payload.get('exp'))
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import importlib.util
 import os
 import sys
 
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'resources.middleware.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -106,6 +108,15 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'resources.renderers.fast_json_renderer.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PERMISSION_CLASSES': (
         'resources.permissions.is_admin.IsAdmin',
         'resources.permissions.is_authenticated.IsAuthenticated',
@@ -113,6 +124,38 @@ REST_FRAMEWORK = {
     )
 }
 
+# MessagePack renderer and parser for machine clients (Accept/Content-Type: application/msgpack),
+# enabled when msgpack is installed
+if importlib.util.find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] += ('resources.renderers.msgpack_renderer.MessagePackRenderer',)
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] += ('resources.parsers.msgpack_parser.MessagePackParser',)
+
+# Responses larger than this many bytes are compressed with the best encoding accepted by the client
+# (zstd, br, gzip), levels per content type are defined in resources.middleware.compression
+COMPRESSION_MIN_SIZE = 1024
+
+# Verified auth tokens are cached per process: maximum number of tokens, and seconds a token stays cached
+# (or until its `exp` claim)
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_TTL = 60
+
+# Seconds a token's resolved account role stays cached per process. Admin changes of user accounts bump the
+# principals version, so every worker drops its entries within CACHE_VERSIONS_REFRESH_MS
+PRINCIPAL_CACHE_TTL = 30
+
+# Cached data (select options, responses, principals, dataset snapshot) is invalidated through the version
+# counters of the cache_versions table, which every worker reads at most once per this many milliseconds
+CACHE_VERSIONS_REFRESH_MS = 500
+
+# Seconds issued auth tokens stay valid (exp claim), TOKEN_LIFETIME of other services must match
+TOKEN_LIFETIME = 8 * 60 * 60
+
+# Tokens of suspended users are rejected by the revocation list: every REVOCATION_REFRESH seconds (maximum
+# propagation delay of suspensions) workers poll new events, REVOCATION_CAPACITY is the initial number of revoked
+# users its Bloom filter is sized for
+REVOCATION_REFRESH = 2
+REVOCATION_CAPACITY = 1024
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 
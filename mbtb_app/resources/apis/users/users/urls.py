@@ -15,9 +15,13 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from resources.permissions.route_permissions import compile_route_permissions
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('admin_api.urls')),
     path('', include('users_api.urls')),
 ]
+
+# Resolve permissions of all routes once, requests are authorized by url name and method
+compile_route_permissions(urlpatterns)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 from .models import Users
@@ -52,6 +53,9 @@ class UsersAuthenticationTestCase(SetUpTestData):
         _model_response = Users.objects.get(id=_decoded_token['id'], email=_decoded_token['email'])
         self.assertEqual(_model_response.email, self.user_email)
         self.assertEqual(_model_response.password_hash, self.user_password)
+        self.assertEqual(_decoded_token['role'], 'user')
+        self.assertEqual(_decoded_token['exp'] - _decoded_token['iat'], settings.TOKEN_LIFETIME)
+        self.assertNotIn('password_hash', _decoded_token)
 
     # post request with invalid credentials
     def test_invalid_user_login(self):
@@ -3,9 +3,9 @@ from . import views
 from rest_framework import routers
 
 router = routers.DefaultRouter()
-router.register('add_new_users', views.NewUsersViewSet)
+router.register('add_new_users', views.NewUsersViewSet, basename='add_new_users')
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('user_auth', views.UsersAccountView.as_view())
+    path('user_auth', views.UsersAccountView.as_view(), name='user_auth')
 ]
@@ -2,8 +2,9 @@ from django.http import HttpResponse
 from rest_framework import views, response, viewsets
 from .models import Users
 from .serializers import UsersSerializer
+from resources.permissions.access_token import AccessToken
 from resources.permissions.is_post_allowed import IsPostAllowed
-import jwt
+from resources.db_operations.user_or_admin import ROLE_USER
 
 
 # This view authenticate users and return auth_token, allowed request: post only
@@ -25,12 +26,7 @@ class UsersAccountView(views.APIView):
             return response.Response({'Error': 'Your account is suspended. Please contact admin.'}, status="400")
 
         else:
-            payload = {
-                'id': user[0].id,
-                'email': user[0].email,
-                'password_hash': user[0].password_hash
-            }
-            jwt_token = jwt.encode(payload, "SECRET_KEY", algorithm='HS256')
+            jwt_token = AccessToken().run(id=user[0].id, email=user[0].email, role=ROLE_USER)
 
             return HttpResponse(
                 jwt_token,
@@ -15,6 +15,11 @@ module.exports = {
       required: true
     },
 
+    row_version:{
+      type: 'string',
+      required: false
+    },
+
     mbtb_code: {
       type: 'string',
       required: true
@@ -187,6 +192,11 @@ module.exports = {
       fresh_frozen: fresh_frozen
     };
 
+    // version of the donor the form was loaded with, edits of a donor changed since are rejected
+    if (inputs.row_version) {
+      payload.row_version = inputs.row_version;
+    }
+
     let url = sails.config.custom.data_api_url + 'edit_data/' + inputs.prime_details_id + '/' ;
     var msg_ = '';
 